@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+"""
+On-disk (SQLite) cache of per-file analyzer results, kept in the session workdir, so that re-analyzing
+a session (after a crash, a re-upload with additional data, etc) only extracts information from new or
+changed files.
+
+Each record belongs to a kind (e.g. "acquisition") and a file path, and is stored with a key describing
+the inputs it was computed from (file sizes, modification times, ...). Callers only use a record if its
+key matches the current one. The whole cache is cleared when the analyzer version changes.
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+
+ANALYZER_CACHE_FILE = "ezBIDS_core.cache.sqlite"
+
+
+def analyzer_version(*source_files):
+    """
+    Identifies the analyzer version by the contents of its source files, so that results
+    cached by a different version of ezBIDS are never used.
+
+    Parameters
+    ----------
+    source_files : string
+        Paths of the analyzer source files.
+
+    Returns
+    -------
+    version : string
+        Hex digest of the source files.
+    """
+    digest = hashlib.sha256()
+    for source_file in source_files:
+        with open(source_file, "rb") as f:
+            digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+def file_signature(path):
+    """
+    Size and modification time of a file (or directory), used in cache keys.
+
+    Parameters
+    ----------
+    path : string
+        Path of the file.
+
+    Returns
+    -------
+    signature : list or None
+        [size, mtime_ns], or None if the file doesn't exist.
+    """
+    try:
+        path_stat = os.stat(path)
+    except OSError:
+        return None
+
+    return [path_stat.st_size, path_stat.st_mtime_ns]
+
+
+def cache_key(*inputs):
+    """
+    Hashes the (JSON-serializable) inputs a record is computed from into a cache key.
+
+    Returns
+    -------
+    key : string
+        Hex digest of the inputs.
+    """
+    return hashlib.sha256(json.dumps(inputs).encode()).hexdigest()
+
+
+def open_analyzer_cache(cache_file, version):
+    """
+    Opens (creating if needed) the analyzer cache, clearing it if it was written by another analyzer version.
+
+    Parameters
+    ----------
+    cache_file : string
+        Path to the SQLite cache file.
+
+    version : string
+        Analyzer version (see analyzer_version).
+
+    Returns
+    -------
+    connection : sqlite3.Connection
+    """
+    connection = sqlite3.connect(cache_file)
+    connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS records (kind TEXT, path TEXT, key TEXT, value TEXT, PRIMARY KEY (kind, path))"
+    )
+
+    row = connection.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+    if row is None or row[0] != version:
+        with connection:
+            connection.execute("DELETE FROM records")
+            connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,))
+
+    return connection
+
+
+def load_records(cache_file, version, kind):
+    """
+    Loads all cached records of a kind.
+
+    Parameters
+    ----------
+    cache_file : string
+        Path to the SQLite cache file.
+
+    version : string
+        Analyzer version (see analyzer_version).
+
+    kind : string
+        Kind of record (e.g. "acquisition").
+
+    Returns
+    -------
+    records : dictionary
+        path -> (key, value). Empty if the cache can't be read.
+    """
+    try:
+        connection = open_analyzer_cache(cache_file, version)
+        try:
+            rows = connection.execute("SELECT path, key, value FROM records WHERE kind = ?", (kind,)).fetchall()
+        finally:
+            connection.close()
+    except sqlite3.Error as e:
+        print(f"Unable to read analyzer cache {cache_file}: {e}")
+        return {}
+
+    return {path: (key, json.loads(value)) for path, key, value in rows}
+
+
+def save_records(cache_file, version, kind, records):
+    """
+    Adds (or replaces) cached records of a kind.
+
+    Parameters
+    ----------
+    cache_file : string
+        Path to the SQLite cache file.
+
+    version : string
+        Analyzer version (see analyzer_version).
+
+    kind : string
+        Kind of record (e.g. "acquisition").
+
+    records : dictionary
+        path -> (key, value), where value is JSON-serializable.
+    """
+    try:
+        connection = open_analyzer_cache(cache_file, version)
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)",
+                    ((kind, path, key, json.dumps(value)) for path, (key, value) in records.items())
+                )
+        finally:
+            connection.close()
+    except sqlite3.Error as e:
+        print(f"Unable to write analyzer cache {cache_file}: {e}")
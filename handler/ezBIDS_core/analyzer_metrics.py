@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Per-stage performance metrics of an analyzer run (wall time, CPU time, peak RSS growth, item counts),
+written to ezBIDS_core.metrics.json in the session directory so that slow sessions can be diagnosed
+and runs aggregated across sessions.
+
+Layout of ezBIDS_core.metrics.json:
+    version: layout version
+    started: start of the run (seconds since the epoch)
+    wall_time: duration of the run (seconds)
+    cpu_time: CPU time of the analyzer process, including imports (seconds)
+    peak_rss: peak resident set size of the run (bytes)
+    counts: final item counts (files, acquisitions, unique series, ...)
+    stages: list of {name, wall_time, cpu_time, peak_rss_delta, counts}, in execution order
+
+CPU time includes that of worker processes (e.g. the generate_dataset_list process pool).
+"""
+
+import os
+import json
+import time
+import resource
+from contextlib import contextmanager
+
+ANALYZER_METRICS_FILE = "ezBIDS_core.metrics.json"
+
+# Bump when the layout of the metrics file changes
+ANALYZER_METRICS_VERSION = 1
+
+
+def cpu_time():
+    """
+    CPU time (user + system) used by this process and its terminated child processes, in seconds.
+    """
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return self_usage.ru_utime + self_usage.ru_stime + children_usage.ru_utime + children_usage.ru_stime
+
+
+def peak_rss():
+    """
+    Peak resident set size of this process, in bytes (ru_maxrss is in kilobytes on Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def new_metrics():
+    """
+    Starts recording the metrics of an analyzer run.
+
+    Returns
+    -------
+    metrics : dictionary
+        See the module docstring; completed by write_metrics.
+    """
+    return {
+        "version": ANALYZER_METRICS_VERSION,
+        "started": time.time(),
+        "wall_time": None,
+        "cpu_time": None,
+        "peak_rss": None,
+        "counts": {},
+        "stages": []
+    }
+
+
+@contextmanager
+def measure_stage(metrics, name):
+    """
+    Records the metrics of the analyzer stage run in the with block.
+
+    Parameters
+    ----------
+    metrics : dictionary
+        Metrics of the run (see new_metrics).
+
+    name : string
+        Name of the stage (usually the function it runs).
+
+    Yields
+    ------
+    counts : dictionary
+        Item counts of the stage (e.g. counts["acquisitions"] = 10), filled in by the caller.
+        They are also kept as the run's latest counts.
+    """
+    counts = {}
+    start_wall = time.perf_counter()
+    start_cpu = cpu_time()
+    start_rss = peak_rss()
+
+    yield counts
+
+    metrics["stages"].append({
+        "name": name,
+        "wall_time": round(time.perf_counter() - start_wall, 6),
+        "cpu_time": round(cpu_time() - start_cpu, 6),
+        "peak_rss_delta": peak_rss() - start_rss,
+        "counts": counts
+    })
+    metrics["counts"].update(counts)
+
+
+def write_metrics(metrics, data_dir="."):
+    """
+    Completes the metrics of the run, and writes them to ezBIDS_core.metrics.json.
+
+    Parameters
+    ----------
+    metrics : dictionary
+        Metrics of the run (see new_metrics).
+
+    data_dir : string
+        Session directory.
+    """
+    metrics["wall_time"] = round(time.time() - metrics["started"], 6)
+    metrics["cpu_time"] = round(cpu_time(), 6)
+    metrics["peak_rss"] = peak_rss()
+
+    with open(os.path.join(data_dir, ANALYZER_METRICS_FILE), "w") as fp:
+        json.dump(metrics, fp, indent=3)
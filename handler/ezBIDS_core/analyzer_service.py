@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+
+"""
+Long-lived analyzer service. A fresh analyzer process per session spends most of a small session's time
+starting up: importing nibabel/numpy/matplotlib/pandas, and (for thumbnails) doing so again for every image.
+The service does this once, and then runs jobs for session directories, one at a time:
+    analyze: ezBIDS_core.analyze. The analyzer context (BIDS schema, Cognitive Atlas tasks) is loaded for
+        each job, which is cheap from their on-disk caches, so refreshed snapshots and schemas are used.
+    thumbnails: createThumbnailsMovies for each file of the session's `list`, in a pool of processes
+        forked after the imports (so they start warm)
+
+It listens on a Unix socket (EZBIDS_ANALYZER_SOCKET). Requests and replies are JSON lines: the client
+sends {"job", "data_dir", "version", "environment"}; the service streams the job's output as
+{"output": text}, and ends with {"status": "ok"} or {"status": "error", "error": traceback}. A job is
+abandoned if its client disconnects (e.g. when the session is canceled).
+
+The analyze and thumbnails commands use the service when it is running, and otherwise run the job in the
+calling process (as ezBIDS_core.py and createThumbnailsMovies.py do), so preprocess.sh works either way.
+The job is also run in the calling process if the service runs other analyzer code than the caller's
+("version", a hash of the analyzer modules; the service replies {"status": "stale"}), e.g. between a deploy
+and the service's restart, or if the service stops during the job. Analyzer options are set by the
+caller's EZBIDS_ANALYZER_* environment variables ("environment"; see ezBIDS_core.analyzer_options), as for
+a job run in the calling process. The thumbnail pool gives the service threads, which forked processes
+don't get copies of (a lock held by one of them would never be released in the child), so the analyzer's
+extraction processes are started from a forkserver instead, with ezBIDS_core preloaded.
+
+A job's output is captured by redirecting sys.stdout (contextlib.redirect_stdout) for the whole service
+process, which only works because the server handles one connection at a time: with a threading or
+forking server, concurrent jobs would write to each other's clients.
+
+usage: ./analyzer_service.py serve [--socket PATH] [--thumbnail-workers N] [--preload-meg]
+       ./analyzer_service.py analyze|thumbnails <data_dir> [--socket PATH] [--local]
+"""
+
+import io
+import os
+import sys
+import json
+import signal
+import socket
+import argparse
+import traceback
+import socketserver
+import multiprocessing
+import multiprocessing.forkserver
+from glob import glob
+from contextlib import redirect_stdout
+from analyzer_cache import analyzer_version
+
+ANALYZER_SOCKET = os.environ.get("EZBIDS_ANALYZER_SOCKET", "/tmp/ezbids-analyzer.sock")
+
+# Number of thumbnail processes (preprocess.sh used to run createThumbnailsMovies.py with parallel -j 6)
+THUMBNAIL_WORKERS = int(os.environ.get("EZBIDS_THUMBNAIL_WORKERS", 6))
+
+JOBS = ["analyze", "thumbnails"]
+
+# Modules the service runs jobs with
+ANALYZER_SOURCES = sorted(glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py")))
+
+
+class JobOutput(io.TextIOBase):
+    """
+    Stdout of a job run by the service, sent to the client line by line.
+    """
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.pending = ""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.pending += text
+        if "\n" in self.pending:
+            lines, self.pending = self.pending.rsplit("\n", 1)
+            send_message(self.wfile, {"output": lines + "\n"})
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            send_message(self.wfile, {"output": self.pending})
+            self.pending = ""
+
+
+def analyzer_source_version():
+    """
+    Version of the analyzer code on disk (see analyzer_cache.analyzer_version), compared by the service
+    with its callers', so that a service still running other code than the caller's doesn't run its jobs.
+    """
+    return analyzer_version(*ANALYZER_SOURCES)
+
+
+def analyzer_environment():
+    """
+    The EZBIDS_ANALYZER_* environment variables of this process, sent with jobs to the service.
+    """
+    return {key: value for key, value in os.environ.items() if key.startswith("EZBIDS_ANALYZER_")}
+
+
+def send_message(wfile, message):
+    """
+    Writes a JSON-line message to a socket file.
+    """
+    wfile.write((json.dumps(message) + "\n").encode())
+    wfile.flush()
+
+
+def session_image_files(data_dir):
+    """
+    Paths of the session's images (relative to data_dir), from the `list` file written by preprocess.sh.
+    """
+    with open(os.path.join(data_dir, "list")) as list_file:
+        return [x.strip() for x in list_file.read().split("\n") if x.strip()]
+
+
+def thumbnail_job(data_dir, img_file):
+    """
+    Creates the thumbnails of one image, capturing its output.
+
+    Returns
+    -------
+    output : string
+        Output of createThumbnailsMovies.
+
+    error : string
+        Traceback of the failure, or None.
+    """
+    from createThumbnailsMovies import create_thumbnails
+
+    output = io.StringIO()
+    error = None
+    with redirect_stdout(output):
+        try:
+            create_thumbnails(data_dir, img_file)
+        except Exception:
+            error = traceback.format_exc()
+
+    return output.getvalue(), error
+
+
+def create_session_thumbnails(data_dir, pool):
+    """
+    Creates the thumbnails of all the session's images, in a process pool.
+
+    Parameters
+    ----------
+    data_dir : string
+        Root-level directory where uploaded data is stored.
+
+    pool : multiprocessing.pool.Pool
+        Thumbnail processes.
+    """
+    img_files = session_image_files(data_dir)
+    print(f"Creating thumbnails for {len(img_files)} files")
+
+    failed = []
+    results = pool.starmap(thumbnail_job, [(data_dir, x) for x in img_files], chunksize=1)
+    for img_file, (output, error) in zip(img_files, results):
+        sys.stdout.write(output)
+        if error is not None:
+            print(error)
+            failed.append(img_file)
+
+    if len(failed):
+        raise RuntimeError(f"Could not create the thumbnails of {len(failed)} of {len(img_files)} files "
+                           f"(first: {failed[0]})")
+
+
+def run_job(job, data_dir, pool=None, options=None):
+    """
+    Runs a job on a session directory.
+
+    Parameters
+    ----------
+    job : string
+        One of JOBS.
+
+    data_dir : string
+        Root-level directory where uploaded data is stored.
+
+    pool : multiprocessing.pool.Pool, optional
+        Thumbnail processes; created for the job if not provided.
+
+    options : dictionary, optional
+        Overrides of the analyzer options (see ezBIDS_core.ANALYZER_OPTIONS).
+    """
+    if job not in JOBS:
+        raise ValueError(f"Unknown job: {job}")
+    if not os.path.isdir(data_dir):
+        raise ValueError(f"No such session directory: {data_dir}")
+
+    if job == "analyze":
+        from ezBIDS_core import analyze
+
+        analyze(data_dir, options)
+
+    elif pool is not None:
+        create_session_thumbnails(data_dir, pool)
+
+    else:
+        # Import before forking, so that the processes don't each import matplotlib and pandas
+        import createThumbnailsMovies  # noqa: F401
+
+        with multiprocessing.get_context("fork").Pool(THUMBNAIL_WORKERS) as pool:
+            create_session_thumbnails(data_dir, pool)
+
+
+class AnalyzerRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Runs the job requested on a connection to the service.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # Connection closed without a request (e.g. checking whether the service is running)
+            return
+
+        try:
+            request = json.loads(line)
+            if request.get("version") != self.server.version:
+                reply = {"status": "stale"}
+            else:
+                from ezBIDS_core import analyzer_options
+
+                options = dict(analyzer_options(request.get("environment", {})), **self.server.analyzer_options)
+                output = JobOutput(self.wfile)
+                with redirect_stdout(output):
+                    run_job(request["job"], request["data_dir"], self.server.pool, options)
+                output.flush()
+                reply = {"status": "ok"}
+        except Exception:
+            reply = {"status": "error", "error": traceback.format_exc()}
+            print(reply["error"], file=sys.stderr)
+
+        try:
+            send_message(self.wfile, reply)
+        except OSError:
+            # The client is gone (e.g. the session was canceled)
+            pass
+
+
+def serve(socket_path=ANALYZER_SOCKET, thumbnail_workers=THUMBNAIL_WORKERS, preload_meg=False):
+    """
+    Loads the analyzer libraries and context, and runs jobs until interrupted.
+
+    Parameters
+    ----------
+    socket_path : string
+        Path of the Unix socket to listen on.
+
+    thumbnail_workers : int
+        Number of thumbnail processes.
+
+    preload_meg : boolean
+        Also import mne (only used for MEG uploads, and slow to import).
+    """
+    version = analyzer_source_version()
+
+    import createThumbnailsMovies  # noqa: F401
+    from ezBIDS_core import load_analyzer_context
+
+    if preload_meg:
+        import mne  # noqa: F401
+
+    # Fail now rather than on the first job if the analyzer context can't be loaded (jobs load it again,
+    # from the on-disk caches this fills)
+    load_analyzer_context()
+
+    if os.path.exists(socket_path):
+        # Left over by a service that didn't exit cleanly, unless one is still running
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            if sock.connect_ex(socket_path) == 0:
+                sys.exit(f"An analyzer service is already listening on {socket_path}")
+        os.remove(socket_path)
+
+    # Start the forkserver (a fresh process) before the thumbnail pool's threads, with the analyzer imported
+    # once there rather than in each extraction process. The forkserver doesn't get this process' sys.path,
+    # so the analyzer modules are made importable through PYTHONPATH.
+    os.environ["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(os.path.abspath(__file__))] + [x for x in [os.environ.get("PYTHONPATH")] if x]
+    )
+    multiprocessing.forkserver.set_forkserver_preload(["ezBIDS_core"])
+    multiprocessing.forkserver.ensure_running()
+
+    pool = multiprocessing.get_context("fork").Pool(thumbnail_workers)
+
+    # Stop cleanly (removing the socket) on SIGTERM as on SIGINT
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        with socketserver.UnixStreamServer(socket_path, AnalyzerRequestHandler) as server:
+            server.version = version
+            server.pool = pool
+            server.analyzer_options = {"start_method": "forkserver"}
+            print(f"Analyzer service listening on {socket_path}", flush=True)
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.terminate()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def submit(job, data_dir, socket_path=ANALYZER_SOCKET):
+    """
+    Runs a job on the analyzer service, printing its output.
+
+    Returns
+    -------
+    submitted : boolean
+        False if the job wasn't run by the service: no service is listening on socket_path, the service
+        runs another version of the analyzer, or it stopped during the job.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return False
+
+    with sock, sock.makefile("rwb") as f:
+        send_message(f, {"job": job, "data_dir": os.path.abspath(data_dir), "version": analyzer_source_version(),
+                         "environment": analyzer_environment()})
+        for line in f:
+            message = json.loads(line)
+            if "output" in message:
+                sys.stdout.write(message["output"])
+                sys.stdout.flush()
+            elif message["status"] == "error":
+                sys.exit(f"{job} failed on the analyzer service:\n{message['error']}")
+            elif message["status"] == "stale":
+                print(f"The analyzer service runs another version of the analyzer; running the {job} job locally")
+                return False
+            else:
+                return True
+
+    # e.g. restarted by a deploy; the jobs can be rerun from the start
+    print(f"The analyzer service stopped before finishing the {job} job; running it locally")
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["serve"] + JOBS)
+    parser.add_argument("data_dir", nargs="?")
+    parser.add_argument("--socket", default=ANALYZER_SOCKET)
+    parser.add_argument("--local", action="store_true")
+    parser.add_argument("--thumbnail-workers", type=int, default=THUMBNAIL_WORKERS)
+    parser.add_argument("--preload-meg", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.socket, args.thumbnail_workers, args.preload_meg)
+        return
+
+    if args.data_dir is None:
+        parser.error(f"{args.command} requires a data_dir")
+
+    if args.local or not submit(args.command, args.data_dir, args.socket):
+        run_job(args.command, args.data_dir)
+
+
+if __name__ == "__main__":
+    main()
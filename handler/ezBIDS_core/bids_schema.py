@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+"""
+Loads the parts of the BIDS schema (bids-specification/src/schema) that ezBIDS uses, and caches
+the derived structures on disk, keyed by a hash of the schema files' contents. Parsing the schema
+YAML files is slow, so only the first analyzer run after the schema changes pays for it.
+
+usage: ./bids_schema.py <schema_dir>   -> (re)builds the cache for schema_dir
+"""
+
+import os
+import sys
+import json
+import yaml
+import hashlib
+from pathlib import Path
+
+# Bump when the layout of the derived schema changes, so that stale caches are not used
+SCHEMA_CACHE_VERSION = 1
+
+SCHEMA_CACHE_DIR = os.environ.get(
+    "EZBIDS_SCHEMA_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "ezbids")
+)
+
+# Schema files the derived structures are built from (the datatype rules are added per datatype)
+SCHEMA_FILES = [
+    "objects/datatypes.yaml",
+    "objects/entities.yaml",
+    "objects/suffixes.yaml",
+    "rules/dataset_metadata.yaml",
+    "rules/entities.yaml"
+]
+
+
+def schema_files(schema_dir):
+    """
+    List the schema files ezBIDS relies on, relative to the schema directory.
+
+    Parameters
+    ----------
+    schema_dir : str or Path
+        Path to the bids-specification/src/schema directory.
+
+    Returns
+    -------
+    files : list
+        Relative paths of the schema files, in a stable order.
+    """
+    rules_dir = Path(schema_dir) / "rules/datatypes"
+    return SCHEMA_FILES + sorted(f"rules/datatypes/{x.name}" for x in rules_dir.glob("*.yaml"))
+
+
+def schema_hash(schema_dir):
+    """
+    Hash the contents of the schema files ezBIDS relies on.
+
+    Parameters
+    ----------
+    schema_dir : str or Path
+        Path to the bids-specification/src/schema directory.
+
+    Returns
+    -------
+    digest : str
+        Hex digest identifying this version of the schema.
+    """
+    digest = hashlib.sha256(f"ezBIDS schema cache v{SCHEMA_CACHE_VERSION}".encode())
+    for rel_path in schema_files(schema_dir):
+        digest.update(rel_path.encode() + b"\0")
+        digest.update((Path(schema_dir) / rel_path).read_bytes() + b"\0")
+
+    return digest.hexdigest()
+
+
+def parse_schema(schema_dir):
+    """
+    Parse the BIDS schema YAML files into the structures ezBIDS uses.
+
+    Parameters
+    ----------
+    schema_dir : str or Path
+        Path to the bids-specification/src/schema directory.
+
+    Returns
+    -------
+    schema : dictionary
+        datatypes : list of datatype labels (e.g. anat, func)
+        entities : dictionary of entity keys (e.g. subject) mapped to their labels (e.g. sub)
+        suffixes : list of suffix labels
+        dataset_description_fields : list of dataset_description.json fields
+        datatype_rules : dictionary of datatype -> rule group -> suffixes and entities (with requirement level)
+        datatype_suffixes : dictionary of datatype -> all suffixes allowed for that datatype
+        entity_ordering : list of entity keys in the order BIDS expects them in file names
+    """
+    def load(rel_path):
+        with open(Path(schema_dir) / rel_path) as f:
+            return yaml.load(f, Loader=yaml.CSafeLoader if hasattr(yaml, "CSafeLoader") else yaml.SafeLoader)
+
+    datatypes_yaml = load("objects/datatypes.yaml")
+    entities_yaml = load("objects/entities.yaml")
+
+    datatype_rules = {}
+    datatype_suffixes = {}
+    for datatype in datatypes_yaml:
+        rule = load(f"rules/datatypes/{datatype}.yaml")
+        datatype_rules[datatype] = {
+            key: {
+                "suffixes": rule[key]["suffixes"],
+                "entities": rule[key]["entities"]
+            } for key in rule
+        }
+        datatype_suffixes[datatype] = [x for key in rule for x in rule[key]["suffixes"]]
+
+    return {
+        "datatypes": list(datatypes_yaml),
+        "entities": {key: entities_yaml[key]["entity"] for key in entities_yaml},
+        "suffixes": list(load("objects/suffixes.yaml")),
+        "dataset_description_fields": list(load("rules/dataset_metadata.yaml")["dataset_description"]["fields"]),
+        "datatype_rules": datatype_rules,
+        "datatype_suffixes": datatype_suffixes,
+        "entity_ordering": load("rules/entities.yaml")
+    }
+
+
+def load_bids_schema(schema_dir, cache_dir=SCHEMA_CACHE_DIR):
+    """
+    Load the derived BIDS schema structures, from the on-disk cache if the schema hasn't
+    changed since it was written, otherwise by parsing the schema (and then caching it).
+
+    Parameters
+    ----------
+    schema_dir : str or Path
+        Path to the bids-specification/src/schema directory.
+
+    cache_dir : str, optional
+        Directory the derived schema is cached in. Caching is skipped if it can't be written.
+
+    Returns
+    -------
+    schema : dictionary
+        See parse_schema, plus entity_ordering_index (entity key -> position in entity_ordering).
+    """
+    cache_file = os.path.join(cache_dir, f"bids_schema_{schema_hash(schema_dir)}.json")
+
+    try:
+        with open(cache_file) as f:
+            schema = json.load(f)
+    except (OSError, ValueError):
+        schema = parse_schema(schema_dir)
+
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(schema, f)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print(f"Unable to cache BIDS schema in {cache_dir}: {e}")
+
+    schema["entity_ordering_index"] = {entity: index for index, entity in enumerate(schema["entity_ordering"])}
+
+    return schema
+
+
+if __name__ == "__main__":
+    load_bids_schema(sys.argv[1])
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+"""
+Local snapshot of the Cognitive Atlas task names, so that the analyzer doesn't depend on
+(or wait for) the Cognitive Atlas API.
+
+The snapshot shipped with ezBIDS (cog_atlas_tasks.json, committed next to this file with the time it was
+retrieved, and copied into the handler image; EZBIDS_COG_ATLAS_SNAPSHOT) is used unless a more recent one
+has been fetched into the cache directory. Snapshots older than the TTL are refreshed in a detached
+background process, so the refreshed task list is used by later runs; this is the only time the analyzer
+calls the API. Air-gapped deployments can set EZBIDS_COG_ATLAS_TTL=0 to never refresh.
+
+To update the shipped snapshot, run ./cog_atlas.py --snapshot cog_atlas_tasks.json (from this directory,
+with network access) and commit the result.
+
+Without any snapshot the analyzer fails (task entities could otherwise not be identified), after starting
+a background refresh, so that a later run can succeed if the API can be reached.
+
+usage: ./cog_atlas.py [--snapshot <path>]   -> fetches the task names and writes a snapshot
+(to the cache directory by default)
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from urllib.request import urlopen
+
+COG_ATLAS_URL = "http://cognitiveatlas.org/api/v-alpha/task"
+
+# Bump when the layout of the snapshot file changes
+COG_ATLAS_SNAPSHOT_VERSION = 1
+
+COG_ATLAS_SNAPSHOT = os.environ.get(
+    "EZBIDS_COG_ATLAS_SNAPSHOT",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cog_atlas_tasks.json")
+)
+
+COG_ATLAS_CACHE_DIR = os.environ.get(
+    "EZBIDS_COG_ATLAS_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "ezbids")
+)
+
+# Seconds before a snapshot is considered stale and refreshed in the background (0 disables refreshing)
+COG_ATLAS_TTL = int(os.environ.get("EZBIDS_COG_ATLAS_TTL", 7 * 24 * 60 * 60))
+
+# Seconds to wait for the Cognitive Atlas API
+COG_ATLAS_TIMEOUT = 30
+
+
+def fetch_cog_atlas_task_names(url=COG_ATLAS_URL):
+    """
+    Retrieves the names of all tasks from the Cognitive Atlas API task webpage.
+
+    Parameters
+    ----------
+    url : string
+        web url of the Cognitive Atlas API task page.
+
+    Returns
+    -------
+    names : list
+        Task names, in the order the API lists them.
+    """
+    with urlopen(url, timeout=COG_ATLAS_TIMEOUT) as url_contents:
+        data = json.load(url_contents)
+
+    return [x["name"] for x in data]
+
+
+def read_snapshot(snapshot_file):
+    """
+    Reads a Cognitive Atlas task snapshot.
+
+    Parameters
+    ----------
+    snapshot_file : string
+        Path to the snapshot file.
+
+    Returns
+    -------
+    snapshot : dictionary or None
+        version, source (url), retrieved (seconds since the epoch), and names (task names).
+        None if the snapshot doesn't exist, can't be read, or has a different version.
+    """
+    try:
+        with open(snapshot_file) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(snapshot, dict) or snapshot.get("version") != COG_ATLAS_SNAPSHOT_VERSION:
+        return None
+
+    return snapshot
+
+
+def write_snapshot(snapshot_file, url=COG_ATLAS_URL):
+    """
+    Fetches the Cognitive Atlas task names and writes them to a snapshot file.
+
+    Parameters
+    ----------
+    snapshot_file : string
+        Path to the snapshot file. The file is replaced atomically.
+
+    url : string
+        web url of the Cognitive Atlas API task page.
+
+    Returns
+    -------
+    snapshot : dictionary
+        The snapshot that was written (see read_snapshot).
+    """
+    snapshot = {
+        "version": COG_ATLAS_SNAPSHOT_VERSION,
+        "source": url,
+        "retrieved": int(time.time()),
+        "names": fetch_cog_atlas_task_names(url)
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(snapshot_file)), exist_ok=True)
+    tmp_file = f"{snapshot_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(snapshot, f, indent=1)
+    os.replace(tmp_file, snapshot_file)
+
+    return snapshot
+
+
+def refresh_in_background(cache_dir=COG_ATLAS_CACHE_DIR, url=COG_ATLAS_URL):
+    """
+    Starts a detached process that refreshes the cached snapshot, unless a refresh is
+    already in progress. The process outlives the analyzer run that started it.
+
+    Parameters
+    ----------
+    cache_dir : string
+        Directory the refreshed snapshot is written to.
+
+    url : string
+        web url of the Cognitive Atlas API task page.
+    """
+    lock_file = os.path.join(cache_dir, "cog_atlas_tasks.lock")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Ignore locks left behind by refreshes that died
+        if os.path.isfile(lock_file) and time.time() - os.path.getmtime(lock_file) > 2 * COG_ATLAS_TIMEOUT:
+            os.remove(lock_file)
+        os.close(os.open(lock_file, os.O_CREAT | os.O_EXCL))
+    except OSError:
+        return
+
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--snapshot", os.path.join(cache_dir, "cog_atlas_tasks.json"),
+         "--url", url, "--lock", lock_file],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+
+
+def load_cog_atlas_task_names(url=COG_ATLAS_URL, ttl=COG_ATLAS_TTL, cache_dir=COG_ATLAS_CACHE_DIR):
+    """
+    Loads the Cognitive Atlas task names from the most recent local snapshot (shipped or cached),
+    starting a background refresh if it is older than ttl. The API is never called directly.
+
+    Parameters
+    ----------
+    url : string
+        web url of the Cognitive Atlas API task page.
+
+    ttl : int
+        Seconds before a snapshot is considered stale. 0 disables refreshing.
+
+    cache_dir : string
+        Directory refreshed snapshots are written to.
+
+    Returns
+    -------
+    names : list
+        Task names, in the order the API lists them. Raises RuntimeError if no snapshot exists.
+    """
+    cache_file = os.path.join(cache_dir, "cog_atlas_tasks.json")
+    snapshots = [x for x in [read_snapshot(COG_ATLAS_SNAPSHOT), read_snapshot(cache_file)] if x is not None]
+
+    if not len(snapshots):
+        if ttl:
+            refresh_in_background(cache_dir, url)
+        raise RuntimeError(
+            f"No Cognitive Atlas task snapshot ({COG_ATLAS_SNAPSHOT} or {cache_file}). Create one with "
+            f"./cog_atlas.py --snapshot {COG_ATLAS_SNAPSHOT} on a host with network access."
+        )
+
+    snapshot = max(snapshots, key=lambda x: x["retrieved"])
+    if ttl and time.time() - snapshot["retrieved"] > ttl:
+        refresh_in_background(cache_dir, url)
+
+    return snapshot["names"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snapshot", default=os.path.join(COG_ATLAS_CACHE_DIR, "cog_atlas_tasks.json"))
+    parser.add_argument("--url", default=COG_ATLAS_URL)
+    parser.add_argument("--lock", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    try:
+        write_snapshot(args.snapshot, args.url)
+    finally:
+        if args.lock:
+            os.remove(args.lock)
@@ -23,6 +23,8 @@ plt.style.use('dark_background')
 
 os.environ['MPLCONFIGDIR'] = os.getcwd() + "/configs/"
 
+MEG_extensions = [".ds", ".fif", ".sqd", ".con", ".raw", ".ave", ".mrk", ".kdf", ".mhd", ".trg", ".chn", ".dat"]
+
 # Functions
 
 
@@ -150,61 +152,76 @@ def create_DWIshell_thumbnails(img_file, image, bval_file):
         png.save(f"{output_file}_shell-{bval}.png")
 
 
-# Begin:
-data_dir = sys.argv[1]
-img_file = sys.argv[2]
-MEG_extensions = [".ds", ".fif", ".sqd", ".con", ".raw", ".ave", ".mrk", ".kdf", ".mhd", ".trg", ".chn", ".dat"]
-os.chdir(data_dir)
-
-if img_file.endswith(tuple(MEG_extensions)):
-    print("")
-    print(f"Creating thumbnails for {img_file}")
-    print("")
-    create_MEG_thumbnail(img_file)
-else:
-    if not img_file.endswith('blood.json'):
-        output_dir = img_file.split(".nii.gz")[0]
-        image = nib.load(img_file)
-
-        if len([x for x in image.shape if x < 0]):  # image has negative dimension(s), cannot process
-            print(f"{img_file} has negative dimension(s), cannot process")
-        else:
-            # if image.get_data_dtype() == [('R', 'u1'), ('G', 'u1'), ('B', 'u1')]:
-            if image.get_data_dtype() not in ["<i2", "<u2", "<f4", "int16", "uint16"]:
-                # Likely non-imaging acquisition. Example: "facMapReg" sequences in NYU_Shanghai dataset
-                print(
-                    f"{img_file} doesn't appear to be an "
-                    "imaging acquisition and therefore will "
-                    "not be converted to BIDS. Please modify "
-                    "if incorrect."
-                )
-            else:
-                # object_img_array = image.dataobj[:]
+def create_thumbnails(data_dir, img_file):
+    """
+    Generates the thumbnail(s) of an uploaded image: a PNG per MEG plot type, or a PNG of the NIfTI
+    image (plus one per DWI shell).
+
+    Parameters
+    ----------
+
+    data_dir : string
+        Root-level directory where uploaded data is stored.
+
+    img_file : string
+        path of the image, relative to data_dir (as listed in the `list` file).
+    """
+    os.chdir(data_dir)
+
+    if img_file.endswith(tuple(MEG_extensions)):
+        print("")
+        print(f"Creating thumbnails for {img_file}")
+        print("")
+        create_MEG_thumbnail(img_file)
+    else:
+        if not img_file.endswith('blood.json'):
+            output_dir = img_file.split(".nii.gz")[0]
+            image = nib.load(img_file)
 
-                bval_file = img_file.split(".nii.gz")[0].split("./")[-1] + ".bval"
-                if not os.path.isfile(f"{data_dir}/{bval_file}"):
-                    bval_file = "n/a"
+            if len([x for x in image.shape if x < 0]):  # image has negative dimension(s), cannot process
+                print(f"{img_file} has negative dimension(s), cannot process")
+            else:
+                # if image.get_data_dtype() == [('R', 'u1'), ('G', 'u1'), ('B', 'u1')]:
+                if image.get_data_dtype() not in ["<i2", "<u2", "<f4", "int16", "uint16"]:
+                    # Likely non-imaging acquisition. Example: "facMapReg" sequences in NYU_Shanghai dataset
+                    print(
+                        f"{img_file} doesn't appear to be an "
+                        "imaging acquisition and therefore will "
+                        "not be converted to BIDS. Please modify "
+                        "if incorrect."
+                    )
                 else:
-                    bvals = [x.split(" ") for x in pd.read_csv(bval_file).columns.tolist()][0]
-                    bvals = [floor(float(x)) for x in bvals if not isinstance(x, str)]
+                    # object_img_array = image.dataobj[:]
 
-                    if len(bvals) <= 1:  # just b0, so unhelpful
+                    bval_file = img_file.split(".nii.gz")[0].split("./")[-1] + ".bval"
+                    if not os.path.isfile(f"{data_dir}/{bval_file}"):
                         bval_file = "n/a"
+                    else:
+                        bvals = [x.split(" ") for x in pd.read_csv(bval_file).columns.tolist()][0]
+                        bvals = [floor(float(x)) for x in bvals if not isinstance(x, str)]
+
+                        if len(bvals) <= 1:  # just b0, so unhelpful
+                            bval_file = "n/a"
 
-                # Create thumbnail
-                if img_file != "n/a":
-                    print("")
-                    print(f"Creating thumbnail for {img_file}")
-                    print("")
-                    create_thumbnail(img_file, image)
-
-                # Create thumbnail of each DWI's unique shell
-                if bval_file != "n/a":
-                    print("")
-                    print(f"Creating thumbnail(s) for each DWI shell in {img_file}")
-                    print("")
-                    create_DWIshell_thumbnails(img_file, image, bval_file)
-
-            # Remove the folder containing the PNGs for movie generation; don't need them anymore
-            if os.path.isdir(output_dir):
-                shutil.rmtree(output_dir)
+                    # Create thumbnail
+                    if img_file != "n/a":
+                        print("")
+                        print(f"Creating thumbnail for {img_file}")
+                        print("")
+                        create_thumbnail(img_file, image)
+
+                    # Create thumbnail of each DWI's unique shell
+                    if bval_file != "n/a":
+                        print("")
+                        print(f"Creating thumbnail(s) for each DWI shell in {img_file}")
+                        print("")
+                        create_DWIshell_thumbnails(img_file, image, bval_file)
+
+                # Remove the folder containing the PNGs for movie generation; don't need them anymore
+                if os.path.isdir(output_dir):
+                    shutil.rmtree(output_dir)
+
+
+# Begin:
+if __name__ == "__main__":
+    create_thumbnails(sys.argv[1], sys.argv[2])
@@ -12,55 +12,124 @@ edits/modifications as they see fit, before finalizing their data into a BIDS-co
 from __future__ import division
 import os
 import re
+import csv
+import copy
 import sys
-import mne
 import json
-import yaml
 import time
+import multiprocessing
 import numpy as np
-import pandas as pd
 import nibabel as nib
 from pathlib import Path
 from datetime import date
 from natsort import natsorted
 from operator import itemgetter
-from urllib.request import urlopen
-
-DATA_DIR = sys.argv[1]
+from itertools import dropwhile
+from collections import Counter, namedtuple
+from bisect import bisect_left, insort
+from concurrent.futures import ProcessPoolExecutor
+from bids_schema import load_bids_schema
+from cog_atlas import COG_ATLAS_URL, load_cog_atlas_task_names
+from ezbids_template import find_template_series, find_template_sidecar, load_template
+from ezbids_json import write_ezBIDS_core
+from nifti_headers import format_header, header_key
+from analyzer_metrics import new_metrics, measure_stage, write_metrics
+from upload_index import (add_upload_file, build_upload_index, find_stem_files, rename_upload_file,
+                          upload_dir_entries, upload_path_exists)
+from analyzer_cache import ANALYZER_CACHE_FILE, analyzer_version, cache_key, file_signature, load_records, save_records
 
 PROJECT_DIR = Path(__file__).resolve().parents[2]
 BIDS_SCHEMA_DIR = PROJECT_DIR / Path("bids-specification/src/schema")
 
-datatypes_yaml = yaml.load(open(BIDS_SCHEMA_DIR / Path("objects/datatypes.yaml")), Loader=yaml.FullLoader)
-entities_yaml = yaml.load(open(BIDS_SCHEMA_DIR / Path("objects/entities.yaml")), Loader=yaml.FullLoader)
-suffixes_yaml = yaml.load(open(BIDS_SCHEMA_DIR / Path("objects/suffixes.yaml")), Loader=yaml.FullLoader)
-dataset_description_yaml = yaml.load(open(BIDS_SCHEMA_DIR / Path("rules/dataset_metadata.yaml")),
-                                     Loader=yaml.FullLoader)
-datatype_suffix_rules = str(BIDS_SCHEMA_DIR / Path("rules/datatypes"))
-entity_ordering_file = str(BIDS_SCHEMA_DIR / Path("rules/entities.yaml"))
-
-cog_atlas_url = "http://cognitiveatlas.org/api/v-alpha/task"
-
 accepted_datatypes = ["anat", "dwi", "fmap", "func", "perf", "pet", "meg"]  # Will add others later
 
 MEG_extensions = [".ds", ".fif", ".sqd", ".con", ".raw", ".ave", ".mrk", ".kdf", ".mhd", ".trg", ".chn", ".dat"]
 
-bids_compliant = pd.read_csv(f"{DATA_DIR}/bids_compliant.log", header=None).iloc[1][0]
-if bids_compliant == "true":
-    bids_compliant = True
-else:
-    bid_compliant = False
+# Number of processes the NIfTI headers are read and the acquisition information extracted with (1 to not use a
+# process pool), unless EZBIDS_ANALYZER_WORKERS is set. The number of CPUs, up to 4, since the handler may
+# analyze several sessions at once.
+DEFAULT_ANALYZER_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def analyzer_options(environ):
+    """
+    Analyze options set by the EZBIDS_ANALYZER_* environment variables. The analyzer service applies those
+    of the process submitting each job, so that jobs run as they would from the command line.
+
+    Parameters
+    ----------
+    environ : dictionary
+        Environment variables (e.g. os.environ).
+
+    Returns
+    -------
+    options : dictionary
+        See ANALYZER_OPTIONS.
+    """
+    return {
+        # Number of extraction processes (see DEFAULT_ANALYZER_WORKERS)
+        "workers": int(environ.get("EZBIDS_ANALYZER_WORKERS", DEFAULT_ANALYZER_WORKERS)),
+        # Cache per-file results in the session directory, so reruns only process new or changed files
+        "analyzer_cache": environ.get("EZBIDS_ANALYZER_CACHE", "1") != "0",
+        # How the extraction processes are started: fork, or forkserver from a process with threads, which
+        # fork could deadlock (see analyzer_service.py)
+        "start_method": "fork"
+    }
+
 
-start_time = time.perf_counter()
-analyzer_dir = os.getcwd()
+# Default analyze options (set by this process' environment variables)
+ANALYZER_OPTIONS = analyzer_options(os.environ)
 
-today_date = date.today().strftime("%Y-%m-%d")
+# Results cached by other versions of the analyzer are never used
+ANALYZER_VERSION = analyzer_version(__file__)
 
-os.chdir(DATA_DIR)
+# Compact, immutable per-image record of the NIfTI information needed after generate_dataset_list
+NiftiSummary = namedtuple("NiftiSummary", ["dtype", "shape", "negative_dims", "header_block"])
 
 # Functions
 
 
+def read_bids_compliant_log(data_dir):
+    """
+    Reads the bids_compliant.log file written by preprocess.sh.
+
+    Parameters
+    ----------
+    data_dir : string
+        Root-level directory where uploaded data is stored and assessed.
+
+    Returns
+    -------
+    bids_root_dir : string
+        Path to the root of the uploaded BIDS dataset (or data_dir if the upload isn't BIDS).
+
+    bids_compliant : boolean
+        True if the uploaded data is a BIDS-compliant dataset.
+    """
+    with open(f"{data_dir}/bids_compliant.log") as f:
+        lines = f.read().splitlines()
+
+    return lines[0], lines[1].strip() == "true"
+
+
+def read_list_file(list_file):
+    """
+    Reads a file listing one path per line (e.g. the list of uploaded files generated by find_img_data.py).
+
+    Parameters
+    ----------
+    list_file : string
+        Path to the list file.
+
+    Returns
+    -------
+    paths : list
+        Paths in the list file, in order, without blank lines.
+    """
+    with open(list_file) as f:
+        return [x for x in f.read().split("\n") if x.strip()]
+
+
 def _sidecar_json(raw, task, manufacturer, fname, datatype, emptyroom_fname=None, overwrite=True):
     """Create a sidecar json file depending on the suffix and save it.
 
@@ -90,6 +159,7 @@ def _sidecar_json(raw, task, manufacturer, fname, datatype, emptyroom_fname=None
         Defaults to False.
 
     """
+    import mne
     from mne import Epochs
     from mne.io import BaseRaw
     from mne.utils import logger
@@ -282,88 +352,147 @@ def _sidecar_json(raw, task, manufacturer, fname, datatype, emptyroom_fname=None
     _write_json(fname, ch_info_json, overwrite)
 
 
-def fix_multiple_dots(uploaded_img_list):
-    '''
-    Occasionally, data files with have multiple periods ('.') in their file names.
-    This can cause problems when determining the file extension, so this function remove
-    all extra periods except for the one at the end (assumined to be the extension).
+def multiple_dots_ext(img_file):
+    """
+    Extension of a data file name that has extra periods, or None if the name is fine.
 
     Parameters
     ----------
-    uploaded_img_list : list
-        List of data files derived from preprocess.sh
+    img_file : string
+        Data file name (without directory).
 
     Returns
     -------
+    ext : string
+    """
+    if img_file.endswith('.nii.gz') and img_file.count('.') > 2:  # for MRI and PET
+        return '.nii.gz'
+    elif img_file.endswith('.v.gz') and img_file.count('.') > 2:  # ECAT-formatted PET
+        return '.v.gz'
+    elif img_file.endswith('.json') and img_file.count('.') > 1:  # for PET blood
+        return '.json'
+    elif img_file.endswith(tuple(MEG_extensions)) and img_file.count('.') > 1:  # for MEG
+        if not img_file.endswith('.ds'):
+            return '.' + img_file.split('.')[-1]
+
+    return None
+
+
+def without_extra_dots(file_name):
+    """
+    File name with the periods before its extension replaced by underscores.
+    """
+    if file_name.endswith('.nii.gz'):
+        ext = '.nii.gz'
+    elif file_name.endswith('.v.gz'):
+        ext = '.v.gz'
+    else:
+        ext = '.' + file_name.split('.')[-1]
+
+    return '_'.join(file_name.split(ext)[0].split('.')) + ext
+
+
+def plan_multiple_dots_renames(uploaded_img_list, upload_index):
+    """
+    Determines the renames fix_multiple_dots makes: the data files with extra periods in their names,
+    and all the files of their directories whose names contain the same stem (e.g. their sidecars).
+
+    Stems are matched as substrings of the file names, by looking up each file name's substrings of
+    the stem lengths.
+
+    Parameters
+    ----------
     uploaded_img_list : list
-        Same list, but with the possibility for corrected file names if they had extra
-        periods that weren't the extension.
-    '''
+        List of data files derived from preprocess.sh
+
+    upload_index : dictionary
+        Index of the upload's files (see upload_index.py).
 
+    Returns
+    -------
+    renames : dictionary
+        Current path -> new path, in the same form as the uploaded_img_list paths.
+    """
+    dir_stems = {}
     for img_path in uploaded_img_list:
         img_file = img_path.split('/')[-1]
-        typo_files = []
-        fix = False
-        if img_file.endswith('.nii.gz') and img_file.count('.') > 2:  # for MRI and PET
-            fix = True
-            ext = '.nii.gz'
-        elif img_file.endswith('.v.gz') and img_file.count('.') > 2:  # ECAT-formatted PET
-            fix = True
-            ext = '.v.gz'
-        elif img_file.endswith('.json') and img_file.count('.') > 1:  # for PET blood
-            fix = True
-            ext = '.json'
-        elif img_file.endswith(tuple(MEG_extensions)) and img_file.count('.') > 1:  # for MEG
-            if not img_file.endswith('.ds'):
-                fix = True
-                ext = '.' + img_file.split('.')[-1]
-        else:
-            pass
+        ext = multiple_dots_ext(img_file)
+        if ext is not None:
+            dir_stems.setdefault(os.path.dirname(img_path), set()).add(img_file.split(ext)[0])
+
+    renames = {}
+    for img_dir, stems in dir_stems.items():
+        stems_by_length = {}
+        for stem in stems:
+            stems_by_length.setdefault(len(stem), set()).add(stem)
+
+        for file_name in upload_dir_entries(upload_index, img_dir):
+            new_file_name = without_extra_dots(file_name)
+            if new_file_name == file_name:
+                continue
+
+            if any(
+                file_name[i:i + length] in length_stems
+                for length, length_stems in stems_by_length.items()
+                for i in range(len(file_name) - length + 1)
+            ):
+                renames[f"{img_dir}/{file_name}"] = f"{img_dir}/{new_file_name}"
 
-        if fix is True:
-            img_dir = os.path.dirname(img_path)
+    return renames
 
-            corresponding_files = [
-                img_dir + '/' + x for x in os.listdir(img_dir)
-                if os.path.basename(img_path).split(ext)[0] in x
-            ]
 
-            if len(corresponding_files):
-                for f in corresponding_files:
-                    typo_files.append(f)
+def fix_multiple_dots(DATA_DIR, uploaded_img_list, upload_index):
+    '''
+    Occasionally, data files with have multiple periods ('.') in their file names.
+    This can cause problems when determining the file extension, so this function remove
+    all extra periods except for the one at the end (assumined to be the extension).
 
-        if len(typo_files):
-            for typo in typo_files:
+    All renames are planned first (see plan_multiple_dots_renames), then applied, and the
+    list file is rewritten once.
 
-                if typo.endswith('.nii.gz'):
-                    ext = '.nii.gz'
-                elif typo.endswith('.v.gz'):
-                    ext = '.v.gz'
-                else:
-                    ext = '.' + typo.split('.')[-1]
+    Parameters
+    ----------
+    DATA_DIR : string
+        Root-level directory where uploaded data is stored and assessed.
 
-                typo_split_list = typo.split(ext)[0].split('.')
+    uploaded_img_list : list
+        List of data files derived from preprocess.sh
 
-                new_file_name = f".{'_'.join(typo_split_list[1:])}{ext}"
+    upload_index : dictionary
+        Index of the upload's files (see upload_index.py), updated with the renames.
+
+    Returns
+    -------
+    uploaded_img_list : list
+        Same list, but with the possibility for corrected file names if they had extra
+        periods that weren't the extension.
+    '''
+    renames = plan_multiple_dots_renames(uploaded_img_list, upload_index)
+    if not len(renames):
+        return uploaded_img_list
 
-                os.system(f'mv {typo} {new_file_name}')
+    for typo, new_file_name in list(renames.items()):
+        try:
+            os.rename(os.path.join(DATA_DIR, typo), os.path.join(DATA_DIR, new_file_name))
+        except OSError as e:
+            print(f"Could not rename {typo} to {new_file_name}: {e}")
+            del renames[typo]
+            continue
+        rename_upload_file(upload_index, typo, new_file_name)
 
-                if typo in uploaded_img_list:
-                    idx = uploaded_img_list.index(typo)
-                    uploaded_img_list.pop(idx)
-                    uploaded_img_list = natsorted(uploaded_img_list + [new_file_name])
+    uploaded_img_list = natsorted([renames.get(x, x) for x in uploaded_img_list])
 
-            # Save to list file
-            with open("list", "w") as f:
-                for line in uploaded_img_list:
-                    f.write(f"{line}\n")
+    # Save to list file
+    with open(os.path.join(DATA_DIR, "list"), "w") as f:
+        for line in uploaded_img_list:
+            f.write(f"{line}\n")
 
     return uploaded_img_list
 
 
-def generate_MEG_json_sidecars(uploaded_img_list):
+def generate_MEG_json_sidecars(DATA_DIR, uploaded_img_list, upload_index):
     """
-    Get the MEG data organized
+    Get the MEG data organized (the JSON sidecars created are added to upload_index)
     """
     img_files = [x.split("./")[-1] for x in uploaded_img_list]
     MEG_img_files = []
@@ -381,6 +510,7 @@ def generate_MEG_json_sidecars(uploaded_img_list):
         """
         Generate the JSON metadata
         """
+        import mne
         from mne_bids.path import _parse_ext
         from mne_bids.sidecar_updates import _update_sidecar
         from mne_bids.config import MANUFACTURERS
@@ -423,6 +553,7 @@ def generate_MEG_json_sidecars(uploaded_img_list):
 
             # Create the JSON sidecar
             _sidecar_json(raw, task, manufacturer, json_output_name, datatype, emptyroom_fname=None, overwrite=True)
+            add_upload_file(upload_index, "./" + os.path.relpath(json_output_name, DATA_DIR))
 
             # Add some fields to the sidecar
             if ses is not None:
@@ -437,7 +568,349 @@ def generate_MEG_json_sidecars(uploaded_img_list):
             _update_sidecar(json_output_name, "SeriesDescription", fname)
 
 
-def modify_uploaded_dataset_list(uploaded_img_list):
+def new_analysis_caches():
+    """
+    Caches of an analysis, created by analyze for each session (so nothing is kept across the sessions
+    analyzed by a process) and passed to the stages that use them.
+
+    Returns
+    -------
+    caches : dictionary
+        "nifti_headers": NIfTI header information (see read_nifti_header), keyed by (path, mtime, size), so
+            each file is only read once per analysis.
+        "tsv_headers": Column names of TSV files (see read_tsv_headers), keyed by (path, mtime, size).
+    """
+    return {"nifti_headers": {}, "tsv_headers": {}}
+
+
+def read_nifti_header(img_file, nifti_header_cache=None):
+    """
+    Reads the header of a NIfTI file. With nifti_header_cache, each file is only loaded
+    once per analyzer run; subsequent calls (from any stage) are served from the cache,
+    which is keyed by the file's path, modification time, and size.
+
+    Parameters
+    ----------
+    img_file : string
+        Path of the NIfTI file.
+
+    nifti_header_cache : dictionary, optional
+        The analysis' NIfTI header cache (see new_analysis_caches).
+
+    Returns
+    -------
+    nifti_header : dictionary
+        The affine, shape, ndim, zooms, and data dtype of the image, as well as the
+        raw header bytes ("header_block", see nifti_headers.py).
+    """
+    if nifti_header_cache is None:
+        nifti_header_cache = {}
+
+    img_stat = os.stat(img_file)
+    key = (os.path.abspath(img_file), img_stat.st_mtime_ns, img_stat.st_size)
+
+    if key not in nifti_header_cache:
+        image = nib.load(img_file)
+        nifti_header_cache[key] = {
+            "affine": image.affine,
+            "shape": tuple(int(x) for x in image.shape),
+            "ndim": image.ndim,
+            "zooms": tuple(float(x) for x in image.header.get_zooms()),
+            "dtype": image.get_data_dtype().str,
+            "header_block": image.header.binaryblock
+        }
+
+    return nifti_header_cache[key]
+
+
+def read_tsv_header_row(tsv_file):
+    """
+    Reads the column names of a TSV file from its first non-blank line, without parsing its rows. Names are
+    those pandas.read_csv(sep="\t") gives well-formed files: a UTF-8 BOM is dropped, empty names become
+    "Unnamed: <position>", and repeated names get ".<n>" suffixes.
+
+    Parameters
+    ----------
+    tsv_file : string
+        Path of the TSV file.
+
+    Returns
+    -------
+    headers : list
+        Column names. Raises ValueError if the file has no header line.
+    """
+    with open(tsv_file, newline="", encoding="utf-8-sig") as f:
+        lines = dropwhile(lambda line: line.strip(" \r\n") == "", f)
+        headers = next(csv.reader(lines, delimiter="\t"), None)
+    if headers is None:
+        raise ValueError(f"No columns to parse from file {tsv_file}")
+
+    unnamed = [index for index, name in enumerate(headers) if name == ""]
+    for index in unnamed:
+        headers[index] = f"Unnamed: {index}"
+
+    # Deduplicate as pandas does: named columns first, then unnamed ones, skipping suffixed names that are
+    # already in the header
+    counts = {}
+    for index in [x for x in range(len(headers)) if x not in unnamed] + unnamed:
+        name = original_name = headers[index]
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[original_name] = count + 1
+            name = f"{original_name}.{count}"
+            if name in headers:
+                count += 1
+            else:
+                count = counts.get(name, 0)
+        headers[index] = name
+        counts[name] = count + 1
+
+    return headers
+
+
+def read_tsv_headers(tsv_file, tsv_headers_cache):
+    """
+    Reads the column names of a TSV file (see read_tsv_header_row). Each file is only read once per analyzer
+    run, or once per session when the analyzer cache is enabled (see load_cached_tsv_headers); subsequent
+    calls are served from tsv_headers_cache, which is keyed by the file's path, modification time, and size.
+
+    Parameters
+    ----------
+    tsv_file : string
+        Path of the TSV file.
+
+    tsv_headers_cache : dictionary
+        The analysis' TSV header cache (see new_analysis_caches).
+
+    Returns
+    -------
+    headers : list
+        Column names.
+    """
+    tsv_stat = os.stat(tsv_file)
+    key = (os.path.abspath(tsv_file), tsv_stat.st_mtime_ns, tsv_stat.st_size)
+
+    if key not in tsv_headers_cache:
+        tsv_headers_cache[key] = read_tsv_header_row(tsv_file)
+
+    return list(tsv_headers_cache[key])
+
+
+def try_read_nifti_header(img_file):
+    """
+    Reads the header of a NIfTI file in a worker process (see read_nifti_header).
+
+    Returns
+    -------
+    nifti_header : dictionary
+        See read_nifti_header, or None if img_file isn't a properly formatted imaging file.
+    """
+    try:
+        return read_nifti_header(img_file)
+    except Exception:
+        return None
+
+
+def cached_nifti_header(img_file, nifti_header_cache):
+    """
+    Header information of a NIfTI file from the analysis' NIfTI header cache, without reading the file.
+
+    Returns
+    -------
+    nifti_header : dictionary
+        See read_nifti_header, or None if the file's header hasn't been read (or the file changed since).
+    """
+    try:
+        img_stat = os.stat(img_file)
+    except OSError:
+        return None
+
+    return nifti_header_cache.get((os.path.abspath(img_file), img_stat.st_mtime_ns, img_stat.st_size))
+
+
+def read_nifti_headers(img_files, nifti_header_cache, workers=1, start_method="fork"):
+    """
+    Reads the headers of NIfTI files into nifti_header_cache, in a process pool. Headers already in the
+    cache (e.g. from the analyzer cache) aren't read again.
+
+    Parameters
+    ----------
+    img_files : list
+        Paths of the NIfTI files.
+
+    nifti_header_cache : dictionary
+        The analysis' NIfTI header cache (see new_analysis_caches).
+
+    workers : int
+        Number of processes to read the headers with (1 to not use a process pool).
+
+    start_method : string
+        How the processes are started (see ANALYZER_OPTIONS).
+
+    Returns
+    -------
+    nifti_headers : list
+        Header information of each file (see read_nifti_header), or None for files that aren't properly
+        formatted imaging files.
+    """
+    nifti_headers = [cached_nifti_header(x, nifti_header_cache) for x in img_files]
+    read_indices = [index for index, nifti_header in enumerate(nifti_headers) if nifti_header is None]
+
+    results = map_in_workers(try_read_nifti_header, [(img_files[index],) for index in read_indices], workers,
+                             start_method)
+    for index, nifti_header in zip(read_indices, results):
+        if nifti_header is not None:
+            img_stat = os.stat(img_files[index])
+            nifti_header_cache[(os.path.abspath(img_files[index]), img_stat.st_mtime_ns, img_stat.st_size)] = \
+                nifti_header
+        nifti_headers[index] = nifti_header
+
+    return nifti_headers
+
+
+def map_in_workers(function, args_list, workers=1, start_method="fork"):
+    """
+    Calls function with each of the argument tuples, in a process pool when there is more than one worker
+    (and more than one call).
+
+    Parameters
+    ----------
+    function : function
+        Module-level function (so that it can be called in worker processes).
+
+    args_list : list
+        Argument tuples.
+
+    workers : int
+        Maximum number of processes.
+
+    start_method : string
+        multiprocessing start method of the processes (see ANALYZER_OPTIONS).
+
+    Returns
+    -------
+    results : list
+        Return values, in the order of args_list.
+    """
+    workers = min(workers, len(args_list))
+    if workers <= 1:
+        return [function(*args) for args in args_list]
+
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(start_method)) as executor:
+        return list(executor.map(function, *zip(*args_list), chunksize=max(1, len(args_list) // (workers * 4))))
+
+
+def load_cached_nifti_headers(cache_file, version, nifti_header_cache):
+    """
+    Adds the NIfTI header information cached by previous analyzer runs of this session
+    to nifti_header_cache. Entries of files that have since changed are never used, since
+    nifti_header_cache is keyed by modification time and size.
+
+    Parameters
+    ----------
+    cache_file : string
+        Path to the session's analyzer cache, or None if caching is disabled.
+
+    version : string
+        Analyzer version (see analyzer_cache.analyzer_version).
+
+    nifti_header_cache : dictionary
+        The analysis' NIfTI header cache (see new_analysis_caches).
+    """
+    if cache_file is None:
+        return
+
+    for path, (_, value) in load_records(cache_file, version, "nifti_header").items():
+        size, mtime_ns = value["signature"]
+        nifti_header_cache[(path, mtime_ns, size)] = {
+            "affine": np.array(value["affine"]),
+            "shape": tuple(value["shape"]),
+            "ndim": value["ndim"],
+            "zooms": tuple(value["zooms"]),
+            "dtype": value["dtype"],
+            "header_block": bytes.fromhex(value["header_block"])
+        }
+
+
+def save_cached_nifti_headers(cache_file, version, nifti_header_cache):
+    """
+    Saves nifti_header_cache to the analyzer cache, for later analyzer runs of this session.
+
+    Parameters
+    ----------
+    cache_file : string
+        Path to the session's analyzer cache, or None if caching is disabled.
+
+    version : string
+        Analyzer version (see analyzer_cache.analyzer_version).
+
+    nifti_header_cache : dictionary
+        The analysis' NIfTI header cache (see new_analysis_caches).
+    """
+    if cache_file is None:
+        return
+
+    records = {}
+    for (path, mtime_ns, size), nifti_header in nifti_header_cache.items():
+        value = dict(nifti_header, affine=nifti_header["affine"].tolist(),
+                     header_block=nifti_header["header_block"].hex(), signature=[size, mtime_ns])
+        records[path] = (f"{size}:{mtime_ns}", value)
+
+    save_records(cache_file, version, "nifti_header", records)
+
+
+def load_cached_tsv_headers(cache_file, version, tsv_headers_cache):
+    """
+    Adds the TSV column names cached by previous analyzer runs of this session to
+    tsv_headers_cache. As for load_cached_nifti_headers, entries of files that have
+    since changed are never used.
+
+    Parameters
+    ----------
+    cache_file : string
+        Path to the session's analyzer cache, or None if caching is disabled.
+
+    version : string
+        Analyzer version (see analyzer_cache.analyzer_version).
+
+    tsv_headers_cache : dictionary
+        The analysis' TSV header cache (see new_analysis_caches).
+    """
+    if cache_file is None:
+        return
+
+    for path, (_, value) in load_records(cache_file, version, "tsv_headers").items():
+        size, mtime_ns = value["signature"]
+        tsv_headers_cache[(path, mtime_ns, size)] = value["headers"]
+
+
+def save_cached_tsv_headers(cache_file, version, tsv_headers_cache):
+    """
+    Saves tsv_headers_cache to the analyzer cache, for later analyzer runs of this session.
+
+    Parameters
+    ----------
+    cache_file : string
+        Path to the session's analyzer cache, or None if caching is disabled.
+
+    version : string
+        Analyzer version (see analyzer_cache.analyzer_version).
+
+    tsv_headers_cache : dictionary
+        The analysis' TSV header cache (see new_analysis_caches).
+    """
+    if cache_file is None:
+        return
+
+    records = {}
+    for (path, mtime_ns, size), headers in tsv_headers_cache.items():
+        records[path] = (f"{size}:{mtime_ns}", {"signature": [size, mtime_ns], "headers": headers})
+
+    save_records(cache_file, version, "tsv_headers", records)
+
+
+def modify_uploaded_dataset_list(DATA_DIR, uploaded_img_list, upload_index, nifti_header_cache, workers=1,
+                                 start_method="fork"):
     """
     Filters the list of json files generated by preprocess.sh to ensure that
     the json files are derived from dcm2niix, and that they contain
@@ -447,9 +920,24 @@ def modify_uploaded_dataset_list(uploaded_img_list):
 
     Parameters
     ----------
+    DATA_DIR : string
+        Root-level directory where uploaded data is stored and assessed.
+
     uploaded_img_list : list
         list of NIfTI files collected from preprocess.sh
 
+    upload_index : dictionary
+        Index of the upload's files (see upload_index.py).
+
+    nifti_header_cache : dictionary
+        The analysis' NIfTI header cache (see new_analysis_caches), filled with the headers read.
+
+    workers : int
+        Number of processes to read the NIfTI headers with (1 to not use a process pool).
+
+    start_method : string
+        How the processes are started (see ANALYZER_OPTIONS).
+
     Returns
     -------
     uploaded_files_list : list
@@ -473,17 +961,23 @@ def modify_uploaded_dataset_list(uploaded_img_list):
     config_file = ""
     exclude_data = False
 
-    config_file_list = []
-    for root, dirs, files in os.walk(DATA_DIR):
-        for file in files:
-            if file.endswith('ezBIDS_template.json'):
-                config_file_list.append(os.path.join(root, file))
+    # Templates found when indexing the upload (paths relative to DATA_DIR, i.e. beginning with "./")
+    config_file_list = [os.path.join(DATA_DIR, x[2:]) for x in upload_index["templates"]]
 
     if len(config_file_list):
         # Ideally only one config file uploaded, but if multiple configurations found, select last one (most recent?)
         config = True
         config_file = config_file_list[-1]
 
+    # Read the imaging files' headers (in parallel), to check that they are properly formatted
+    header_files = [
+        img_file for img_file in uploaded_img_list
+        if not img_file.endswith(tuple(MEG_extensions)) and not img_file.endswith('blood.json')
+    ]
+    nifti_headers = read_nifti_headers([os.path.join(DATA_DIR, x) for x in header_files], nifti_header_cache, workers,
+                                       start_method)
+    header_read = dict(zip(header_files, [x is not None for x in nifti_headers]))
+
     # Parse img files
     for img_file in uploaded_img_list:
         if img_file.endswith('.nii.gz'):
@@ -496,17 +990,14 @@ def modify_uploaded_dataset_list(uploaded_img_list):
             ext = Path(img_file).suffix
 
         if not img_file.endswith(tuple(MEG_extensions)) and not img_file.endswith('blood.json'):
-            try:
-                nib.load(img_file)
-            except:
+            if not header_read[img_file]:
                 exclude_data = True
                 print(f'{img_file} is not a properly formatted imaging file. Will not be converted by ezBIDS.')
                 break
 
         img_dir = os.path.dirname(img_file)
         grouped_files = [
-            img_dir + '/' + x for x in os.listdir(img_dir)
-            if os.path.basename(img_file).split(ext)[0] + "." in x
+            img_dir + '/' + x for x in find_stem_files(upload_index, img_dir, os.path.basename(img_file).split(ext)[0])
         ]
 
         # deal with PET issue where ECAT-formatted or blood data could be accidentally grouped with imaging data
@@ -527,44 +1018,108 @@ def modify_uploaded_dataset_list(uploaded_img_list):
     return uploaded_files_list, exclude_data, config, config_file
 
 
-def set_IntendedFor_B0FieldIdentifier_B0FieldSource(dataset_list_unique_series, bids_compliant):
+def index_path_components(paths):
     """
-    If BIDS-compliant dataset uploaded, check for IntendedFor, B0FieldIdentifier, and/or B0FieldSource
-    mappings, and apply if found.
+    Indexes the components of paths that follow a "/" (e.g. directory and file names), for find_path_substring.
 
     Parameters
     ----------
-    dataset_list_unique_series : list of dictionaries
-        A modified version of dataset_list, where this list contains only the
-        dictionaries of acquisitions with a unique series group ID.
-
-    bids_compliant : boolean
-        True if uploaded data is already BIDS-compliant. If so, check for
-        IntendedFor, B0FieldIdentifier, and/or B0FieldSource mappings, and
-        apply if found.
+    paths : list
+        List of paths.
 
     Returns
     -------
-    dataset_list_unique_series : list of dictionaries
-        A modified version of dataset_list, where this list contains only the
-        dictionaries of acquisitions with a unique series group ID.
+    path_components : list
+        Sorted (component, path position) pairs.
     """
-    if bids_compliant is True:
-        for unique_dic in dataset_list_unique_series:
-            json_path = unique_dic["json_path"]
+    return sorted((component, position) for position, path in enumerate(paths) for component in path.split("/")[1:])
 
-            json_data = open(json_path)
-            json_data = json.load(json_data, strict=False)
 
-            if "IntendedFor" in json_data:
-                IntendedFor_indices = []
+def find_path_substring(target, paths, path_components):
+    """
+    Finds the paths containing target, as the substring test `target in path` would. If target contains a "/",
+    the part after its last "/" must start a path component that follows a "/", so only the paths with such a
+    component are tested.
+
+    Parameters
+    ----------
+    target : string
+        Substring to look for (e.g. an IntendedFor entry).
+
+    paths : list
+        List of paths.
+
+    path_components : list
+        Index of the paths, from index_path_components.
+
+    Returns
+    -------
+    positions : list
+        Positions of the matching paths, in order.
+    """
+    if not isinstance(target, str) or "/" not in target:
+        return [position for position, path in enumerate(paths) if target in path]
+
+    last_part = target.rsplit("/", 1)[1]
+    candidates = set()
+    for index in range(bisect_left(path_components, (last_part,)), len(path_components)):
+        component, position = path_components[index]
+        if not component.startswith(last_part):
+            break
+        candidates.add(position)
+
+    return [position for position in sorted(candidates) if target in paths[position]]
+
+
+def set_IntendedFor_B0FieldIdentifier_B0FieldSource(DATA_DIR, dataset_list_unique_series, bids_compliant,
+                                                    config=False):
+    """
+    If BIDS-compliant dataset uploaded, check for IntendedFor, B0FieldIdentifier, and/or B0FieldSource
+    mappings, and apply if found.
+
+    Parameters
+    ----------
+    DATA_DIR : string
+        Root-level directory where uploaded data is stored and assessed.
+
+    dataset_list_unique_series : list of dictionaries
+        A modified version of dataset_list, where this list contains only the
+        dictionaries of acquisitions with a unique series group ID.
+
+    bids_compliant : boolean
+        True if uploaded data is already BIDS-compliant. If so, check for
+        IntendedFor, B0FieldIdentifier, and/or B0FieldSource mappings, and
+        apply if found.
+
+    config : boolean
+        True if an ezBIDS configuration file (*ezBIDS_template.json) was detected in the upload. The
+        sidecars are then read again from the JSON files, since fields from the configuration were added
+        to the ones loaded by generate_dataset_list.
+
+    Returns
+    -------
+    dataset_list_unique_series : list of dictionaries
+        A modified version of dataset_list, where this list contains only the
+        dictionaries of acquisitions with a unique series group ID.
+    """
+    if bids_compliant is True:
+        nifti_paths = [x["nifti_path"] for x in dataset_list_unique_series]
+        path_components = index_path_components(nifti_paths)
+
+        for unique_dic in dataset_list_unique_series:
+            if config is True:
+                json_data = open(os.path.join(DATA_DIR, unique_dic["json_path"]))
+                json_data = json.load(json_data, strict=False)
+            else:
+                # Sidecar loaded by generate_dataset_list
+                json_data = unique_dic["sidecar"]
+
+            if "IntendedFor" in json_data:
+                IntendedFor_indices = []
                 IntendedFor = json_data["IntendedFor"]
                 for i in IntendedFor:
-                    IntendedFor_items = [[x["nifti_path"], x["series_idx"]] for x in dataset_list_unique_series]
-                    IntendedFor_items = [x for x in IntendedFor_items if i in x[0]]
-
-                    for IntendedFor_item in IntendedFor_items:
-                        IntendedFor_indices.append(IntendedFor_item[1])
+                    for position in find_path_substring(i, nifti_paths, path_components):
+                        IntendedFor_indices.append(dataset_list_unique_series[position]["series_idx"])
 
                 unique_dic["IntendedFor"] = IntendedFor_indices
 
@@ -602,7 +1157,7 @@ def generate_readme(DATA_DIR, bids_compliant):
     """
 
     if bids_compliant is True:
-        bids_root_dir = pd.read_csv(f"{DATA_DIR}/bids_compliant.log", header=None).iloc[0][0]
+        bids_root_dir = read_bids_compliant_log(DATA_DIR)[0]
         try:
             with open(f"{bids_root_dir}/README") as f:
                 lines = f.readlines()
@@ -619,7 +1174,7 @@ def generate_readme(DATA_DIR, bids_compliant):
     return readme
 
 
-def generate_dataset_description(DATA_DIR, bids_compliant):
+def generate_dataset_description(DATA_DIR, bids_compliant, bids_schema):
     """
     If uploaded data is BIDS-compliant, copies information in uploaded dataset_description.json
     file. Otherwise, creates a template dataset_description.json file with relevant information
@@ -635,6 +1190,9 @@ def generate_dataset_description(DATA_DIR, bids_compliant):
         in the uploaded dataset_description.json file. Otherwise, create a template
         dataset_description.json file.
 
+    bids_schema : dictionary
+        BIDS schema information (see bids_schema.load_bids_schema).
+
     Returns
     -------
     dataset_description_dic : dictionary
@@ -642,7 +1200,7 @@ def generate_dataset_description(DATA_DIR, bids_compliant):
     """
     dataset_description_dic = {}
     if bids_compliant is True:
-        bids_root_dir = pd.read_csv(f"{DATA_DIR}/bids_compliant.log", header=None).iloc[0][0]
+        bids_root_dir = read_bids_compliant_log(DATA_DIR)[0]
         dataset_description = open(f"{bids_root_dir}/dataset_description.json")
         dataset_description = json.load(dataset_description, strict=False)
 
@@ -651,7 +1209,7 @@ def generate_dataset_description(DATA_DIR, bids_compliant):
                 dataset_description_dic[field] = dataset_description[field]
 
     else:
-        for field in dataset_description_yaml["dataset_description"]["fields"]:
+        for field in bids_schema["dataset_description_fields"]:
             if "GeneratedBy" not in field:
                 dataset_description_dic[field] = ""
         dataset_description_dic["SourceDatasets"] = []
@@ -703,7 +1261,7 @@ def generate_participants_columns(DATA_DIR, bids_compliant):
     participants_column_info : dictionary
         Column information for the participants.json file.
     """
-    bids_root_dir = pd.read_csv(f"{DATA_DIR}/bids_compliant.log", header=None).iloc[0][0]
+    bids_root_dir = read_bids_compliant_log(DATA_DIR)[0]
 
     if bids_compliant is True and os.path.isfile(f"{bids_root_dir}/participants.json"):
         participants_column_info = open(f"{bids_root_dir}/participants.json")
@@ -739,8 +1297,8 @@ def generate_participants_columns(DATA_DIR, bids_compliant):
 
 def find_cog_atlas_tasks(url):
     """
-    Generates a list of all possible task names from the Cognitive Atlas API
-    task webpage.
+    Generates a list of all possible task names from (a local snapshot of) the
+    Cognitive Atlas API task webpage.
 
     Parameters
     ----------
@@ -754,10 +1312,10 @@ def find_cog_atlas_tasks(url):
         "test" removed, to make it easier to search the SeriesDescription
         fields for a matching task name.
     """
-    url_contents = urlopen(url)
-    data = json.load(url_contents)
+    # Local snapshot of the API task list, refreshed in the background (see cog_atlas.py)
+    names = load_cog_atlas_task_names(url)
     # Remove non-alphanumeric terms and "task", "test" substrings
-    tasks = [re.sub("[^A-Za-z0-9]+", "", re.split(" task| test", x["name"])[0]).lower() for x in data]
+    tasks = [re.sub("[^A-Za-z0-9]+", "", re.split(" task| test", x)[0]).lower() for x in names]
     # Remove empty task name terms and ones under 2 characters (b/c hard to detect in SeriesDescription)
     tasks = [x for x in tasks if len(x) > 2]
     tasks = sorted(tasks, key=str.casefold)  # sort alphabetically, but ignore case
@@ -887,301 +1445,699 @@ def determine_direction(proper_pe_direction, ornt):
     return direction
 
 
-def generate_dataset_list(uploaded_files_list, exclude_data):
+def index_corresponding_files(corresponding_files_list):
     """
-    Takes list of NIfTI, JSON, (and bval/bvec) files generated from dcm2niix
-    to create a list of info directories for each uploaded acquisition, where
-    each directory contains metadata and other dicom header information to
-    help ezBIDS determine the identify of acquisitions, and to determine other
-    BIDS-related information (e.g., entity labels).
+    Builds a lookup index over the files (JSON, bval/bvec, blood.tsv, MEG) that can accompany
+    an imaging file, so that an imaging file's companion files can be found from its file stem
+    without rescanning the entire list for every image.
+
+    All paths are relative to DATA_DIR (i.e. begin with "./"), so a stem being contained in a
+    file path is equivalent to the file path starting with that stem. This includes cases where
+    the stem is a prefix of a longer file name (e.g. time-1-sn-2 and time-1-sn-20).
 
     Parameters
     ----------
-    uploaded_files_list : list
-        List of NIfTI, JSON, and bval/bvec files generated from dcm2niix,
-        generated from preprocess.sh
+    corresponding_files_list : list
+        List of JSON, bval/bvec, blood.tsv, and MEG files, in natsorted order.
+
+    Returns
+    -------
+    corresponding_files_index : dictionary
+        "sorted": the file paths in lexicographic order, used for prefix range lookups.
+        "rank": position of each file path in corresponding_files_list, used to return
+        matches in the same order as corresponding_files_list.
+    """
+    corresponding_files_index = {
+        "sorted": sorted(corresponding_files_list),
+        "rank": {x: rank for rank, x in enumerate(corresponding_files_list)}
+    }
+
+    return corresponding_files_index
+
+
+def add_corresponding_file(corresponding_files_index, file_path):
+    """
+    Adds a file to the corresponding files index. The file is ranked after all files
+    already in the index, equivalent to appending it to corresponding_files_list.
+
+    Parameters
+    ----------
+    corresponding_files_index : dictionary
+        Index generated by index_corresponding_files.
+
+    file_path : string
+        Path of the file to add.
+    """
+    if file_path not in corresponding_files_index["rank"]:
+        insort(corresponding_files_index["sorted"], file_path)
+        corresponding_files_index["rank"][file_path] = len(corresponding_files_index["rank"])
+
+
+def find_corresponding_files(corresponding_files_index, prefix):
+    """
+    Finds all indexed files whose path starts with prefix.
+
+    Parameters
+    ----------
+    corresponding_files_index : dictionary
+        Index generated by index_corresponding_files.
+
+    prefix : string
+        File path prefix to search for, typically the imaging file path minus its extension.
+
+    Returns
+    -------
+    matches : list
+        Matching file paths, in the same order as corresponding_files_list.
+    """
+    sorted_files = corresponding_files_index["sorted"]
+    matches = []
+    for index in range(bisect_left(sorted_files, prefix), len(sorted_files)):
+        if not sorted_files[index].startswith(prefix):
+            break
+        matches.append(sorted_files[index])
+
+    matches = sorted(matches, key=corresponding_files_index["rank"].get)
+
+    return matches
+
+
+def determine_patient_age(json_data, today_date):
+    """
+    Metadata may contain PatientBirthDate and/or PatientAge. Check either
+    to see if one truly provides accurate age information.
+
+    Parameters
+    ----------
+    json_data : dictionary
+        The acquisition's JSON sidecar.
+
+    today_date : string
+        Date of the analysis (YYYY-MM-DD).
+
+    Returns
+    -------
+    age : int, float, or string
+        PatientAge, or the age computed from PatientBirthDate, or "n/a".
+    """
+    age = "n/a"
+    if "PatientAge" in json_data:
+        patient_age = json_data["PatientAge"]
+        if (isinstance(patient_age, int) or isinstance(patient_age, float)):
+            age = patient_age
+
+    if age == "n/a" and "PatientBirthDate" in json_data:
+        patient_birth_date = json_data["PatientBirthDate"]  # ISO 8601 "YYYY-MM-DD"
+        try:
+            age = int(today_date.split("-")[0]) - int(patient_birth_date.split("-")[0])
+            - ((int(today_date.split("-")[1]), int(today_date.split("-")[2]))
+                < (int(patient_birth_date.split("-")[2]), int(patient_birth_date.split("-")[2])))
+        except:
+            pass
+
+    return age
+
+
+def extract_acquisition_info(DATA_DIR, img_file, ext, corresponding_json, corresponding_file_paths, exclude_data,
+                             today_date, nifti_header=None):
+    """
+    Extracts the information of a single uploaded acquisition (metadata from its JSON sidecar, NIfTI
+    header information, phase encoding direction, orientation, file size), for generate_dataset_list.
+    Only reads/writes files belonging to this acquisition, so it can run in parallel with others.
+
+    Parameters
+    ----------
+    DATA_DIR : string
+        Root-level directory where uploaded data is stored and assessed (the paths are relative to it).
+
+    img_file : string
+        Path to the imaging (e.g. NIfTI) file.
+
+    ext : string
+        File extension of img_file.
+
+    corresponding_json : list
+        JSON sidecar file of img_file (empty if there isn't one, in which case it is created).
+
+    corresponding_file_paths : list
+        Files (JSON, bval/bvec, tsv) associated with img_file.
 
     exclude_data : boolean
         True if uploaded data doesn't come as a NIfTI/JSON pair, which is flagged for exclusion
         from BIDS conversion.
 
+    today_date : string
+        Date of the analysis (YYYY-MM-DD), used to compute PatientAge.
+
+    nifti_header : dictionary, optional
+        Header information of img_file already read (see read_nifti_header). Read if not provided.
+
     Returns
     -------
-    dataset_list : list
-        List of dictionaries containing pertinent and unique information about
-        the data, primarily coming from the metadata in the json files.
+    acquisition_info : dictionary
+        Information about the acquisition. The subject, session, and uploaded_config_file values
+        are left for generate_dataset_list to fill in, since they depend on the other acquisitions.
     """
-    # Create list for appending dictionaries to
-    dataset_list = []
+    if len(corresponding_json):
+        json_path = corresponding_json[0]
+        json_data = open(os.path.join(DATA_DIR, corresponding_json[0]))
+        json_data = json.load(json_data, strict=False)
+    else:
+        json_path = img_file.split(ext)[0] + '.json'
+        json_data = {
+            'ConversionSoftware': 'ezBIDS',
+            'ConversionSoftwareVersion': '1.0.0'
+        }
 
-    # Get separate nifti and json (i.e. sidecar) lists
-    img_list = natsorted(
-        [
-            x for x in uploaded_files_list if x.endswith('nii.gz')
-            or x.endswith('blood.json')
-            or x.endswith(tuple(MEG_extensions))
-        ]
-    )
+    # Find ImageModality
+    if "Modality" in json_data:
+        modality = json_data["Modality"]
+    else:
+        # assume MR (Is this a proper assumption to make? Probably most likely scenario)
+        modality = "MR"
 
-    corresponding_files_list = natsorted([
-        x for x in uploaded_files_list if x.endswith('.json')
-        or x.endswith('.bval')
-        or x.endswith('.bvec')
-        or x.endswith(tuple(MEG_extensions))
-        or x.endswith('blood.tsv')  # do we need this last one?
-    ])
+    # Phase encoding direction info
+    if "PhaseEncodingDirection" in json_data:
+        pe_direction = json_data["PhaseEncodingDirection"]
+    else:
+        pe_direction = None
 
-    print('')
-    print("Determining unique acquisitions in dataset")
-    print("------------------------------------------")
-    sub_info_list_id = "01"
-    sub_info_list = []
+    try:
+        if nifti_header is None:
+            nifti_header = read_nifti_header(os.path.join(DATA_DIR, img_file))
+        ornt = nib.aff2axcodes(nifti_header["affine"])
+        ornt = "".join(ornt)
+    except:
+        ornt = None
+
+    if pe_direction is not None and ornt is not None and modality != "MEG":
+        correction = False
+        proper_pe_direction, correction = correct_pe(pe_direction, ornt, correction)
+        if correction is True:
+            json_data['PhaseEncodingDirection'] = proper_pe_direction
+            with open(os.path.join(DATA_DIR, json_path), "w") as fp:
+                json.dump(json_data, fp, indent=3)
+        ped = determine_direction(proper_pe_direction, ornt)
+    else:
+        ped = ""
 
-    for img_file in img_list:
-        # Find file extension
-        if img_file.endswith('.nii.gz'):
-            ext = '.nii.gz'
-        elif img_file.endswith('.v.gz'):
-            ext = '.v.gz'
-        elif img_file.endswith('.ds'):
-            ext = '.ds'
-        else:
-            ext = Path(img_file).suffix
+    # Find image file size
+    filesize = os.stat(os.path.join(DATA_DIR, img_file)).st_size
 
-        if img_file.endswith('.blood.json'):
-            corresponding_json = img_file
-        else:
-            corresponding_json = [
-                x for x in corresponding_files_list if x.endswith('.json') and img_file.split(ext)[0] in x
-            ]  # should be length of 1, but may be empty (i.e. no metadata json file)
+    # Find StudyID from json
+    if "StudyID" in json_data:
+        study_id = json_data["StudyID"]
+    else:
+        study_id = img_file.split('/')[1]  # uppermost folder in file path
 
-        if len(corresponding_json):
-            json_path = corresponding_json[0]
-            json_data = open(corresponding_json[0])
-            json_data = json.load(json_data, strict=False)
-        else:
-            json_path = img_file.split(ext)[0] + '.json'
-            json_data = {
-                'ConversionSoftware': 'ezBIDS',
-                'ConversionSoftwareVersion': '1.0.0'
-            }
+    # Find subject_id from json, since some files contain neither PatientID nor PatientName
+    if "PatientID" in json_data:
+        patient_id = json_data["PatientID"]
+    else:
+        patient_id = "n/a"
 
-        # Find ImageModality
-        if "Modality" in json_data:
-            modality = json_data["Modality"]
-        else:
-            # assume MR (Is this a proper assumption to make? Probably most likely scenario)
-            modality = "MR"
+    if "PatientName" in json_data:
+        patient_name = json_data["PatientName"]
+    else:
+        patient_name = "n/a"
 
-        # Phase encoding direction info
-        if "PhaseEncodingDirection" in json_data:
-            pe_direction = json_data["PhaseEncodingDirection"]
-        else:
-            pe_direction = None
+    # Find PatientBirthDate
+    if "PatientBirthDate" in json_data:
+        patient_birth_date = json_data["PatientBirthDate"].replace("-", "")
+    else:
+        patient_birth_date = "00000000"
+
+    # Assume patient_species is homo sapiens
+    patient_species = "homo sapiens"
+
+    # Find PatientSex
+    patient_sex = "n/a"
+    if "PatientSex" in json_data:
+        patient_sex = json_data["PatientSex"]
+
+    # Find PatientAge
+    if "PatientAge" in json_data:
+        patient_age = json_data["PatientAge"]
+    else:
+        patient_age = "n/a"
+
+    # Patient handedness
+    patient_handedness = "n/a"
+
+    age = determine_patient_age(json_data, today_date)
+    if not (isinstance(patient_age, int) or isinstance(patient_age, float)) and "PatientBirthDate" in json_data:
+        patient_birth_date = json_data["PatientBirthDate"]  # ISO 8601 "YYYY-MM-DD"
+
+    # Find AcquisitionDateTime
+    if "AcquisitionDateTime" in json_data:
+        acquisition_date_time = json_data["AcquisitionDateTime"]
+    else:
+        acquisition_date_time = "0000-00-00T00:00:00.000000"
+
+    # Find AcquisitionDate
+    if "AcquisitionDate" in json_data:
+        acquisition_date = json_data["AcquisitionDate"]
+    else:
+        acquisition_date = "0000-00-00"
+
+    # Find AcquisitionTime
+    if "AcquisitionTime" in json_data:
+        acquisition_time = json_data["AcquisitionTime"]
+    else:
+        acquisition_time = acquisition_time = "00:00:00.000000"
+
+    # Find TimeZero
+    if "TimeZero" in json_data and json_data.get("ScanStart", None) == 0:
+        acquisition_time = json_data["TimeZero"]
+
+    # Find Manufacturer metadata or make placehodler
+    if "Manufacturer" not in json_data:
+        manufacturer = "n/a"
+        json_data["Manufacturer"] = manufacturer
+    else:
+        manufacturer = json_data["Manufacturer"]
+
+    # Find RepetitionTime
+    if "RepetitionTime" in json_data:
+        repetition_time = json_data["RepetitionTime"]
+    else:
+        repetition_time = 0
+
+    # Find EchoNumber
+    if "EchoNumber" in json_data:
+        echo_number = json_data["EchoNumber"]
+    else:
+        echo_number = None
+
+    # Find EchoTime
+    if "EchoTime" in json_data:
+        echo_time = json_data["EchoTime"]
+    else:
+        echo_time = 0
+
+    # Get the nibabel nifti image info
+    if img_file.endswith('.nii.gz'):
+        if nifti_header is None:
+            nifti_header = read_nifti_header(os.path.join(DATA_DIR, img_file))
+        ndim = nifti_header["ndim"]
+
+        # Only retain what later stages need, rather than the image (or full header) itself
+        image_summary = NiftiSummary(
+            dtype=nifti_header["dtype"],
+            shape=nifti_header["shape"],
+            negative_dims=any(x < 0 for x in nifti_header["shape"]),
+            header_block=nifti_header["header_block"]
+        )
+
+        # If RepetitionTime (TR) not in JSON metadata, add to file
+        if repetition_time == 0:
+            if len(nifti_header["zooms"]) == 4:
+                repetition_time = nifti_header["zooms"][-1]
+                if not isinstance(repetition_time, int):
+                    repetition_time = round(float(repetition_time), 2)
+                json_data['RepetitionTime'] = repetition_time
 
+        # Find how many volumes are in nifti file
         try:
-            ornt = nib.aff2axcodes(nib.load(img_file).affine)
-            ornt = "".join(ornt)
+            volume_count = nifti_header["shape"][3]
         except:
-            ornt = None
-
-        if pe_direction is not None and ornt is not None and modality != "MEG":
-            correction = False
-            proper_pe_direction, correction = correct_pe(pe_direction, ornt, correction)
-            if correction is True:
-                json_data['PhaseEncodingDirection'] = proper_pe_direction
-                with open(json_path, "w") as fp:
-                    json.dump(json_data, fp, indent=3)
-            ped = determine_direction(proper_pe_direction, ornt)
-        else:
-            ped = ""
+            volume_count = 1
+    elif img_file.endswith(tuple(MEG_extensions)):
+        image_summary = None
+        volume_count = 1
+        ndim = 4
+    elif img_file.endswith("blood.json"):
+        image_summary = None
+        volume_count = 1
+        ndim = 2
+    else:  # add as we support new imaging modalities
+        image_summary = None
+        volume_count = 1
+        ndim = 2
+
+    # Find SeriesNumber
+    if "SeriesNumber" in json_data:
+        series_number = json_data["SeriesNumber"]
+    else:
+        series_number = 0
 
-        # Find image file size
-        filesize = os.stat(img_file).st_size
+    # Modified SeriesNumber, which zero pads integers < 10. Helpful for sorting purposes
+    if series_number < 10:
+        mod_series_number = '0' + str(series_number)
+    else:
+        mod_series_number = str(series_number)
 
-        # Find StudyID from json
-        if "StudyID" in json_data:
-            study_id = json_data["StudyID"]
-        else:
-            study_id = img_file.split('/')[1]  # uppermost folder in file path
+    # Find SeriesDescription
+    if "SeriesDescription" in json_data:
+        series_description = json_data["SeriesDescription"]
+        descriptor = "SeriesDescription"
+    else:
+        series_description = "n/a"
+        descriptor = "ProtocolName"
 
-        # Find subject_id from json, since some files contain neither PatientID nor PatientName
-        if "PatientID" in json_data:
-            patient_id = json_data["PatientID"]
-        else:
-            patient_id = "n/a"
+    # Find ProtocolName
+    if "ProtocolName" in json_data:
+        protocol_name = json_data["ProtocolName"]
+    else:
+        protocol_name = "n/a"
 
-        if "PatientName" in json_data:
-            patient_name = json_data["PatientName"]
-        else:
-            patient_name = "n/a"
+    # If SeriesDescription and ProtocolName are both n/a, give SD something
+    if series_description == "n/a" and protocol_name == "n/a":
+        series_description = img_file
+        descriptor = "SeriesDescription"
 
-        # Find PatientBirthDate
-        if "PatientBirthDate" in json_data:
-            patient_birth_date = json_data["PatientBirthDate"].replace("-", "")
-        else:
-            patient_birth_date = "00000000"
+    # Find ImageType
+    if "ImageType" in json_data:
+        image_type = json_data["ImageType"]
+    else:
+        image_type = []
 
-        # Assume patient_species is homo sapiens
-        patient_species = "homo sapiens"
+    # Exclude data or not
+    if exclude_data is True:
+        data_type = "exclude"
+    else:
+        data_type = ""
 
-        # Find PatientSex
-        patient_sex = "n/a"
-        if "PatientSex" in json_data:
-            patient_sex = json_data["PatientSex"]
+    # If uploaded data didn't contain JSON metadata, add here
+    if not os.path.exists(os.path.join(DATA_DIR, json_path)):
+        with open(os.path.join(DATA_DIR, json_path), "w") as fp:
+            json.dump(json_data, fp, indent=3)
+        json_data = open(os.path.join(DATA_DIR, json_path))
+        json_data = json.load(json_data, strict=False)
 
-        # Find PatientAge
-        if "PatientAge" in json_data:
-            patient_age = json_data["PatientAge"]
-        else:
-            patient_age = "n/a"
+    # Relative paths of NIfTI and JSON files (per SeriesNumber)
+    paths = natsorted(corresponding_file_paths + [img_file])
 
-        # Patient handedness
-        patient_handedness = "n/a"
+    """
+    Organize all from individual SeriesNumber in dictionary
+    """
+    acquisition_info = {
+        "StudyID": study_id,
+        "PatientID": patient_id,
+        "PatientName": patient_name,
+        "PatientBirthDate": patient_birth_date,
+        "PatientSpecies": patient_species,
+        "PatientSex": patient_sex,
+        "PatientAge": age,
+        "PatientHandedness": patient_handedness,
+        "subject": "",
+        "session": "",
+        "SeriesNumber": series_number,
+        "ModifiedSeriesNumber": mod_series_number,
+        "AcquisitionDateTime": acquisition_date_time,
+        "AcquisitionDate": acquisition_date,
+        "AcquisitionTime": acquisition_time,
+        "SeriesDescription": series_description,
+        "ProtocolName": protocol_name,
+        "descriptor": descriptor,
+        "Modality": modality,
+        "ImageType": image_type,
+        "RepetitionTime": repetition_time,
+        "EchoNumber": echo_number,
+        "EchoTime": echo_time,
+        "datatype": "",
+        "suffix": "",
+        "subject_idx": 0,
+        "session_idx": 0,
+        "series_idx": 0,
+        "direction": ped,
+        "exclude": False,
+        "filesize": filesize,
+        "NumVolumes": volume_count,
+        "orientation": ornt,
+        "error": None,
+        "IntendedFor": None,
+        "B0FieldIdentifier": None,
+        "B0FieldSource": None,
+        "section_id": 1,
+        "message": None,
+        "type": data_type,
+        "nifti_path": img_file,
+        "image_summary": image_summary,
+        "ndim": ndim,
+        "json_path": json_path,
+        "file_directory": "/".join([x for x in img_file.split("/") if not x.endswith(ext)]),
+        'uploaded_config_file': None,
+        "paths": paths,
+        "headers": "",
+        "finalized_match": False,
+        "sidecar": json_data
+    }
 
-        """
-        Metadata may contain PatientBirthDate and/or PatientAge. Check either
-        to see if one truly provides accurate age information.
-        """
-        age = "n/a"
-        if "PatientAge" in json_data:
-            patient_age = json_data["PatientAge"]
-            if (isinstance(patient_age, int) or isinstance(patient_age, float)):
-                age = patient_age
-
-        if age == "n/a" and "PatientBirthDate" in json_data:
-            patient_birth_date = json_data["PatientBirthDate"]  # ISO 8601 "YYYY-MM-DD"
-            try:
-                age = int(today_date.split("-")[0]) - int(patient_birth_date.split("-")[0])
-                - ((int(today_date.split("-")[1]), int(today_date.split("-")[2]))
-                    < (int(patient_birth_date.split("-")[2]), int(patient_birth_date.split("-")[2])))
-            except:
-                pass
+    return acquisition_info
 
-        # Find AcquisitionDateTime
-        if "AcquisitionDateTime" in json_data:
-            acquisition_date_time = json_data["AcquisitionDateTime"]
-        else:
-            acquisition_date_time = "0000-00-00T00:00:00.000000"
 
-        # Find AcquisitionDate
-        if "AcquisitionDate" in json_data:
-            acquisition_date = json_data["AcquisitionDate"]
-        else:
-            acquisition_date = "0000-00-00"
+def acquisition_cache_key(DATA_DIR, json_path, img_file, ext, corresponding_json, corresponding_file_paths,
+                          exclude_data):
+    """
+    Cache key of an acquisition's extracted information: the extract_acquisition_info arguments, along
+    with the sizes and modification times of the acquisition's files. The date isn't part of the key, as
+    PatientAge is recomputed when the information is loaded from the cache (see acquisition_from_record).
 
-        # Find AcquisitionTime
-        if "AcquisitionTime" in json_data:
-            acquisition_time = json_data["AcquisitionTime"]
-        else:
-            acquisition_time = acquisition_time = "00:00:00.000000"
+    Parameters
+    ----------
+    DATA_DIR : string
+        Root-level directory where uploaded data is stored and assessed (the paths are relative to it).
 
-        # Find TimeZero
-        if "TimeZero" in json_data and json_data.get("ScanStart", None) == 0:
-            acquisition_time = json_data["TimeZero"]
+    json_path : string
+        Path to the acquisition's JSON sidecar.
 
-        # Find Manufacturer metadata or make placehodler
-        if "Manufacturer" not in json_data:
-            manufacturer = "n/a"
-            json_data["Manufacturer"] = manufacturer
-        else:
-            manufacturer = json_data["Manufacturer"]
+    See extract_acquisition_info for the other parameters.
 
-        # Find RepetitionTime
-        if "RepetitionTime" in json_data:
-            repetition_time = json_data["RepetitionTime"]
-        else:
-            repetition_time = 0
+    Returns
+    -------
+    key : string
+    """
+    signatures = [file_signature(os.path.join(DATA_DIR, x)) for x in [img_file, json_path] + corresponding_file_paths]
+
+    return cache_key(img_file, ext, corresponding_json, corresponding_file_paths, exclude_data, signatures)
+
+
+def acquisition_from_record(record, today_date):
+    """
+    Converts an acquisition record from the analyzer cache back into the format
+    returned by extract_acquisition_info, with PatientAge as of today_date.
+
+    Parameters
+    ----------
+    record : dictionary
+        JSON-decoded acquisition information.
+
+    today_date : string
+        Date of the analysis (YYYY-MM-DD), used to compute PatientAge.
+
+    Returns
+    -------
+    acquisition_info : dictionary
+    """
+    if record["image_summary"] is not None:
+        dtype, shape, negative_dims, header_block = record["image_summary"]
+        record["image_summary"] = NiftiSummary(dtype, tuple(shape), negative_dims, bytes.fromhex(header_block))
+
+    record["PatientAge"] = determine_patient_age(record["sidecar"], today_date)
+
+    return record
+
+
+def acquisition_to_record(acquisition_info):
+    """
+    Converts the information returned by extract_acquisition_info into a (JSON-serializable)
+    acquisition record for the analyzer cache.
+
+    Parameters
+    ----------
+    acquisition_info : dictionary
+
+    Returns
+    -------
+    record : dictionary
+    """
+    image_summary = acquisition_info["image_summary"]
+    if image_summary is None:
+        return acquisition_info
+
+    return dict(acquisition_info, image_summary=image_summary._replace(header_block=image_summary.header_block.hex()))
+
+
+def generate_dataset_list(DATA_DIR, uploaded_files_list, exclude_data, config, today_date, nifti_header_cache,
+                          workers=1, cache_file=None, cache_version=None, upload_index=None, start_method="fork"):
+    """
+    Takes list of NIfTI, JSON, (and bval/bvec) files generated from dcm2niix
+    to create a list of info directories for each uploaded acquisition, where
+    each directory contains metadata and other dicom header information to
+    help ezBIDS determine the identify of acquisitions, and to determine other
+    BIDS-related information (e.g., entity labels).
+
+    Parameters
+    ----------
+    DATA_DIR : string
+        Root-level directory where uploaded data is stored and assessed.
+
+    uploaded_files_list : list
+        List of NIfTI, JSON, and bval/bvec files generated from dcm2niix,
+        generated from preprocess.sh
+
+    exclude_data : boolean
+        True if uploaded data doesn't come as a NIfTI/JSON pair, which is flagged for exclusion
+        from BIDS conversion.
+
+    config : boolean
+        True if an ezBIDS configuration file (*ezBIDS_template.json) was detected in the upload
+
+    today_date : string
+        Date of the analysis (YYYY-MM-DD), used to compute PatientAge.
+
+    nifti_header_cache : dictionary
+        The analysis' NIfTI header cache (see new_analysis_caches), with the headers read by
+        modify_uploaded_dataset_list.
+
+    workers : int
+        Number of processes to extract acquisition information with (1 to not use a process pool).
+
+    cache_file : string, optional
+        Path to the session's analyzer cache, or None if caching is disabled.
+
+    cache_version : string, optional
+        Analyzer version (see analyzer_cache.analyzer_version).
+
+    upload_index : dictionary, optional
+        Index of the upload's files (see upload_index.py), to check for existing JSON sidecars without
+        a stat per image.
+
+    start_method : string, optional
+        How the extraction processes are started (see ANALYZER_OPTIONS).
+
+    Returns
+    -------
+    dataset_list : list
+        List of dictionaries containing pertinent and unique information about
+        the data, primarily coming from the metadata in the json files.
+    """
+    # Create list for appending dictionaries to
+    dataset_list = []
+
+    # Get separate nifti and json (i.e. sidecar) lists
+    img_list = natsorted(
+        [
+            x for x in uploaded_files_list if x.endswith('nii.gz')
+            or x.endswith('blood.json')
+            or x.endswith(tuple(MEG_extensions))
+        ]
+    )
+
+    corresponding_files_list = natsorted([
+        x for x in uploaded_files_list if x.endswith('.json')
+        or x.endswith('.bval')
+        or x.endswith('.bvec')
+        or x.endswith(tuple(MEG_extensions))
+        or x.endswith('blood.tsv')  # do we need this last one?
+    ])
 
-        # Find EchoNumber
-        if "EchoNumber" in json_data:
-            echo_number = json_data["EchoNumber"]
-        else:
-            echo_number = None
+    corresponding_files_index = index_corresponding_files(corresponding_files_list)
 
-        # Find EchoTime
-        if "EchoTime" in json_data:
-            echo_time = json_data["EchoTime"]
-        else:
-            echo_time = 0
+    print('')
+    print("Determining unique acquisitions in dataset")
+    print("------------------------------------------")
 
-        # Get the nibabel nifti image info
+    """
+    Find each image's JSON sidecar and other corresponding files up front. JSON sidecars that will be
+    created for images without one are indexed as well, since they can be found by later images.
+    """
+    extraction_args = []
+    json_paths = []
+    created_json_paths = set()
+    for img_file in img_list:
+        # Find file extension
         if img_file.endswith('.nii.gz'):
-            image = nib.load(img_file)
-            ndim = image.ndim
-
-            # If RepetitionTime (TR) not in JSON metadata, add to file
-            if repetition_time == 0:
-                if len(image.header.get_zooms()) == 4:
-                    repetition_time = image.header.get_zooms()[-1]
-                    if not isinstance(repetition_time, int):
-                        repetition_time = round(float(repetition_time), 2)
-                    json_data['RepetitionTime'] = repetition_time
-
-            # Find how many volumes are in nifti file
-            try:
-                volume_count = image.shape[3]
-            except:
-                volume_count = 1
-        elif img_file.endswith(tuple(MEG_extensions)):
-            image = "n/a"
-            volume_count = 1
-            ndim = 4
-        elif img_file.endswith("blood.json"):
-            image = "n/a"
-            volume_count = 1
-            ndim = 2
-        else:  # add as we support new imaging modalities
-            image = 'n/a'
-            volume_count = 1
-            ndim = 2
-
-        # Find SeriesNumber
-        if "SeriesNumber" in json_data:
-            series_number = json_data["SeriesNumber"]
+            ext = '.nii.gz'
+        elif img_file.endswith('.v.gz'):
+            ext = '.v.gz'
+        elif img_file.endswith('.ds'):
+            ext = '.ds'
         else:
-            series_number = 0
+            ext = Path(img_file).suffix
 
-        # Modified SeriesNumber, which zero pads integers < 10. Helpful for sorting purposes
-        if series_number < 10:
-            mod_series_number = '0' + str(series_number)
+        if img_file.endswith('.blood.json'):
+            corresponding_json = img_file
         else:
-            mod_series_number = str(series_number)
+            corresponding_json = [
+                x for x in find_corresponding_files(corresponding_files_index, img_file.split(ext)[0])
+                if x.endswith('.json')
+            ]  # should be length of 1, but may be empty (i.e. no metadata json file)
 
-        # Find SeriesDescription
-        if "SeriesDescription" in json_data:
-            series_description = json_data["SeriesDescription"]
-            descriptor = "SeriesDescription"
+        if len(corresponding_json):
+            json_path = corresponding_json[0]
         else:
-            series_description = "n/a"
-            descriptor = "ProtocolName"
+            json_path = img_file.split(ext)[0] + '.json'
+            if upload_index is not None:
+                json_exists = upload_path_exists(upload_index, json_path)
+            else:
+                json_exists = os.path.exists(os.path.join(DATA_DIR, json_path))
+            if json_path not in created_json_paths and not json_exists:
+                created_json_paths.add(json_path)
+                add_corresponding_file(corresponding_files_index, json_path)
+        json_paths.append(json_path)
 
-        # Find ProtocolName
-        if "ProtocolName" in json_data:
-            protocol_name = json_data["ProtocolName"]
-        else:
-            protocol_name = "n/a"
+        # Files (JSON, bval/bvec, tsv) associated with imaging file
+        corresponding_file_paths = [
+            x for x in find_corresponding_files(corresponding_files_index, f"{img_file.split(ext)[0]}.")
+            if not x.endswith(ext)
+        ]
 
-        # If SeriesDescription and ProtocolName are both n/a, give SD something
-        if series_description == "n/a" and protocol_name == "n/a":
-            series_description = img_file
-            descriptor = "SeriesDescription"
+        extraction_args.append((img_file, ext, corresponding_json, corresponding_file_paths, exclude_data))
 
-        # Find ImageType
-        if "ImageType" in json_data:
-            image_type = json_data["ImageType"]
-        else:
-            image_type = []
+    """
+    Extract the acquisitions' information in parallel. Images sharing a JSON sidecar (rare) are extracted
+    afterwards, in order, since their extraction may modify it. Results are kept in img_list order, so
+    the output doesn't depend on the number of workers.
+    """
+    acquisitions = [None] * len(extraction_args)
+
+    # Reuse the information extracted by previous analyzer runs for acquisitions whose files haven't changed
+    if cache_file is not None:
+        cached_acquisitions = load_records(cache_file, cache_version, "acquisition")
+        for index, args in enumerate(extraction_args):
+            cached = cached_acquisitions.get(args[0])
+            if cached is not None and cached[0] == acquisition_cache_key(DATA_DIR, json_paths[index], *args):
+                acquisitions[index] = acquisition_from_record(cached[1], today_date)
+
+    extract_indices = [index for index, acquisition_info in enumerate(acquisitions) if acquisition_info is None]
+    print(f"Extracting information from {len(extract_indices)} of {len(acquisitions)} acquisitions "
+          "(others unchanged since the previous analysis)")
+
+    json_path_counts = Counter(json_paths)
+    parallel_indices = [index for index in extract_indices if json_path_counts[json_paths[index]] == 1]
+    sequential_indices = [index for index in extract_indices if json_path_counts[json_paths[index]] > 1]
+
+    # The headers read by modify_uploaded_dataset_list are passed along, so the workers don't read them again
+    results = map_in_workers(extract_acquisition_info, [
+        (DATA_DIR,) + extraction_args[index]
+        + (today_date, cached_nifti_header(os.path.join(DATA_DIR, extraction_args[index][0]), nifti_header_cache))
+        for index in parallel_indices
+    ], workers, start_method)
+    for index, acquisition_info in zip(parallel_indices, results):
+        acquisitions[index] = acquisition_info
+
+    for index in sequential_indices:
+        acquisitions[index] = extract_acquisition_info(DATA_DIR, *extraction_args[index], today_date)
+
+    if cache_file is not None and len(extract_indices):
+        save_records(cache_file, cache_version, "acquisition", {
+            extraction_args[index][0]: (acquisition_cache_key(DATA_DIR, json_paths[index], *extraction_args[index]),
+                                        acquisition_to_record(acquisitions[index]))
+            for index in extract_indices
+        })
 
-        # Exclude data or not
-        if exclude_data is True:
-            data_type = "exclude"
-        else:
-            data_type = ""
+    sub_info_list_id = "01"
+    sub_info_list = []
 
+    for (img_file, ext, _, _, _), acquisition_info in zip(extraction_args, acquisitions):
         """
         Select subject (and session, if applicable) IDs to display.
         """
+        patient_id = acquisition_info["PatientID"]
+        patient_name = acquisition_info["PatientName"]
+        patient_birth_date = acquisition_info["PatientBirthDate"]
         if patient_id == "n/a" and patient_name == "n/a" and patient_birth_date == "00000000":
             # Completely anonymized data, assume folder is the subject ID
             folder = [x for x in img_file.split("/") if not x.endswith(ext)][-1]
@@ -1229,78 +2185,10 @@ def generate_dataset_list(uploaded_files_list, exclude_data):
         subject = re.sub("[^A-Za-z0-9]+", "", subject)
         session = re.sub("[^A-Za-z0-9]+", "", session)
 
-        # If uploaded data didn't contain JSON metadata, add here
-        if not os.path.exists(json_path):
-            with open(json_path, "w") as fp:
-                json.dump(json_data, fp, indent=3)
-            corresponding_files_list = corresponding_files_list + [json_path]
-            json_data = open(json_path)
-            json_data = json.load(json_data, strict=False)
-
-        # Files (JSON, bval/bvec, tsv) associated with imaging file
-        corresponding_file_paths = [
-            x for x in corresponding_files_list if f"{img_file.split(ext)[0]}." in x and not x.endswith(ext)
-        ]
-
-        # Relative paths of NIfTI and JSON files (per SeriesNumber)
-        paths = natsorted(corresponding_file_paths + [img_file])
-
-        """
-        Organize all from individual SeriesNumber in dictionary
-        """
-        sequence_info_directory = {
-            "StudyID": study_id,
-            "PatientID": patient_id,
-            "PatientName": patient_name,
-            "PatientBirthDate": patient_birth_date,
-            "PatientSpecies": patient_species,
-            "PatientSex": patient_sex,
-            "PatientAge": age,
-            "PatientHandedness": patient_handedness,
-            "subject": subject,
-            "session": session,
-            "SeriesNumber": series_number,
-            "ModifiedSeriesNumber": mod_series_number,
-            "AcquisitionDateTime": acquisition_date_time,
-            "AcquisitionDate": acquisition_date,
-            "AcquisitionTime": acquisition_time,
-            "SeriesDescription": series_description,
-            "ProtocolName": protocol_name,
-            "descriptor": descriptor,
-            "Modality": modality,
-            "ImageType": image_type,
-            "RepetitionTime": repetition_time,
-            "EchoNumber": echo_number,
-            "EchoTime": echo_time,
-            "datatype": "",
-            "suffix": "",
-            "subject_idx": 0,
-            "session_idx": 0,
-            "series_idx": 0,
-            "direction": ped,
-            "exclude": False,
-            "filesize": filesize,
-            "NumVolumes": volume_count,
-            "orientation": ornt,
-            "error": None,
-            "IntendedFor": None,
-            "B0FieldIdentifier": None,
-            "B0FieldSource": None,
-            "section_id": 1,
-            "message": None,
-            "type": data_type,
-            "nifti_path": img_file,
-            "nibabel_image": image,
-            "ndim": ndim,
-            "json_path": json_path,
-            "file_directory": "/".join([x for x in img_file.split("/") if not x.endswith(ext)]),
-            'uploaded_config_file': config,
-            "paths": paths,
-            "headers": "",
-            "finalized_match": False,
-            "sidecar": json_data
-        }
-        dataset_list.append(sequence_info_directory)
+        acquisition_info["subject"] = subject
+        acquisition_info["session"] = session
+        acquisition_info["uploaded_config_file"] = config
+        dataset_list.append(acquisition_info)
 
     # Sort dataset_list of dictionaries
     dataset_list = sorted(dataset_list, key=itemgetter("AcquisitionDate",
@@ -1336,53 +2224,75 @@ def organize_dataset(dataset_list):
         List of dictionaries containing pertinent and unique information about
         the data, primarily coming from the metadata in the json files.
     """
-    dataset_list = sorted(dataset_list, key=itemgetter(
-        "subject",
-        "AcquisitionTime",
-        "ModifiedSeriesNumber")
-    )
+    sort_key = itemgetter("subject", "AcquisitionTime", "ModifiedSeriesNumber")
+    dataset_list = sorted(dataset_list, key=sort_key)
+
+    """
+    The previous acquisition of each one used to be taken from the list re-sorted after each (relabeling)
+    step. Pseudo subject labels ("n/a0001", ...) sort after "n/a", so that list is always: the acquisitions
+    with subjects before "n/a", the acquisitions not (yet) relabeled with subject "n/a" (in sorted order),
+    then the relabeled acquisitions and subjects after "n/a", sorted. The latter are kept sorted as
+    acquisitions are relabeled, which gives the same previous acquisitions (and labels) in a single pass.
+    """
+    head = [x for x in dataset_list if x["subject"] < "n/a"]
+    unlabeled = [x for x in dataset_list if x["subject"] == "n/a"]
+    tail = [x for x in dataset_list if x["subject"] > "n/a"]
+    tail_keys = [sort_key(x) for x in tail]
+    kept = []  # Acquisitions with subject "n/a" that aren't anonymized (so not relabeled)
+
+    def resorted_item(position, processed):
+        # Item at position of the list re-sorted after processing the first unlabeled acquisitions
+        for items, start in ((head, 0), (kept, 0), (unlabeled, processed)):
+            if position < len(items) - start:
+                return items[start + position]
+            position -= len(items) - start
+        return tail[position]
 
     pseudo_sub = 1
-    for index, unique_dic in enumerate(dataset_list):
-        if unique_dic["subject"] == "n/a":
-            if (unique_dic["AcquisitionDateTime"] == "0000-00-00T00:00:00.000000"
-                    and unique_dic["PatientID"] == "n/a"
-                    and unique_dic["PatientName"] == "n/a"):
-                # Likely working with anonymized data, so not obvious what subject/session mapping should be
-                if index == 0:
-                    subj = pseudo_sub
-                else:
-                    previous_data = dataset_list[index - 1]
-                    if unique_dic["SeriesNumber"] >= previous_data["SeriesNumber"]:
-                        if not unique_dic["SeriesNumber"] - previous_data["SeriesNumber"] < 2:
-                            # Probably a misalignment, adjust pseudo subject ID
-                            subj = pseudo_sub - 1
-                        else:
-                            subj = pseudo_sub
+    for processed, unique_dic in enumerate(unlabeled):
+        index = len(head) + processed
+        if (unique_dic["AcquisitionDateTime"] == "0000-00-00T00:00:00.000000"
+                and unique_dic["PatientID"] == "n/a"
+                and unique_dic["PatientName"] == "n/a"):
+            # Likely working with anonymized data, so not obvious what subject/session mapping should be
+            if index == 0:
+                subj = pseudo_sub
+            else:
+                previous_data = resorted_item(index - 1, processed)
+                if unique_dic["SeriesNumber"] >= previous_data["SeriesNumber"]:
+                    if not unique_dic["SeriesNumber"] - previous_data["SeriesNumber"] < 2:
+                        # Probably a misalignment, adjust pseudo subject ID
+                        subj = pseudo_sub - 1
                     else:
-                        if int(unique_dic["SeriesNumber"]) == 1:
-                            # Likely moving onto data from new subject or session, but going to assuming subject
-                            pseudo_sub += 1
                         subj = pseudo_sub
+                else:
+                    if int(unique_dic["SeriesNumber"]) == 1:
+                        # Likely moving onto data from new subject or session, but going to assuming subject
+                        pseudo_sub += 1
+                    subj = pseudo_sub
 
-                unique_dic["subject"] = (unique_dic["subject"] + ("0" * (4 - len(str(subj)))) + str(subj))
-                unique_dic["AcquisitionDateTime"] = unique_dic["subject"][:-4]
+            unique_dic["subject"] = (unique_dic["subject"] + ("0" * (4 - len(str(subj)))) + str(subj))
+            unique_dic["AcquisitionDateTime"] = unique_dic["subject"][:-4]
 
-        dataset_list = sorted(dataset_list, key=itemgetter(
-            "subject",
-            "AcquisitionTime",
-            "ModifiedSeriesNumber")
-        )
+            # Before the acquisitions with the same sort key (it comes from earlier in the re-sorted list)
+            position = bisect_left(tail_keys, sort_key(unique_dic))
+            tail_keys.insert(position, sort_key(unique_dic))
+            tail.insert(position, unique_dic)
+        else:
+            kept.append(unique_dic)
 
-    return dataset_list
+    return head + kept + tail
 
 
-def determine_sub_ses_IDs(dataset_list, bids_compliant):
+def determine_sub_ses_IDs(DATA_DIR, dataset_list, bids_compliant):
     """
     Determine subject ID(s), and session ID(s) (if applicable) of uploaded data.
 
     Parameters
     ----------
+    DATA_DIR : string
+        Root-level directory where uploaded data is stored and assessed.
+
     dataset_list : list
         List of dictionaries containing pertinent and unique information about
         the data, primarily coming from the metadata in the json files.
@@ -1409,39 +2319,51 @@ def determine_sub_ses_IDs(dataset_list, bids_compliant):
     subject_idx_counter = 0
     subs_information = []
     participants_info = {}
+
+    # Group acquisitions by subject, and then by (session, AcquisitionDate) pair, in a single pass
+    sub_groups = {}
+    for x in dataset_list:
+        sub_group = sub_groups.setdefault(x["subject"], {"acquisitions": [], "sessions": {}})
+        sub_group["acquisitions"].append(x)
+        sub_group["sessions"].setdefault((x["session"], x["AcquisitionDate"]), []).append(x)
+
+    # Organize phenotype (e.g., species, sex, age, handedness) information from participants.tsv, if provided
+    bids_root_dir = read_bids_compliant_log(DATA_DIR)[0]
+    participants_tsv = bids_compliant is True and os.path.isfile(f"{bids_root_dir}/participants.tsv")
+    if participants_tsv:
+        import pandas as pd
+        participants_info_data = pd.read_csv(f"{bids_root_dir}/participants.tsv", sep="\t")
+
+        participants_info_columns = ([x for x in participants_info_data.columns if x != "participant_id"]
+                                     + ["PatientID", "PatientName"])
+        participants_info_values = {
+            col: participants_info_data[col].tolist() for col in participants_info_columns
+            if col not in ["PatientID", "PatientName"]
+        }
+
+        for len_index, participant_id in enumerate(participants_info_data["participant_id"].tolist()):
+            participants_info[str(len_index)] = dict.fromkeys(participants_info_columns)
+
+            for col, values in participants_info_values.items():
+                participants_info[str(len_index)][col] = str(values[len_index])
+
+            if "sub-" in participant_id:
+                participant_id = participant_id.split("-")[-1]
+
+            participants_info[str(len_index)]["PatientID"] = str(participant_id)
+            participants_info[str(len_index)]["PatientName"] = str(participant_id)
+
     # Determine unique subjects from uploaded dataset
-    for sub in np.unique([x["subject"] for x in dataset_list]):
-        sub_dics_list = [x for x in dataset_list if x["subject"] == sub]
+    for sub in sorted(sub_groups):
+        sub_dics_list = sub_groups[sub]["acquisitions"]
+        ses_groups = sub_groups[sub]["sessions"]
 
         # Give each subject a unique subject_idx value
         for x in sub_dics_list:
             x["subject_idx"] = subject_idx_counter
         subject_idx_counter += 1
 
-        # Organize phenotype (e.g., species, sex, age, handedness) information
-        bids_root_dir = pd.read_csv(f"{DATA_DIR}/bids_compliant.log", header=None).iloc[0][0]
-        if bids_compliant is True and os.path.isfile(f"{bids_root_dir}/participants.tsv"):
-            participants_info_data = pd.read_csv(f"{bids_root_dir}/participants.tsv", sep="\t")
-
-            participants_info = {}
-            participants_info_columns = ([x for x in participants_info_data.columns if x != "participant_id"]
-                                         + ["PatientID", "PatientName"])
-
-            for len_index in range(len(participants_info_data)):
-                participants_info[str(len_index)] = dict.fromkeys(participants_info_columns)
-
-                for col in participants_info_columns:
-                    if col not in ["PatientID", "PatientName"]:
-                        participants_info[str(len_index)][col] = str(participants_info_data[col].iloc[len_index])
-                    else:
-                        if "sub-" in participants_info_data["participant_id"].iloc[len_index]:
-                            participant_id = participants_info_data["participant_id"].iloc[len_index].split("-")[-1]
-                        else:
-                            participant_id = participants_info_data["participant_id"].iloc[len_index]
-
-                        participants_info[str(len_index)]["PatientID"] = str(participant_id)
-                        participants_info[str(len_index)]["PatientName"] = str(participant_id)
-        else:
+        if not participants_tsv:
             phenotype_info = list(
                 {
                     "species": x["PatientSpecies"],
@@ -1458,21 +2380,16 @@ def determine_sub_ses_IDs(dataset_list, bids_compliant):
         # Determine all unique sessions (if applicable) per subject
         unique_ses_date_times = []
         session_idx_counter = 0
-        ses_dates = list(set([(x["session"], x["AcquisitionDate"]) for x in sub_dics_list]))
 
         # Session information includes the following metadata: session, AcquisitionDate, and AcquisitionTime
-        for ses_date in ses_dates:
-            ses_date = list(ses_date)
-            date_time = [
-                x["AcquisitionTime"] for x in sub_dics_list if x["session"] == ses_date[0]
-                and x["AcquisitionDate"] == ses_date[1]][0]
-            ses_date.append(date_time)
+        for ses_date, ses_dics_list in ses_groups.items():
             dic = {
                 "session": ses_date[0],
                 "AcquisitionDate": ses_date[1],
-                "AcquisitionTime": ses_date[2],
+                "AcquisitionTime": ses_dics_list[0]["AcquisitionTime"],
                 "exclude": False,
-                "session_idx": 0
+                "session_idx": 0,
+                "acquisitions": ses_dics_list
             }
             unique_ses_date_times.append(dic)
 
@@ -1492,19 +2409,12 @@ def determine_sub_ses_IDs(dataset_list, bids_compliant):
         # Pair patient information (PatientID, PatientName, PatientBirthDate) with corresponding session information
         patient_info = []
         for ses_info in unique_ses_date_times:
+            first_dic = ses_info["acquisitions"][0]
             patient_dic = {
-                "PatientID": [
-                    x["PatientID"] for x in sub_dics_list if x["session"] == ses_info["session"]
-                    and x["AcquisitionDate"] == ses_info["AcquisitionDate"]][0],
-                "PatientName": [
-                    x["PatientName"] for x in sub_dics_list if x["session"] == ses_info["session"]
-                    and x["AcquisitionDate"] == ses_info["AcquisitionDate"]][0],
-                "PatientBirthDate": [
-                    x["PatientBirthDate"] for x in sub_dics_list if x["session"] == ses_info["session"]
-                    and x["AcquisitionDate"] == ses_info["AcquisitionDate"]][0],
-                "file_directory": [
-                    x["file_directory"] for x in sub_dics_list if x["session"] == ses_info["session"]
-                    and x["AcquisitionDate"] == ses_info["AcquisitionDate"]][0]
+                "PatientID": first_dic["PatientID"],
+                "PatientName": first_dic["PatientName"],
+                "PatientBirthDate": first_dic["PatientBirthDate"],
+                "file_directory": first_dic["file_directory"]
             }
             patient_info.append(patient_dic)
 
@@ -1516,20 +2426,20 @@ def determine_sub_ses_IDs(dataset_list, bids_compliant):
         AcquisitionDate cannot be used with anonymized data because that metadata
         is removed.
         """
-        unique_ses_dates = [[x["session"], x["AcquisitionDate"]] for x in unique_ses_date_times]
-        for ses_date in unique_ses_dates:
-            unique_dates_dics_list = [x for x in unique_ses_date_times if x["AcquisitionDate"] == ses_date[1]]
+        date_groups = {}
+        for dic in unique_ses_date_times:
+            date_groups.setdefault(dic["AcquisitionDate"], []).append(dic)
+
+        for unique_dates_dics_list in date_groups.values():
             if len(unique_dates_dics_list) > 1:
                 for date_dic in unique_dates_dics_list:
-                    date_dic["AcquisitionDate"] = ses_date[1] + "." + str(date_counter)
+                    date_dic["AcquisitionDate"] = date_dic["AcquisitionDate"] + "." + str(date_counter)
                     date_counter += 1
 
         # update dataset_list with updated AcquisitionDate and session_idx info
         for sub_ses_map_dic in unique_ses_date_times:
-            for data_dic in dataset_list:
-                if (data_dic["subject"] == sub
-                        and data_dic["session"] == sub_ses_map_dic["session"]
-                        and data_dic["AcquisitionDate"] == sub_ses_map_dic["AcquisitionDate"].split(".")[0]):
+            for data_dic in sub_ses_map_dic.pop("acquisitions"):
+                if data_dic["AcquisitionDate"] == sub_ses_map_dic["AcquisitionDate"].split(".")[0]:
                     data_dic["AcquisitionDate"] = sub_ses_map_dic["AcquisitionDate"]
                     data_dic["session_idx"] = sub_ses_map_dic["session_idx"]
 
@@ -1581,7 +2491,7 @@ def determine_unique_series(dataset_list, bids_compliant):
         dictionaries of acquisitions with a unique series group ID.
     """
     dataset_list_unique_series = []
-    series_checker = []
+    series_idx_map = {}
     series_idx = 0
 
     for index, acquisition_dic in enumerate(dataset_list):
@@ -1595,23 +2505,10 @@ def determine_unique_series(dataset_list, bids_compliant):
         ("_RR" in SeriesDescription), they should be of same unique
         series as non retro-reconstruction ones. These are generally rare
         cases, but should be accounted for.
-        """
-        descriptor = acquisition_dic["descriptor"]
-        if "_RR" in acquisition_dic["SeriesDescription"]:
-            heuristic_items = [
-                round(acquisition_dic["EchoTime"], 1),
-                acquisition_dic[descriptor].replace("_RR", ""),
-                acquisition_dic["ImageType"],
-                round(acquisition_dic["RepetitionTime"], 1)
-            ]
-        else:
-            heuristic_items = [
-                round(acquisition_dic["EchoTime"], 1),
-                acquisition_dic[descriptor],
-                acquisition_dic["ImageType"],
-                round(acquisition_dic["RepetitionTime"], 1)
-            ]
 
+        Acquisitions with the same (rounded) heuristic values share the series_idx of the
+        first acquisition seen with those values, so series_idx_map is keyed on them.
+        """
         if bids_compliant is True:  # Each uploaded BIDS NIfTI/JSON pair is a unique series
             if index == 0:
                 series_idx = 0
@@ -1620,25 +2517,28 @@ def determine_unique_series(dataset_list, bids_compliant):
             acquisition_dic["series_idx"] = series_idx
             dataset_list_unique_series.append(acquisition_dic)
         else:
-            if index == 0:
-                acquisition_dic["series_idx"] = 0
-                dataset_list_unique_series.append(acquisition_dic)
+            descriptor = acquisition_dic["descriptor"]
+            if "_RR" in acquisition_dic["SeriesDescription"]:
+                descriptor_value = acquisition_dic[descriptor].replace("_RR", "")
             else:
-                if heuristic_items[1:3] not in [x[1:3] for x in series_checker]:
-                    series_idx += 1
-                    acquisition_dic["series_idx"] = series_idx
-                    dataset_list_unique_series.append(acquisition_dic)
-                else:
-                    if heuristic_items not in [x[:-1] for x in series_checker]:
-                        series_idx += 1
-                        acquisition_dic["series_idx"] = series_idx
-                        dataset_list_unique_series.append(acquisition_dic)
-                    else:
-                        common_series_index = [x[:-1] for x in series_checker].index(heuristic_items)
-                        common_series_idx = series_checker[common_series_index][-1]
-                        acquisition_dic["series_idx"] = common_series_idx
+                descriptor_value = acquisition_dic[descriptor]
+
+            image_type = acquisition_dic["ImageType"]
+            if isinstance(image_type, list):
+                image_type = tuple(image_type)
+
+            heuristic_key = (
+                round(acquisition_dic["EchoTime"], 1),
+                descriptor_value,
+                image_type,
+                round(acquisition_dic["RepetitionTime"], 1)
+            )
+
+            if heuristic_key not in series_idx_map:
+                series_idx_map[heuristic_key] = len(series_idx_map)
+                dataset_list_unique_series.append(acquisition_dic)
 
-            series_checker.append(heuristic_items + [acquisition_dic["series_idx"]])
+            acquisition_dic["series_idx"] = series_idx_map[heuristic_key]
 
     return dataset_list, dataset_list_unique_series
 
@@ -1686,15 +2586,14 @@ def template_configuration(dataset_list_unique_series, subs_information, config_
         Specifies whether or not user wants BIDS URI format for IntendedFor metadata mapping
     """
 
-    config_data = open(config_file)
-    config_data = json.load(config_data, strict=False)
+    # The parsed template is cached (and shared with later analyses): copy what is handed out
+    template = load_template(config_file)
+    config_data = template["config"]
 
     readme = config_data["readme"]
-    dataset_description_dic = config_data["datasetDescription"]
-    participants_column_info = config_data["participantsColumn"]
+    dataset_description_dic = copy.deepcopy(config_data["datasetDescription"])
+    participants_column_info = copy.deepcopy(config_data["participantsColumn"])
     subjects_sessions_info = config_data["subjects"]
-    config_dataset_list_unique_series = config_data["series"]
-    config_dataset_list_objects = config_data["objects"]
     bids_uri = config_data["BIDSURI"]
 
     # Try to determine subject (and session) mapping from what's in the configuration
@@ -1760,26 +2659,23 @@ def template_configuration(dataset_list_unique_series, subs_information, config_
     Find datatype, suffix, and entity labels in uploaded data based on correspondence with data referenced
     in configuration.
     """
+    config_series_refs = {}  # template series position -> copy, shared by the series matching it
+    ref_sidecars = {}  # template series_idx -> copy of its first object's sidecar
     for unique_dic in dataset_list_unique_series:
-        sd = unique_dic["SeriesDescription"]
-        et = unique_dic["EchoTime"]
-        rt = unique_dic["RepetitionTime"]
-        it = unique_dic["ImageType"]
         sidecar = unique_dic["sidecar"]
 
         """
         Don't use series_idx as identifier because the uploaded data might not contain the same data as
         what is referenced in the configuration (e.g., new data is uploaded that wasn't present in configuration)
         """
-        config_series_ref_list = [
-            x for x in config_dataset_list_unique_series if x["SeriesDescription"] == sd
-            and x["ImageType"] == it
-            and round(x["EchoTime"], 1) == round(et, 1)
-            and round(x["RepetitionTime"], 1) == round(rt, 1)
-        ]
-
-        if len(config_series_ref_list):  # Should only be length of 1, but being extra cautious
-            config_series_ref = config_series_ref_list[0]
+        config_series_position = find_template_series(template, unique_dic)
+
+        if config_series_position is not None:  # Should only be one match, but being extra cautious (1st one)
+            if config_series_position not in config_series_refs:
+                config_series_refs[config_series_position] = copy.deepcopy(
+                    config_data["series"][config_series_position]
+                )
+            config_series_ref = config_series_refs[config_series_position]
             ref_type = config_series_ref["type"]
             ref_entities = config_series_ref["entities"]
             ref_IntendedFor = config_series_ref["IntendedFor"]
@@ -1805,13 +2701,10 @@ def template_configuration(dataset_list_unique_series, subs_information, config_
             """
             If metadata information was added in, find it and add to the json file.
             """
-            ref_object = [
-                x for x in config_dataset_list_objects
-                if "series_idx" in x.keys()
-                and x["series_idx"] == ref_series_idx
-            ]
-            if len(ref_object):  # If len > 1, just take the 1st instance
-                ref_sidecar = [x["sidecar"] for x in ref_object[0]["items"] if x["name"] == "json"][0]
+            if ref_series_idx not in ref_sidecars:
+                ref_sidecars[ref_series_idx] = copy.deepcopy(find_template_sidecar(template, ref_series_idx))
+            ref_sidecar = ref_sidecars[ref_series_idx]
+            if ref_sidecar is not None:  # If several objects, just take the 1st instance
                 for field in ref_sidecar:
                     value = ref_sidecar[field]
                     if field not in sidecar and field not in anonymized_sidecar_fields:
@@ -1823,7 +2716,7 @@ def template_configuration(dataset_list_unique_series, subs_information, config_
     If events.tsv files (for func/bold) are referenced in the configuration, grab this information and display
     it on the Events page if user uploads event timing data again.
     """
-    events = config_data["events"]
+    events = copy.deepcopy(config_data["events"])
     events["loaded"] = False
     events["sampleValues"] = {}
 
@@ -1831,14 +2724,15 @@ def template_configuration(dataset_list_unique_series, subs_information, config_
             dataset_list_unique_series, subs_information, events, bids_uri)
 
 
-def create_lookup_info():
+def create_lookup_info(bids_schema):
     """
     Creates a lookup dictionary of conditionals for identifying different
     datatypes and suffixes, as well as some entity label information.
 
     Parameters
     ----------
-    None
+    bids_schema : dictionary
+        BIDS schema information (see bids_schema.load_bids_schema).
 
     Returns
     -------
@@ -1858,11 +2752,10 @@ def create_lookup_info():
         }
     }
 
-    for datatype in datatypes_yaml.keys():
+    for datatype in bids_schema["datatypes"]:
         if datatype in accepted_datatypes:
             lookup_dic[datatype] = {}
-            rule = yaml.load(open(os.path.join(analyzer_dir, datatype_suffix_rules, datatype) + ".yaml"),
-                             Loader=yaml.FullLoader)
+            rule = bids_schema["datatype_rules"][datatype]
 
             for key in rule.keys():
                 suffixes = rule[key]["suffixes"]
@@ -2250,7 +3143,102 @@ def create_lookup_info():
     return lookup_dic
 
 
-def datatype_suffix_identification(dataset_list_unique_series, lookup_dic, config):
+def build_search_trie(search_terms):
+    """
+    Builds a character trie of search terms, so that find_search_terms can find all of
+    them in a string with a single pass over it.
+
+    Parameters
+    ----------
+    search_terms : list
+        Search terms (plain strings, not regular expressions).
+
+    Returns
+    -------
+    search_trie : dictionary
+        Nested dictionaries keyed by character. None marks the end of a search term.
+    """
+    search_trie = {}
+    for search_term in search_terms:
+        node = search_trie
+        for char in search_term:
+            node = node.setdefault(char, {})
+        node[None] = search_term
+
+    return search_trie
+
+
+def compile_lookup_rules(lookup_dic):
+    """
+    Compiles the lookup_dic conditions (Python expressions stored as strings) into functions, and
+    builds a single matcher (character trie) over all search terms, so that datatype_suffix_identification
+    doesn't have to eval() every condition and test every search term separately for each unique series.
+
+    Parameters
+    ----------
+    lookup_dic : dictionary
+        A lookup dictionary of conditionals for identifying different
+        datatypes and suffixes, as well as some entity label information.
+
+    Returns
+    -------
+    compiled_lookup : dictionary
+        "rules": the lookup_dic datatype/suffix rules, each with added "checks" (compiled conditions,
+        called with sd, unique_dic, dataset_list_unique_series, index) and "condition_labels"
+        (conditions formatted for the messages displayed to the user).
+        "search_trie": character trie of all search terms (see build_search_trie).
+    """
+    rules = {}
+    search_terms = []
+    for datatype, suffix_rules in lookup_dic.items():
+        rules[datatype] = {}
+        for suffix, rule in suffix_rules.items():
+            rules[datatype][suffix] = dict(rule)
+            rules[datatype][suffix]["checks"] = [
+                eval(f"lambda sd, unique_dic, dataset_list_unique_series, index: ({condition})")
+                for condition in rule["conditions"]
+            ]
+            rules[datatype][suffix]["condition_labels"] = [
+                (x.replace("unique_dic", "").replace('["', "").replace('"]', "").
+                    replace("dataset_list_unique_series[index - 2]", "")) for x in rule["conditions"]
+            ]
+            search_terms.extend(rule["search_terms"])
+
+    return {"rules": rules, "search_trie": build_search_trie(search_terms)}
+
+
+def find_search_terms(search_trie, sd):
+    """
+    Finds every search term that occurs in the SeriesDescription (or ProtocolName),
+    in a single pass over it.
+
+    Parameters
+    ----------
+    search_trie : dictionary
+        Character trie of the search terms (see build_search_trie).
+
+    sd : string
+        Normalized SeriesDescription (or ProtocolName).
+
+    Returns
+    -------
+    found_search_terms : set
+        Search terms that are substrings of sd.
+    """
+    found_search_terms = set()
+    for start in range(len(sd)):
+        node = search_trie
+        for char_index in range(start, len(sd)):
+            node = node.get(sd[char_index])
+            if node is None:
+                break
+            if None in node:
+                found_search_terms.add(node[None])
+
+    return found_search_terms
+
+
+def datatype_suffix_identification(dataset_list_unique_series, lookup_dic, config, bids_schema):
     """
     Uses metadata to try to determine the identity (i.e. datatype and suffix)
     of each unique acquisition in uploaded dataset.
@@ -2269,6 +3257,9 @@ def datatype_suffix_identification(dataset_list_unique_series, lookup_dic, confi
     config : boolean
         True if an ezBIDS configuration file (*ezBIDS_template.json) was detected in the upload
 
+    bids_schema : dictionary
+        BIDS schema information (see bids_schema.load_bids_schema).
+
     Returns
     -------
     dataset_list_unique_series : list of dictionaries
@@ -2278,12 +3269,16 @@ def datatype_suffix_identification(dataset_list_unique_series, lookup_dic, confi
     print("")
     print("Datatype & suffix identification")
     print("------------------------------------")
+    bids_datatypes = bids_schema["datatypes"]
+    bids_suffixes = bids_schema["suffixes"]
     """
     Schema datatype and suffix labels are helpful, but typically
     researchers label their imaging protocols in less standardized ways.
     ezBIDS will attempt to determine datatype and suffix labels based on
     common keys/labels.
     """
+    compiled_lookup = compile_lookup_rules(lookup_dic)
+
     for index, unique_dic in enumerate(dataset_list_unique_series):
         # Not ideal using json_path because it's only the first sequence in the series_idx group...
         json_path = unique_dic["json_path"]
@@ -2294,14 +3289,11 @@ def datatype_suffix_identification(dataset_list_unique_series, lookup_dic, confi
             unique_dic["message"] = unique_dic["error"]
         elif unique_dic["finalized_match"] is False:
             # Try checking the json paths themselves for explicit information regarding datatype and suffix
-            for datatype in datatypes_yaml:
+            for datatype in bids_datatypes:
                 if f"/{datatype}/" in json_path:
                     unique_dic["datatype"] = datatype
 
-                rule = yaml.load(open(os.path.join(analyzer_dir, datatype_suffix_rules, datatype) + ".yaml"),
-                                 Loader=yaml.FullLoader)
-
-                suffixes = [x for y in [rule[x]["suffixes"] for x in rule] for x in y]
+                suffixes = bids_schema["datatype_suffixes"][datatype]
 
                 short_suffixes = [x for x in suffixes if len(x) < 3]
 
@@ -2383,7 +3375,7 @@ def datatype_suffix_identification(dataset_list_unique_series, lookup_dic, confi
                 if len(bids_guess) == 2:  # should always be length of 2, but just to be safe
                     datatype = str(bids_guess[0]).lower()  # in case BidsGuess doesn't make datatype lowercase
                     suffix = bids_guess[1].split("_")[-1]
-                    for bids_ref_suffix in suffixes_yaml:  # in case BidsGuess not use proper suffix case format (e.g PET)
+                    for bids_ref_suffix in bids_suffixes:  # in case BidsGuess not use proper suffix case format (e.g PET)
                         if bids_ref_suffix != suffix and bids_ref_suffix.lower() == suffix.lower():
                             suffix = bids_ref_suffix
                     # Issue with BidsGuess and func/sbref identification
@@ -2394,7 +3386,7 @@ def datatype_suffix_identification(dataset_list_unique_series, lookup_dic, confi
                         if "sbref" in sd and unique_dic["NumVolumes"] == 1:
                             suffix = "sbref"
 
-                    if datatype.lower() not in [x for x in datatypes_yaml.keys()]:  # assumed to be non-BIDS data
+                    if datatype.lower() not in bids_datatypes:  # assumed to be non-BIDS data
                         if suffix in ["localizer", "scout"] or "_i0000" in unique_dic["paths"][0]:
                             # localizer
                             unique_dic["message"] = "Acquisition was determined to be a localizer sequence, " \
@@ -2428,25 +3420,19 @@ def datatype_suffix_identification(dataset_list_unique_series, lookup_dic, confi
                 sd = re.sub("[^A-Za-z0-9]+", "_", sd).lower() + "_"
                 # sd_sparse = re.sub("[^A-Za-z0-9]+", "", sd)
 
+                found_search_terms = find_search_terms(compiled_lookup["search_trie"], sd)
+
                 cont = True
-                for datatype in lookup_dic.keys():
+                for datatype, suffix_rules in compiled_lookup["rules"].items():
                     if datatype not in ["localizer", "dwi_derivatives"]:
-                        suffixes = lookup_dic[datatype].keys()
-                        for suffix in suffixes:
-                            search_terms = lookup_dic[datatype][suffix]["search_terms"]
-                            conditions = lookup_dic[datatype][suffix]["conditions"]
-                            eval_checks = [eval(t, {"sd": sd,
-                                                    "unique_dic": unique_dic,
-                                                    "dataset_list_unique_series": dataset_list_unique_series,
-                                                    "index": index
-                                                    }) for t in conditions]
-                            if any(x in sd for x in search_terms):
+                        for suffix, rule in suffix_rules.items():
+                            search_hit = next((x for x in rule["search_terms"] if x in found_search_terms), None)
+                            if search_hit is not None:
                                 # Search term match
-                                conditions = [
-                                    (x.replace("unique_dic", "").replace('["', "").replace('"]', "").
-                                        replace("dataset_list_unique_series[index - 2]", "")) for x in conditions
+                                eval_checks = [
+                                    check(sd, unique_dic, dataset_list_unique_series, index) for check in rule["checks"]
                                 ]
-                                search_hit = [x for x in search_terms if re.findall(x, sd)][0]
+                                conditions = rule["condition_labels"]
 
                                 if len([t for t in eval_checks if t is True]) == len(conditions):
                                     # Search term match, as well as all necessary conditions for datatype/suffix pair
@@ -2499,12 +3485,13 @@ def datatype_suffix_identification(dataset_list_unique_series, lookup_dic, confi
                             break
                     else:
                         # Localizers
+                        rule = suffix_rules["exclude"]
+                        eval_checks = [
+                            check(sd, unique_dic, dataset_list_unique_series, index) for check in rule["checks"]
+                        ]
+                        search_hit = any(x in found_search_terms for x in rule["search_terms"])
                         if datatype == "localizer":
-                            search_terms = lookup_dic[datatype]["exclude"]["search_terms"]
-                            conditions = lookup_dic["localizer"]["exclude"]["conditions"]
-                            eval_checks = [eval(t, {"sd": sd, "unique_dic": unique_dic}) for t in conditions]
-                            if (any(x in sd for x in search_terms)
-                                    or len([t for t in eval_checks if t]) == len(conditions)):
+                            if search_hit or len([t for t in eval_checks if t]) == len(eval_checks):
                                 unique_dic["type"] = "exclude"
                                 unique_dic["error"] = "Acquisition appears to be a localizer"
                                 unique_dic["message"] = "Acquisition is believed to be a " \
@@ -2512,11 +3499,7 @@ def datatype_suffix_identification(dataset_list_unique_series, lookup_dic, confi
                                     "modify if incorrect."
                         # DWI derivatives (TRACEW, FA, ADC)
                         elif datatype == "dwi_derivatives":
-                            search_terms = lookup_dic[datatype]["exclude"]["search_terms"]
-                            conditions = lookup_dic["dwi_derivatives"]["exclude"]["conditions"]
-                            eval_checks = [eval(t, {"sd": sd, "unique_dic": unique_dic}) for t in conditions]
-                            if (any(x in sd for x in search_terms)
-                                    and len([t for t in eval_checks if t]) == len(conditions)):
+                            if search_hit and len([t for t in eval_checks if t]) == len(eval_checks):
                                 unique_dic["type"] = "exclude"
                                 unique_dic["error"] = "Acquisition appears to be a TRACEW, FA, or " \
                                     "ADC, which are unsupported by ezBIDS and will therefore not " \
@@ -2582,12 +3565,10 @@ def datatype_suffix_identification(dataset_list_unique_series, lookup_dic, confi
         ]
 
         if len(anat_ME_RMS):
+            alphanumeric_descriptors = [re.sub("[^A-Za-z0-9]+", "", v[descriptor]) for v in dataset_list_unique_series]
             for anat_ME_RMS_index in anat_ME_RMS:
-                sd = dataset_list_unique_series[anat_ME_RMS_index][descriptor]
-                anat_ind_ME_indices = [
-                    x for (x, v) in enumerate(dataset_list_unique_series)
-                    if re.sub("[^A-Za-z0-9]+", "", v[descriptor]) == re.sub("[^A-Za-z0-9]+", "", sd).replace("RMS", "")
-                ]
+                sd = alphanumeric_descriptors[anat_ME_RMS_index].replace("RMS", "")
+                anat_ind_ME_indices = [x for (x, v) in enumerate(alphanumeric_descriptors) if v == sd]
 
                 for anat_ind_ME_index in anat_ind_ME_indices:
                     dataset_list_unique_series[anat_ind_ME_index]["message"] = (
@@ -2600,7 +3581,7 @@ def datatype_suffix_identification(dataset_list_unique_series, lookup_dic, confi
     return dataset_list_unique_series
 
 
-def entity_labels_identification(dataset_list_unique_series, lookup_dic):
+def entity_labels_identification(dataset_list_unique_series, lookup_dic, bids_schema, cog_atlas_tasks):
     """
     Function to determine acquisition entity label information (e.g. dir-, echo-)
     based on acquisition metadata. Entities are then sorted in accordance with
@@ -2617,6 +3598,12 @@ def entity_labels_identification(dataset_list_unique_series, lookup_dic):
         Included is a series of rules/heuristics to help map imaging sequences to their appropriate
         datatype and suffix labels.
 
+    bids_schema : dictionary
+        BIDS schema information (see bids_schema.load_bids_schema).
+
+    cog_atlas_tasks : list
+        Cognitive Atlas task names (see find_cog_atlas_tasks).
+
     Returns
     -------
     dataset_list_unique_series : list of dictionaries
@@ -2626,7 +3613,14 @@ def entity_labels_identification(dataset_list_unique_series, lookup_dic):
     print("")
     print("Entity label identification")
     print("----------------------------")
-    entity_ordering = yaml.load(open(os.path.join(analyzer_dir, entity_ordering_file)), Loader=yaml.FullLoader)
+    bids_entities = bids_schema["entities"]
+    entity_ordering_index = bids_schema["entity_ordering_index"]
+
+    # Cognitive Atlas task names are all lowercase alphanumeric, so can be found as plain substrings of sd
+    cog_atlas_trie = build_search_trie(cog_atlas_tasks)
+    cog_atlas_task_order = {}
+    for task_index, task_name in enumerate(cog_atlas_tasks):
+        cog_atlas_task_order.setdefault(task_name, task_index)
 
     tb1afi_tr = 1
     tb1srge_td = 1
@@ -2640,9 +3634,9 @@ def entity_labels_identification(dataset_list_unique_series, lookup_dic):
             json_path = unique_dic["json_path"]
 
             # Check to see if entity labels can be determined from BIDS naming convention
-            for key in entities_yaml:
+            for key in bids_entities:
                 if key not in ["subject", "session", "direction"]:  # ezBIDS already knows PED for dir entity label
-                    entity = entities_yaml[key]['entity']
+                    entity = bids_entities[key]
                     if f"_{entity}_" in sd:
                         # series_entities[key] = re.split(regex, sd.split(f"{entity}_")[-1])[0].replace("_", "")
                         # series_entities[key] = re.split('_', sd.split(f"{entity}_")[-1])[0] Used as of 12/13/23
@@ -2665,16 +3659,15 @@ def entity_labels_identification(dataset_list_unique_series, lookup_dic):
             if any(x in func_rest_keys for x in sd.split('_')) and not series_entities["task"]:
                 series_entities["task"] = "rest"
             else:
-                match_index = [
-                    x for x, y in enumerate(re.search(x, sd, re.IGNORECASE) for x in cog_atlas_tasks) if y is not None
-                ]
-                if len(match_index):
-                    task_name = cog_atlas_tasks[match_index[0]]
+                # First task (in cog_atlas_tasks order) found in the SeriesDescription (or ProtocolName)
+                matching_tasks = find_search_terms(cog_atlas_trie, sd)
+                if len(matching_tasks):
+                    task_name = min(matching_tasks, key=cog_atlas_task_order.get)
                     if len(task_name) < 4:  # Too many possible false positives with short task names
                         if any(f"task-{task_name}" in x for x in [unique_dic["json_path"], unique_dic["SeriesDescription"]]):
-                            series_entities["task"] = cog_atlas_tasks[match_index[0]]
+                            series_entities["task"] = task_name
                     else:
-                        series_entities["task"] = cog_atlas_tasks[match_index[0]]
+                        series_entities["task"] = task_name
 
             if (any(x in re.sub("[^A-Za-z0-9]+", "", sd).lower() for x in ["noise", "emptyroom"])
                     or series_entities["subject"] == "emptyroom"):  # for MEG data
@@ -2792,7 +3785,7 @@ def entity_labels_identification(dataset_list_unique_series, lookup_dic):
                     pass
 
             # Order the entities labels according to the BIDS specification
-            series_entities = dict(sorted(series_entities.items(), key=lambda pair: entity_ordering.index(pair[0])))
+            series_entities = dict(sorted(series_entities.items(), key=lambda pair: entity_ordering_index[pair[0]]))
 
             unique_dic["entities"] = series_entities
 
@@ -2820,16 +3813,21 @@ def check_part_entity(dataset_list_unique_series, config):
         dictionaries of acquisitions with a unique series group ID.
     """
     if config is False:
-        part_phase_data = [x for x in dataset_list_unique_series if x["entities"]["part"] == "phase"]
-
-        for part in part_phase_data:
-            mag_data = [
-                x for x in dataset_list_unique_series if x != part
-                and x["SeriesDescription"] == part["SeriesDescription"]
-                and x["type"] == part["type"]
-                and ({key: val for key, val in x["entities"].items() if key != "part"}
-                     == {key: val for key, val in part["entities"].items() if key != "part"})
-            ]
+        # Group the series that only differ by their part entity, in a single pass
+        part_groups = {}
+        part_phase_data = []
+        for x in dataset_list_unique_series:
+            series_key = (
+                x["SeriesDescription"],
+                x["type"],
+                frozenset((key, val) for key, val in x["entities"].items() if key != "part")
+            )
+            part_groups.setdefault(series_key, []).append(x)
+            if x["entities"]["part"] == "phase":
+                part_phase_data.append((x, series_key))
+
+        for part, series_key in part_phase_data:
+            mag_data = [x for x in part_groups[series_key] if x != part]
 
             if len(mag_data) and len(mag_data) == 1:
                 mag_data[0]["entities"]["part"] = "mag"
@@ -2856,21 +3854,51 @@ def update_dataset_list(dataset_list, dataset_list_unique_series):
         A modified version of dataset_list, where this list contains only the
         dictionaries of acquisitions with a unique series group ID.
     """
+    series_idx_groups = {}
+    for data in dataset_list:
+        series_idx_groups.setdefault(data["series_idx"], []).append(data)
+
     for unique_dic in dataset_list_unique_series:
-        for data in dataset_list:
-            if data["series_idx"] == unique_dic["series_idx"]:
-                data["entities"] = unique_dic["entities"]
-                data["type"] = unique_dic["type"]
-                data["error"] = unique_dic["error"]
-                data["message"] = unique_dic["message"]
-                data["IntendedFor"] = unique_dic["IntendedFor"]
-                data["B0FieldIdentifier"] = unique_dic["B0FieldIdentifier"]
-                data["B0FieldSource"] = unique_dic["B0FieldSource"]
+        for data in series_idx_groups.get(unique_dic["series_idx"], []):
+            data["entities"] = unique_dic["entities"]
+            data["type"] = unique_dic["type"]
+            data["error"] = unique_dic["error"]
+            data["message"] = unique_dic["message"]
+            data["IntendedFor"] = unique_dic["IntendedFor"]
+            data["B0FieldIdentifier"] = unique_dic["B0FieldIdentifier"]
+            data["B0FieldSource"] = unique_dic["B0FieldSource"]
 
     return dataset_list
 
 
-def modify_objects_info(dataset_list):
+def add_header_dump(header_block, header_dumps):
+    """
+    Adds the formatted header of an acquisition, displayed by the ezBIDS UI ("Nifti Headers"), to the
+    headers table of ezBIDS_core.json. Acquisitions of the same series mostly share the same header, so
+    each distinct header is only formatted and stored once, and items reference it by key ("headersKey").
+
+    Parameters
+    ----------
+    header_block : bytes
+        Raw NIfTI header bytes.
+
+    header_dumps : dictionary
+        Formatted header lines, by header key (see nifti_headers.py).
+
+    Returns
+    -------
+    key : string
+        Header key of the acquisition.
+    """
+    key = header_key(header_block)
+
+    if key not in header_dumps:
+        header_dumps[key] = format_header(header_block)
+
+    return key
+
+
+def modify_objects_info(DATA_DIR, dataset_list, bids_schema, tsv_headers_cache, header_dumps):
     """
     Make any necessary changes to the objects level, which primarily entails
     adding a section ID value to each acquisition, creating image screenshots,
@@ -2878,10 +3906,23 @@ def modify_objects_info(dataset_list):
 
     Parameters
     ----------
+    DATA_DIR : string
+        Root-level directory where uploaded data is stored and assessed.
+
     dataset_list : list
         List of dictionaries containing pertinent and unique information about
         the data, primarily coming from the metadata in the json files.
 
+    bids_schema : dictionary
+        BIDS schema information (see bids_schema.load_bids_schema).
+
+    tsv_headers_cache : dictionary
+        The analysis' TSV header cache (see new_analysis_caches).
+
+    header_dumps : dictionary
+        Headers table of ezBIDS_core.json, filled with the headers referenced by the NIfTI items
+        (see add_header_dump).
+
     Returns
     -------
     objects_list : list
@@ -2889,18 +3930,16 @@ def modify_objects_info(dataset_list):
     """
     objects_list = []
 
-    entity_ordering = yaml.load(open(os.path.join(analyzer_dir, entity_ordering_file)), Loader=yaml.FullLoader)
+    # Entities in the order BIDS expects
+    ordered_entities = sorted(bids_schema["entities"], key=bids_schema["entity_ordering_index"].__getitem__)
 
-    # Find unique subject/session idx pairs in dataset and sort them
-    subj_ses_pairs = [[x["subject_idx"], x["session_idx"]] for x in dataset_list]
-    unique_subj_ses_pairs = sorted([list(i) for i in set(tuple(i) for i in subj_ses_pairs)])
+    # Group acquisitions by their subject/session idx pair, then go through the pairs in sorted order
+    subj_ses_groups = {}
+    for x in dataset_list:
+        subj_ses_groups.setdefault((x["subject_idx"], x["session_idx"]), []).append(x)
 
-    for unique_subj_ses in unique_subj_ses_pairs:
-        scan_protocol = [
-            x for x in dataset_list
-            if x["subject_idx"] == unique_subj_ses[0]
-            and x["session_idx"] == unique_subj_ses[1]
-        ]
+    for unique_subj_ses in sorted(subj_ses_groups):
+        scan_protocol = subj_ses_groups[unique_subj_ses]
 
         objects_data = []
 
@@ -2909,14 +3948,13 @@ def modify_objects_info(dataset_list):
         additional information.
         """
         for protocol in scan_protocol:
-            if protocol["nibabel_image"] == "n/a":
-                protocol["headers"] = "n/a"
+            image_summary = protocol["image_summary"]
+            if image_summary is None:
+                headers_key = None
             else:
-                image = protocol["nibabel_image"]
-                protocol["headers"] = str(image.header).splitlines()[1:]
+                headers_key = add_header_dump(image_summary.header_block, header_dumps)
 
-                object_img_array = image.dataobj
-                if object_img_array.dtype not in ["<i2", "<u2", "<f4", "int16", "uint16"]:
+                if image_summary.dtype not in ["<i2", "<u2", "<f4", "int16", "uint16"]:
                     # Weird edge case where data array is RGB instead of integer
                     protocol["exclude"] = True
                     protocol["error"] = "The data array for this " \
@@ -2928,7 +3966,7 @@ def modify_objects_info(dataset_list):
                     protocol["type"] = "exclude"
 
                 # Check for negative dimensions and exclude from BIDS conversion if they exist
-                if len([x for x in image.shape if x < 0]):
+                if image_summary.negative_dims:
                     protocol["exclude"] = True
                     protocol["type"] = "exclude"
                     protocol["error"] = "Image contains negative dimension(s) and cannot be converted to BIDS format"
@@ -2939,10 +3977,7 @@ def modify_objects_info(dataset_list):
             else:
                 protocol["error"] = []
 
-            objects_entities = dict(zip([x for x in entities_yaml], [""] * len([x for x in entities_yaml])))
-
-            # Re-order entities to what BIDS expects
-            objects_entities = dict(sorted(objects_entities.items(), key=lambda pair: entity_ordering.index(pair[0])))
+            objects_entities = dict.fromkeys(ordered_entities, "")
 
             # Make items list (part of objects list)
             items = []
@@ -2959,7 +3994,7 @@ def modify_objects_info(dataset_list):
                                   "sidecar": protocol["sidecar"]})
                     if item.endswith("blood.json"):
                         path = item.split(".json")[0] + ".tsv"
-                        headers = [x for x in pd.read_csv(path, sep="\t").columns]
+                        headers = read_tsv_headers(os.path.join(DATA_DIR, path), tsv_headers_cache)
                         items.append({"path": path,
                                       "name": "tsv",
                                       "headers": headers})
@@ -2967,7 +4002,7 @@ def modify_objects_info(dataset_list):
                     items.append({"path": item,
                                   "name": "nii.gz",
                                   "pngPaths": [],
-                                  "headers": protocol["headers"]})
+                                  "headersKey": headers_key})
                 elif item.endswith(tuple(MEG_extensions)):
                     if item.endswith('.ds'):
                         name = '.ds'
@@ -2976,7 +4011,7 @@ def modify_objects_info(dataset_list):
                     items.append({"path": item,
                                   "name": name,
                                   "pngPaths": [],
-                                  "headers": protocol["headers"]})
+                                  "headersKey": headers_key})
 
             # Objects-level info for ezBIDS_core.json
             objects_info = {
@@ -3081,160 +4116,317 @@ def check_dwi_b0maps(dataset_list_unique_series):
     return dataset_list_unique_series
 
 
-# Begin (Apply functions)
-print("########################################")
-print("Beginning conversion process of uploaded dataset")
-print("########################################")
-print("")
+def load_analyzer_context(schema_dir=BIDS_SCHEMA_DIR, cog_atlas_url=COG_ATLAS_URL):
+    """
+    Loads the session-independent information the analyzer relies on, so that a process
+    analyzing many sessions only loads it once (see analyze).
 
-# Load dataframe containing all uploaded files
-try:
-    uploaded_img_list = natsorted(pd.read_csv("list", header=None, lineterminator='\n').to_numpy().flatten().tolist())
-except:
-    # Need for [rare] instances where a comma (or other escape character) is in the file path
-    uploaded_img_list = natsorted(
-        pd.read_csv("list", sep=' ', header=None, lineterminator='\n').to_numpy().flatten().tolist()
-    )
+    Parameters
+    ----------
+    schema_dir : str or Path
+        Path to the bids-specification/src/schema directory.
 
-# Remove dots in file names (that aren't extensions). This screws up the bids-validator otherwise
-uploaded_img_list = fix_multiple_dots(uploaded_img_list)
-
-# Generate MEG json files, if MEG data was provided
-generate_MEG_json_sidecars(uploaded_img_list)
-
-# Filter uploaded files list for files that ezBIDS can't use and check for ezBIDS configuration file
-uploaded_files_list, exclude_data, config, config_file = modify_uploaded_dataset_list(uploaded_img_list)
-
-# # Generate list of all possible Cognitive Atlas task terms
-cog_atlas_tasks = find_cog_atlas_tasks(cog_atlas_url)
-
-# Create the dataset list of dictionaries
-dataset_list = generate_dataset_list(uploaded_files_list, exclude_data)
-
-# Get pesudo subject (and session) info
-dataset_list = organize_dataset(dataset_list)
-
-# Determine subject (and session) information
-dataset_list, subs_information, participants_info = determine_sub_ses_IDs(dataset_list, bids_compliant)
-
-# Make a new list containing the dictionaries of only unique dataset acquisitions
-dataset_list, dataset_list_unique_series = determine_unique_series(dataset_list, bids_compliant)
-
-# If ezBIDS configuration file detected in upload, use that for datatype, suffix, and entity identifications
-if config is True:
-    readme, dataset_description_dic, participants_column_info, dataset_list_unique_series, subs_information, events, \
-        bids_uri = template_configuration(dataset_list_unique_series, subs_information, config_file)
-
-else:
-    # README
-    readme = generate_readme(DATA_DIR, bids_compliant)
-
-    # dataset description information
-    dataset_description_dic = generate_dataset_description(DATA_DIR, bids_compliant)
-
-    # participantsColumn portion of ezBIDS_core.json
-    participants_column_info = generate_participants_columns(DATA_DIR, bids_compliant)
-
-    # Events timing file information
-    events = {
-        "columnKeys": None,
-        "columns": {
-            "onsetLogic": "eq",
-            "onset": None,
-            "onset2": None,
-            "onsetUnit": "sec",
-            "durationLogic": "eq",
-            "duration": None,
-            "duration2": None,
-            "durationUnit": "sec",
-            "sampleLogic": "eq",
-            "sample": None,
-            "sample2": None,
-            "sampleUnit": "samples",
-            "trialType": None,
-            "responseTimeLogic": "eq",
-            "responseTime": None,
-            "responseTime2": None,
-            "responseTimeUnit": "sec",
-            "values": None,
-            "HED": None,
-            "stim_file": None
-        },
-        "loaded": False,
-        "sampleValues": {},
-        "trialTypes": {
-            "desc": "Indicator of type of action that is expected",
-            "levels": {},
-            "longName": "Event category"
-        }
+    cog_atlas_url : string
+        web url of the Cognitive Atlas API task page.
+
+    Returns
+    -------
+    context : dictionary
+        bids_schema : BIDS schema information (see bids_schema.load_bids_schema)
+        cog_atlas_tasks : Cognitive Atlas task names (see find_cog_atlas_tasks)
+    """
+    return {
+        "bids_schema": load_bids_schema(schema_dir),
+        "cog_atlas_tasks": find_cog_atlas_tasks(cog_atlas_url)
     }
 
-    # BIDS URI
-    bids_uri = False
 
-# Generate lookup information directory to help with datatype and suffix identification (and to some degree, entities)
-lookup_dic = create_lookup_info()
+def analyze(session_dir, options=None, context=None):
+    """
+    Determines the BIDS information (subject/session mapping, datatype, suffix, entity labels)
+    of an uploaded session, as prepared by preprocess.sh, and writes it to the session's
+    ezBIDS_core.json (along with ezBIDS_core.metrics.json).
+
+    Nothing is shared between calls but the context, so one process can analyze many sessions
+    one after another. Paths in the `list` file (and in the output) are relative to session_dir,
+    and are resolved against it; the working directory isn't changed.
 
-# Identify datatype and suffix information
-dataset_list_unique_series = datatype_suffix_identification(dataset_list_unique_series, lookup_dic, config)
+    Parameters
+    ----------
+    session_dir : string
+        Root-level directory where uploaded data is stored and assessed.
 
-# Look for DWI b0maps, which are actually fmap/epi in BIDS parlance
-dataset_list_unique_series = check_dwi_b0maps(dataset_list_unique_series)
+    options : dictionary, optional
+        Overrides of ANALYZER_OPTIONS.
 
-# Identify entity label information
-dataset_list_unique_series = entity_labels_identification(dataset_list_unique_series, lookup_dic)
+    context : dictionary, optional
+        Preloaded session-independent information (see load_analyzer_context). Loaded if not provided.
 
-print("")
-print("--------------------------")
-print("ezBIDS sequence message")
-print("--------------------------")
-for index, unique_dic in enumerate(dataset_list_unique_series):
-    print(unique_dic["message"])
-    print("")
+    Returns
+    -------
+    EZBIDS : dictionary
+        The information written to ezBIDS_core.json.
+    """
+    options = dict(ANALYZER_OPTIONS, **(options or {}))
+
+    return analyze_session(os.path.abspath(session_dir), options, context, new_analysis_caches())
 
-dataset_list_unique_series = check_part_entity(dataset_list_unique_series, config)
 
-# If BIDS-compliant dataset uploaded, set and apply IntendedFor mapping
-dataset_list_unique_series = set_IntendedFor_B0FieldIdentifier_B0FieldSource(dataset_list_unique_series, bids_compliant)
+def analyze_session(DATA_DIR, options, context, caches):
+    """
+    The analyzer stages, run by analyze.
 
-# Port series level information to all other acquisitions (i.e. objects level) with same series info
-dataset_list = update_dataset_list(dataset_list, dataset_list_unique_series)
+    Parameters
+    ----------
+    DATA_DIR : string
+        Root-level directory where uploaded data is stored and assessed.
 
-# Apply a few other changes to the objects level
-objects_list = modify_objects_info(dataset_list)
+    options : dictionary
+        See ANALYZER_OPTIONS.
 
-# Map unique series IDs to all other acquisitions in dataset that have those parameters
-print("------------------")
-print("ezBIDS overview")
-print("------------------")
-for index, unique_dic in enumerate(dataset_list_unique_series):
-    print(
-        f"Unique data acquisition file {unique_dic['nifti_path']}, "
-        f"Series Description {unique_dic['SeriesDescription']}, "
-        f"was determined to be {unique_dic['type']}, "
-        f"with entity labels {[x for x in unique_dic['entities'].items() if x[-1] != '']}"
-    )
+    context : dictionary
+        See load_analyzer_context. Loaded if None.
+
+    caches : dictionary
+        This analysis' caches (see new_analysis_caches).
+
+    Returns
+    -------
+    EZBIDS : dictionary
+        The information written to ezBIDS_core.json.
+    """
+    start_time = time.perf_counter()
+
+    # Per-stage timing, memory and item counts of this run, written to ezBIDS_core.metrics.json
+    analyzer_metrics = new_metrics()
+
+    if context is None:
+        with measure_stage(analyzer_metrics, "load_analyzer_context") as counts:
+            context = load_analyzer_context()
+            counts["cog_atlas_tasks"] = len(context["cog_atlas_tasks"])
+    bids_schema = context["bids_schema"]
+
+    today_date = date.today().strftime("%Y-%m-%d")
+
+    if options["analyzer_cache"]:
+        cache_file = os.path.join(DATA_DIR, ANALYZER_CACHE_FILE)
+    else:
+        cache_file = None
+
+    print("########################################")
+    print("Beginning conversion process of uploaded dataset")
+    print("########################################")
     print("")
+
+    # Determine whether the uploaded data is a BIDS-compliant dataset (checked by preprocess.sh)
+    bids_compliant = read_bids_compliant_log(DATA_DIR)[1]
+
+    # Load list containing all uploaded files
+    with measure_stage(analyzer_metrics, "read_list_file") as counts:
+        uploaded_img_list = natsorted(read_list_file(os.path.join(DATA_DIR, "list")))
+        counts["files"] = len(uploaded_img_list)
+
+    # List the upload's directories once, for the stages below
+    with measure_stage(analyzer_metrics, "build_upload_index") as counts:
+        upload_index = build_upload_index(DATA_DIR)
+        counts["directories"] = len(upload_index["entries"])
+
+    # Remove dots in file names (that aren't extensions). This screws up the bids-validator otherwise
+    with measure_stage(analyzer_metrics, "fix_multiple_dots") as counts:
+        uploaded_img_list = fix_multiple_dots(DATA_DIR, uploaded_img_list, upload_index)
+        counts["files"] = len(uploaded_img_list)
+
+    # Generate MEG json files, if MEG data was provided
+    with measure_stage(analyzer_metrics, "generate_MEG_json_sidecars"):
+        generate_MEG_json_sidecars(DATA_DIR, uploaded_img_list, upload_index)
+
+    # Load NIfTI header information cached by previous analyzer runs of this session
+    with measure_stage(analyzer_metrics, "load_cached_nifti_headers") as counts:
+        load_cached_nifti_headers(cache_file, ANALYZER_VERSION, caches["nifti_headers"])
+        counts["cached_nifti_headers"] = len(caches["nifti_headers"])
+
+    # Filter uploaded files list for files that ezBIDS can't use and check for ezBIDS configuration file
+    with measure_stage(analyzer_metrics, "modify_uploaded_dataset_list") as counts:
+        uploaded_files_list, exclude_data, config, config_file = modify_uploaded_dataset_list(
+            DATA_DIR, uploaded_img_list, upload_index, caches["nifti_headers"], options["workers"],
+            options["start_method"]
+        )
+        counts["usable_files"] = len(uploaded_files_list)
+
+    # Create the dataset list of dictionaries
+    with measure_stage(analyzer_metrics, "generate_dataset_list") as counts:
+        dataset_list = generate_dataset_list(DATA_DIR, uploaded_files_list, exclude_data, config, today_date,
+                                             caches["nifti_headers"], options["workers"], cache_file, ANALYZER_VERSION,
+                                             upload_index, options["start_method"])
+        save_cached_nifti_headers(cache_file, ANALYZER_VERSION, caches["nifti_headers"])
+        counts["acquisitions"] = len(dataset_list)
+
+    # Get pesudo subject (and session) info
+    with measure_stage(analyzer_metrics, "organize_dataset") as counts:
+        dataset_list = organize_dataset(dataset_list)
+        counts["acquisitions"] = len(dataset_list)
+
+    # Determine subject (and session) information
+    with measure_stage(analyzer_metrics, "determine_sub_ses_IDs") as counts:
+        dataset_list, subs_information, participants_info = determine_sub_ses_IDs(
+            DATA_DIR, dataset_list, bids_compliant
+        )
+        counts["subjects"] = len(subs_information)
+
+    # Make a new list containing the dictionaries of only unique dataset acquisitions
+    with measure_stage(analyzer_metrics, "determine_unique_series") as counts:
+        dataset_list, dataset_list_unique_series = determine_unique_series(dataset_list, bids_compliant)
+        counts["unique_series"] = len(dataset_list_unique_series)
+
+    # If ezBIDS configuration file detected in upload, use that for datatype, suffix, and entity identifications
+    if config is True:
+        with measure_stage(analyzer_metrics, "template_configuration"):
+            readme, dataset_description_dic, participants_column_info, dataset_list_unique_series, subs_information, \
+                events, bids_uri = template_configuration(dataset_list_unique_series, subs_information, config_file)
+
+    else:
+        with measure_stage(analyzer_metrics, "generate_dataset_metadata"):
+            # README
+            readme = generate_readme(DATA_DIR, bids_compliant)
+
+            # dataset description information
+            dataset_description_dic = generate_dataset_description(DATA_DIR, bids_compliant, bids_schema)
+
+            # participantsColumn portion of ezBIDS_core.json
+            participants_column_info = generate_participants_columns(DATA_DIR, bids_compliant)
+
+        # Events timing file information
+        events = {
+            "columnKeys": None,
+            "columns": {
+                "onsetLogic": "eq",
+                "onset": None,
+                "onset2": None,
+                "onsetUnit": "sec",
+                "durationLogic": "eq",
+                "duration": None,
+                "duration2": None,
+                "durationUnit": "sec",
+                "sampleLogic": "eq",
+                "sample": None,
+                "sample2": None,
+                "sampleUnit": "samples",
+                "trialType": None,
+                "responseTimeLogic": "eq",
+                "responseTime": None,
+                "responseTime2": None,
+                "responseTimeUnit": "sec",
+                "values": None,
+                "HED": None,
+                "stim_file": None
+            },
+            "loaded": False,
+            "sampleValues": {},
+            "trialTypes": {
+                "desc": "Indicator of type of action that is expected",
+                "levels": {},
+                "longName": "Event category"
+            }
+        }
+
+        # BIDS URI
+        bids_uri = False
+
+    # Generate lookup information directory to help with datatype and suffix identification
+    # (and to some degree, entities)
+    with measure_stage(analyzer_metrics, "create_lookup_info"):
+        lookup_dic = create_lookup_info(bids_schema)
+
+    # Identify datatype and suffix information
+    with measure_stage(analyzer_metrics, "datatype_suffix_identification") as counts:
+        dataset_list_unique_series = datatype_suffix_identification(dataset_list_unique_series, lookup_dic, config,
+                                                                    bids_schema)
+        counts["unique_series"] = len(dataset_list_unique_series)
+
+    # Look for DWI b0maps, which are actually fmap/epi in BIDS parlance
+    with measure_stage(analyzer_metrics, "check_dwi_b0maps"):
+        dataset_list_unique_series = check_dwi_b0maps(dataset_list_unique_series)
+
+    # Identify entity label information
+    with measure_stage(analyzer_metrics, "entity_labels_identification"):
+        dataset_list_unique_series = entity_labels_identification(dataset_list_unique_series, lookup_dic, bids_schema,
+                                                                  context["cog_atlas_tasks"])
+
     print("")
+    print("--------------------------")
+    print("ezBIDS sequence message")
+    print("--------------------------")
+    for index, unique_dic in enumerate(dataset_list_unique_series):
+        print(unique_dic["message"])
+        print("")
+
+    with measure_stage(analyzer_metrics, "check_part_entity"):
+        dataset_list_unique_series = check_part_entity(dataset_list_unique_series, config)
+
+    # If BIDS-compliant dataset uploaded, set and apply IntendedFor mapping
+    with measure_stage(analyzer_metrics, "set_IntendedFor_B0FieldIdentifier_B0FieldSource"):
+        dataset_list_unique_series = set_IntendedFor_B0FieldIdentifier_B0FieldSource(
+            DATA_DIR, dataset_list_unique_series, bids_compliant, config
+        )
+
+    # Port series level information to all other acquisitions (i.e. objects level) with same series info
+    with measure_stage(analyzer_metrics, "update_dataset_list") as counts:
+        dataset_list = update_dataset_list(dataset_list, dataset_list_unique_series)
+        counts["acquisitions"] = len(dataset_list)
+
+    # Apply a few other changes to the objects level
+    with measure_stage(analyzer_metrics, "modify_objects_info") as counts:
+        load_cached_tsv_headers(cache_file, ANALYZER_VERSION, caches["tsv_headers"])
+        header_dumps = {}
+        objects_list = modify_objects_info(DATA_DIR, dataset_list, bids_schema, caches["tsv_headers"],
+                                           header_dumps)
+        save_cached_tsv_headers(cache_file, ANALYZER_VERSION, caches["tsv_headers"])
+        counts["objects"] = len(objects_list)
+        counts["headers"] = len(header_dumps)
+
+    # Map unique series IDs to all other acquisitions in dataset that have those parameters
+    print("------------------")
+    print("ezBIDS overview")
+    print("------------------")
+    for index, unique_dic in enumerate(dataset_list_unique_series):
+        print(
+            f"Unique data acquisition file {unique_dic['nifti_path']}, "
+            f"Series Description {unique_dic['SeriesDescription']}, "
+            f"was determined to be {unique_dic['type']}, "
+            f"with entity labels {[x for x in unique_dic['entities'].items() if x[-1] != '']}"
+        )
+        print("")
+        print("")
+
+    # Extract important series information to display in ezBIDS UI
+    with measure_stage(analyzer_metrics, "extract_series_info") as counts:
+        ui_series_info_list = extract_series_info(dataset_list_unique_series)
+        counts["series"] = len(ui_series_info_list)
+
+    # Convert information to dictionary
+    EZBIDS = {
+        "readme": readme,
+        "datasetDescription": dataset_description_dic,
+        "subjects": subs_information,
+        "participantsColumn": participants_column_info,
+        "participantsInfo": participants_info,
+        "series": ui_series_info_list,
+        "objects": objects_list,
+        "headers": header_dumps,
+        "events": events,
+        "BIDSURI": bids_uri
+    }
+
+    # Write dictionary to ezBIDS_core.json
+    with measure_stage(analyzer_metrics, "write_ezBIDS_core"):
+        write_ezBIDS_core(EZBIDS, DATA_DIR)
+
+    write_metrics(analyzer_metrics, DATA_DIR)
+
+    print(f"--- Analyzer completion time: {time.perf_counter() - start_time} seconds ---")
+
+    return EZBIDS
+
 
-# Extract important series information to display in ezBIDS UI
-ui_series_info_list = extract_series_info(dataset_list_unique_series)
-
-# Convert information to dictionary
-EZBIDS = {
-    "readme": readme,
-    "datasetDescription": dataset_description_dic,
-    "subjects": subs_information,
-    "participantsColumn": participants_column_info,
-    "participantsInfo": participants_info,
-    "series": ui_series_info_list,
-    "objects": objects_list,
-    "events": events,
-    "BIDSURI": bids_uri
-}
-
-# Write dictionary to ezBIDS_core.json
-with open("ezBIDS_core.json", "w") as fp:
-    json.dump(EZBIDS, fp, indent=3)
-
-print(f"--- Analyzer completion time: {time.perf_counter() - start_time} seconds ---")
+if __name__ == "__main__":
+    analyze(sys.argv[1])
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+"""
+Reads and writes the analyzer output (ezBIDS_core.json), as read by the handler (handler.ts) and the UI.
+
+The output is written compactly (no indentation or spaces after separators): it is parsed by the handler
+and downloaded by the UI, never read by hand, and pretty-printing made up a large part of its size.
+"""
+
+import os
+import json
+
+EZBIDS_CORE_JSON = "ezBIDS_core.json"
+
+
+def write_ezBIDS_core(ezBIDS, data_dir="."):
+    """
+    Writes the analyzer output to ezBIDS_core.json.
+
+    Parameters
+    ----------
+    ezBIDS : dictionary
+        Analyzer output.
+
+    data_dir : string
+        Session directory.
+    """
+    with open(os.path.join(data_dir, EZBIDS_CORE_JSON), "w") as fp:
+        json.dump(ezBIDS, fp, separators=(",", ":"))
+
+
+def read_ezBIDS_core(data_dir="."):
+    """
+    Reads the analyzer output.
+
+    Parameters
+    ----------
+    data_dir : string
+        Session directory.
+
+    Returns
+    -------
+    ezBIDS : dictionary
+        Analyzer output, as passed to write_ezBIDS_core.
+    """
+    with open(os.path.join(data_dir, EZBIDS_CORE_JSON)) as fp:
+        return json.load(fp, strict=False)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+"""
+Loads ezBIDS configuration templates (*ezBIDS_template.json, the finalized information of a previous upload)
+and indexes them, so that template_configuration can look up the template series matching each uploaded
+series, and the sidecar of a template series, without scanning the whole template for each series.
+
+The same template is typically uploaded again with every new batch of data, so parsed (and indexed)
+templates are kept in memory, keyed by a hash of their contents, and reused by later analyses in the same
+process (e.g. the analyzer service). Templates are shared between analyses: callers must copy what they
+modify or hand out.
+"""
+
+import json
+import hashlib
+from collections import OrderedDict
+
+# Number of parsed templates kept in memory
+TEMPLATE_CACHE_SIZE = 8
+
+template_cache = OrderedDict()
+
+
+def template_series_key(series):
+    """
+    Key a template series is matched on: SeriesDescription, ImageType, and EchoTime and RepetitionTime
+    rounded to 1 decimal.
+
+    Parameters
+    ----------
+    series : dictionary
+        Uploaded or template series information.
+
+    Returns
+    -------
+    key : tuple
+        Raises KeyError or TypeError if the fields are missing or can't be rounded/hashed.
+    """
+    image_type = series["ImageType"]
+    if isinstance(image_type, list):
+        image_type = tuple(image_type)
+
+    key = (
+        series["SeriesDescription"],
+        image_type,
+        round(series["EchoTime"], 1),
+        round(series["RepetitionTime"], 1)
+    )
+    hash(key)
+
+    return key
+
+
+def series_matches(template_series, series):
+    """
+    Whether a template series matches an uploaded series (as in template_series_key, field by field).
+    """
+    return (
+        template_series["SeriesDescription"] == series["SeriesDescription"]
+        and template_series["ImageType"] == series["ImageType"]
+        and round(template_series["EchoTime"], 1) == round(series["EchoTime"], 1)
+        and round(template_series["RepetitionTime"], 1) == round(series["RepetitionTime"], 1)
+    )
+
+
+def index_template(config_data):
+    """
+    Builds the lookup indices of a parsed template.
+
+    Parameters
+    ----------
+    config_data : dictionary
+        Parsed ezBIDS_template.json.
+
+    Returns
+    -------
+    template : dictionary
+        "config": config_data
+        "series_index": template_series_key -> positions of the matching config_data["series"] entries
+        "unkeyed_series": positions of the series whose key can't be computed (matched field by field)
+        "series_objects": series_idx -> position of the first object with that series_idx
+    """
+    series_index = {}
+    unkeyed_series = []
+    for position, series in enumerate(config_data["series"]):
+        try:
+            series_index.setdefault(template_series_key(series), []).append(position)
+        except (KeyError, TypeError):
+            unkeyed_series.append(position)
+
+    series_objects = {}
+    for position, obj in enumerate(config_data["objects"]):
+        if "series_idx" in obj:
+            series_objects.setdefault(obj["series_idx"], position)
+
+    return {
+        "config": config_data,
+        "series_index": series_index,
+        "unkeyed_series": unkeyed_series,
+        "series_objects": series_objects
+    }
+
+
+def load_template(config_file):
+    """
+    Loads and indexes an ezBIDS configuration template, or returns it from the in-memory cache if a
+    template with the same contents was loaded before.
+
+    Parameters
+    ----------
+    config_file : string
+        Path to the ezBIDS_template.json file.
+
+    Returns
+    -------
+    template : dictionary
+        See index_template. Shared with other analyses: don't modify it.
+    """
+    with open(config_file, "rb") as f:
+        content = f.read()
+    content_hash = hashlib.sha256(content).hexdigest()
+
+    template = template_cache.get(content_hash)
+    if template is None:
+        template = index_template(json.loads(content, strict=False))
+        template_cache[content_hash] = template
+        if len(template_cache) > TEMPLATE_CACHE_SIZE:
+            template_cache.popitem(last=False)
+    else:
+        template_cache.move_to_end(content_hash)
+
+    return template
+
+
+def find_template_series(template, series):
+    """
+    Finds the first template series matching an uploaded series.
+
+    Parameters
+    ----------
+    template : dictionary
+        Template loaded by load_template.
+
+    series : dictionary
+        Uploaded series information (SeriesDescription, ImageType, EchoTime, RepetitionTime).
+
+    Returns
+    -------
+    position : int
+        Position of the template series in template["config"]["series"], or None if none matches.
+    """
+    config_series = template["config"]["series"]
+
+    try:
+        key = template_series_key(series)
+    except (KeyError, TypeError):
+        # Compare field by field, as the index can't be used
+        return next((index for index, x in enumerate(config_series) if series_matches(x, series)), None)
+
+    candidates = template["series_index"].get(key, [])[:1]
+    candidates += [x for x in template["unkeyed_series"] if series_matches(config_series[x], series)]
+
+    return min(candidates) if len(candidates) else None
+
+
+def find_template_sidecar(template, series_idx):
+    """
+    Sidecar of the first template object of a template series, or None if the template has no object
+    of that series.
+    """
+    position = template["series_objects"].get(series_idx)
+    if position is None:
+        return None
+
+    return [x["sidecar"] for x in template["config"]["objects"][position]["items"] if x["name"] == "json"][0]
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+"""
+Formats the NIfTI header dumps displayed in the ezBIDS UI ("Nifti Headers").
+
+Formatting a header with nibabel is slow, and acquisitions of the same series mostly share the same
+header, so the analyzer keeps the raw header bytes and formats each distinct header (keyed by a hash of
+its bytes) only once. ezBIDS_core.json stores each formatted header once, in its top-level "headers" table,
+and NIfTI items reference it by key ("headersKey").
+"""
+
+import hashlib
+import nibabel as nib
+
+
+def header_key(header_block):
+    """
+    Key of a NIfTI header, by content.
+
+    Parameters
+    ----------
+    header_block : bytes
+        Raw header bytes (header.binaryblock).
+
+    Returns
+    -------
+    key : string
+        Hex digest of the header bytes.
+    """
+    return hashlib.sha256(header_block).hexdigest()
+
+
+def format_header(header_block):
+    """
+    Formats a NIfTI header the way the ezBIDS UI displays it.
+
+    Parameters
+    ----------
+    header_block : bytes
+        Raw NIfTI-1 or NIfTI-2 header bytes.
+
+    Returns
+    -------
+    lines : list
+        Lines of nibabel's header dump, without its leading class line.
+    """
+    if len(header_block) == nib.Nifti2Header.template_dtype.itemsize:
+        header = nib.Nifti2Header(header_block)
+    else:
+        header = nib.Nifti1Header(header_block)
+
+    return str(header).splitlines()[1:]
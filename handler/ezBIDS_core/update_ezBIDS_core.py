@@ -10,45 +10,44 @@ update ezBIDS_core.json with pngPaths
 
 import os
 import sys
-import json
-import pandas as pd
 from pathlib import Path
 from natsort import natsorted
+from ezbids_json import read_ezBIDS_core, write_ezBIDS_core
+from upload_index import new_upload_index, upload_dir_entries, upload_path_exists
 
 # Begin:
 DATA_DIR = sys.argv[1]
 os.chdir(DATA_DIR)
 
-try:
-    img_list = natsorted(pd.read_csv("list", header=None, lineterminator="\n").to_numpy().flatten().tolist())
-except:
-    # Need for [rare] instances where a comma (or other escape character) is in the file path
-    img_list = natsorted(pd.read_csv("list", sep=' ', header=None, lineterminator='\n').to_numpy().flatten().tolist())
+with open("list") as list_file:
+    img_list = natsorted([x for x in list_file.read().split("\n") if x.strip()])
 
 MEG_extensions = [".ds", ".fif", ".sqd", ".con", ".raw", ".ave", ".mrk", ".kdf", ".mhd", ".trg", ".chn", ".dat"]
 
 # place paths to image thumbnails in ezBIDS_core.json
-with open("ezBIDS_core.json", "r") as ezBIDS_json:
-    ezBIDS = json.load(ezBIDS_json)
+ezBIDS = read_ezBIDS_core()
 
+# Items by path, and the image directories (listed once each, after the thumbnails were created)
+path_items = {}
+for obj in ezBIDS["objects"]:
+    for item in obj["items"]:
+        path_items.setdefault(item["path"], []).append(item)
+upload_index = new_upload_index()
 
 for img_file in img_list:
-    if os.path.isfile(f"{DATA_DIR}/{img_file}") or os.path.isdir(f"{DATA_DIR}/{img_file}"):
-        for obj in ezBIDS["objects"]:
-            for item in obj["items"]:
-                path = item["path"]
-                if path == img_file:
-                    files = [
-                        os.path.join(os.path.dirname(img_file), x) for x in os.listdir(os.path.dirname(img_file))
-                    ]
-
-                    if img_file.endswith('.nii.gz'):
-                        ext = ".nii.gz"
-                    else:
-                        ext = Path(img_file).suffix
-
-                    png_files = natsorted([x for x in files if img_file.split(ext)[0] + ".png" == x])
-                    item["pngPaths"] = png_files
-
-with open("ezBIDS_core.json", "w") as ezBIDS_json:
-    json.dump(ezBIDS, ezBIDS_json, indent=3)
+    if img_file in path_items and upload_path_exists(upload_index, img_file):
+        if img_file.endswith('.nii.gz'):
+            ext = ".nii.gz"
+        else:
+            ext = Path(img_file).suffix
+
+        png_file = img_file.split(ext)[0] + ".png"
+        if os.path.basename(png_file) in upload_dir_entries(upload_index, os.path.dirname(img_file)):
+            png_files = [png_file]
+        else:
+            png_files = []
+
+        for item in path_items[img_file]:
+            item["pngPaths"] = list(png_files)
+
+write_ezBIDS_core(ezBIDS)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+"""
+Index of the files of an upload (session directory), built from a single os.scandir traversal, so that the
+analyzer stages can look up directory entries, companion files, and ezBIDS templates without listing the
+same directories again and again.
+
+Paths are relative to the session directory (the index root), in the form used by the `list` file (e.g.
+"./upload/x.nii.gz"), so the index doesn't depend on the working directory. Stages that create or rename files
+update it (add_upload_file, rename_upload_file). Directories that weren't indexed (or an index from
+new_upload_index) are listed on first lookup.
+
+Layout of the index (a dictionary):
+    root: the session directory
+    entries: directory -> {name: is_dir}, in listing order
+    templates: *ezBIDS_template.json files, in os.walk order
+    stems: directory -> (sorted reversed name prefixes, their names, listing rank of each name), built on
+        first find_stem_files lookup
+"""
+
+import os
+from bisect import bisect_left
+
+TEMPLATE_SUFFIX = "ezBIDS_template.json"
+
+
+def new_upload_index(data_dir="."):
+    """
+    An empty upload index of data_dir, whose directories are listed on first lookup.
+    """
+    return {"root": data_dir, "entries": {}, "templates": [], "stems": {}}
+
+
+def build_upload_index(data_dir="."):
+    """
+    Indexes all the files under data_dir, listing each directory once (top-down, as os.walk does,
+    and without following symbolic links to directories).
+
+    Parameters
+    ----------
+    data_dir : string
+        Session directory.
+
+    Returns
+    -------
+    upload_index : dictionary
+        See the module docstring.
+    """
+    upload_index = new_upload_index(data_dir)
+
+    stack = ["."]
+    while len(stack):
+        dir_path = stack.pop()
+        entries = {}
+        sub_dirs = []
+        try:
+            with os.scandir(os.path.join(data_dir, dir_path)) as scan:
+                for entry in scan:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    entries[entry.name] = is_dir
+
+                    if is_dir and not entry.is_symlink():
+                        sub_dirs.append(os.path.join(dir_path, entry.name))
+                    elif not is_dir and entry.name.endswith(TEMPLATE_SUFFIX):
+                        upload_index["templates"].append(os.path.join(dir_path, entry.name))
+        except OSError:
+            continue
+
+        upload_index["entries"][dir_path] = entries
+        stack += reversed(sub_dirs)
+
+    return upload_index
+
+
+def upload_dir_entries(upload_index, dir_path):
+    """
+    Entries of a directory.
+
+    Parameters
+    ----------
+    upload_index : dictionary
+        Index generated by build_upload_index or new_upload_index.
+
+    dir_path : string
+        Directory path (e.g. os.path.dirname of a `list` path).
+
+    Returns
+    -------
+    entries : dictionary
+        Entry name -> whether it is a directory, in listing order (empty if dir_path doesn't exist).
+    """
+    entries = upload_index["entries"].get(dir_path)
+    if entries is None:
+        entries = {}
+        try:
+            with os.scandir(os.path.join(upload_index["root"], dir_path)) as scan:
+                for entry in scan:
+                    try:
+                        entries[entry.name] = entry.is_dir()
+                    except OSError:
+                        entries[entry.name] = False
+        except OSError:
+            pass
+        upload_index["entries"][dir_path] = entries
+
+    return entries
+
+
+def upload_path_exists(upload_index, path):
+    """
+    Whether a file or directory exists, according to the index.
+    """
+    return os.path.basename(path) in upload_dir_entries(upload_index, os.path.dirname(path))
+
+
+def add_upload_file(upload_index, path):
+    """
+    Adds a file created after the index was built.
+    """
+    dir_path = os.path.dirname(path)
+    upload_dir_entries(upload_index, dir_path)[os.path.basename(path)] = False
+    upload_index["stems"].pop(dir_path, None)
+
+
+def rename_upload_file(upload_index, old_path, new_path):
+    """
+    Updates the index after renaming a file or directory.
+    """
+    old_dir = os.path.dirname(old_path)
+    new_dir = os.path.dirname(new_path)
+
+    is_dir = upload_dir_entries(upload_index, old_dir).pop(os.path.basename(old_path), False)
+    upload_dir_entries(upload_index, new_dir)[os.path.basename(new_path)] = is_dir
+    upload_index["stems"].pop(old_dir, None)
+    upload_index["stems"].pop(new_dir, None)
+
+    def renamed(path):
+        if path == old_path or path.startswith(old_path + "/"):
+            return new_path + path[len(old_path):]
+        return path
+
+    if is_dir:
+        upload_index["entries"] = {renamed(x): entries for x, entries in upload_index["entries"].items()}
+        upload_index["stems"] = {renamed(x): stems for x, stems in upload_index["stems"].items()}
+    upload_index["templates"] = [renamed(x) for x in upload_index["templates"]]
+
+
+def find_stem_files(upload_index, dir_path, stem):
+    """
+    Finds the entries of a directory whose names contain stem followed by a period (e.g. the JSON sidecar
+    and bval/bvec files of an image), as the substring test `stem + "." in name` would.
+
+    The names are indexed (per directory, on first lookup) by their prefixes up to each period, reversed and
+    sorted, so that the prefixes ending with stem form a contiguous range.
+
+    Parameters
+    ----------
+    upload_index : dictionary
+        Index generated by build_upload_index or new_upload_index.
+
+    dir_path : string
+        Directory path.
+
+    stem : string
+        File name stem (file name without its extension).
+
+    Returns
+    -------
+    names : list
+        Matching entry names, in listing order.
+    """
+    entries = upload_dir_entries(upload_index, dir_path)
+
+    stems = upload_index["stems"].get(dir_path)
+    if stems is None:
+        prefixes = sorted(
+            (name[:index][::-1], name)
+            for name in entries
+            for index, character in enumerate(name) if character == "."
+        )
+        rank = {name: position for position, name in enumerate(entries)}
+        stems = ([x[0] for x in prefixes], [x[1] for x in prefixes], rank)
+        upload_index["stems"][dir_path] = stems
+
+    reversed_prefixes, names, rank = stems
+    reversed_stem = stem[::-1]
+    matches = set()
+    for index in range(bisect_left(reversed_prefixes, reversed_stem), len(reversed_prefixes)):
+        if not reversed_prefixes[index].startswith(reversed_stem):
+            break
+        matches.add(names[index])
+
+    return sorted(matches, key=rank.get)
@@ -68,6 +68,8 @@ echo "*pet2bids*" >> $test_root/.bidsignore
 echo "*list" >> $test_root/.bidsignore
 echo "*nii_files" >> $test_root/.bidsignore
 echo "*ezBIDS_core.json" >> $test_root/.bidsignore
+echo "*ezBIDS_core.cache.sqlite" >> $test_root/.bidsignore
+echo "*ezBIDS_core.metrics.json" >> $test_root/.bidsignore
 echo "*bids_compliant.log" >> $test_root/.bidsignore
 echo "*validator.log" >> $test_root/.bidsignore
 echo "*.png" >> $test_root/.bidsignore
@@ -101,7 +103,7 @@ if [ $bids_compliant == "true" ]; then
     (cd $root && find . -maxdepth 9 -type f \( -name "*blood.json" \) >> $root/list)
 
     echo "running ezBIDS_core (may take several minutes, depending on size of data)"
-    python3 "./ezBIDS_core/ezBIDS_core.py" $root
+    python3 "./ezBIDS_core/analyzer_service.py" analyze $root
 else
 
     # If there are .nii files, compress them to .nii.gz
@@ -264,10 +266,10 @@ else
     (cd $root && find . -type f -name "*.nii" -exec rm {} \;)
 
     echo "running ezBIDS_core (may take several minutes, depending on size of data)"
-    python3 "./ezBIDS_core/ezBIDS_core.py" $root
+    python3 "./ezBIDS_core/analyzer_service.py" analyze $root
 
     echo "generating thumbnails for image sequences"
-    cat $root/list | parallel --linebuffer -j 6 --progress python3 "./ezBIDS_core/createThumbnailsMovies.py" $root
+    python3 "./ezBIDS_core/analyzer_service.py" thumbnails $root
 
     echo "updating ezBIDS_core.json"
     python3 "./ezBIDS_core/update_ezBIDS_core.py" $root
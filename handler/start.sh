@@ -4,6 +4,12 @@
 pm2 delete ezbids-handler
 pm2 start handler.js --name ezbids-handler --watch --ignore-watch="*.log test *.sh ui bin example .git .syncthing*"
 
+# long-lived analyzer (preprocess.sh runs the analyzer itself when this isn't running, or runs other code),
+# restarted when the analyzer code changes
+pm2 delete ezbids-analyzer
+pm2 start ./ezBIDS_core/analyzer_service.py --name ezbids-analyzer --interpreter python3 \
+    --watch ./ezBIDS_core --ignore-watch="__pycache__ *.pyc *.tmp" -- serve
+
 pm2 delete ezbids-handler-tsc
 pm2 start tsc.sh --name ezbids-handler-tsc
 
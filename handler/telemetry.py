@@ -12,6 +12,9 @@ import os
 import sys
 import json
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ezBIDS_core"))
+from ezbids_json import read_ezBIDS_core  # noqa: E402
+
 # Begin
 telemetry_url = "http://52.87.154.236/telemetry/"
 DATA_DIR = sys.argv[1]
@@ -33,8 +36,11 @@ def gather_telemetry(dtype):
             finalize dataset. Please contact support for assistance'
 
     if os.path.isfile(json_path):
-        json_data = open(json_path)
-        json_data = json.load(json_data, strict=False)
+        if dtype == 'core':
+            json_data = read_ezBIDS_core(DATA_DIR)
+        else:
+            json_data = open(json_path)
+            json_data = json.load(json_data, strict=False)
 
         for obj in json_data['objects']:
 
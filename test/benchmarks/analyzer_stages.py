@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark the ezBIDS_core.py stages on synthetic uploads (see synthetic_dataset.py) of increasing size,
+using the per-stage metrics the analyzer writes to ezBIDS_core.metrics.json, and report how each stage
+scales with the number of NIfTI files.
+
+usage: ./analyzer_stages.py [--sizes 100,1000,10000] [--repeat 1] [--budget analyzer_stages_budget.json]
+                            [--write-budget] [--output results.json] [--handler-dir ../../handler]
+
+The "scaling" column is the exponent k of time ~ files^k between the smallest and largest size
+(1 is linear). With --budget, exits with an error if a stage takes more than max_regression_percent
+longer than its budgeted time at any benchmarked size (ignoring differences under min_seconds);
+--write-budget (re)writes the budget file from this run's times instead. Budgeted times are scaled by
+how long a fixed calibration workload takes on this machine, relative to the machine that wrote the
+budget, so that a budget written on one machine can be checked on another.
+
+ezBIDS_core.py needs the BIDS schema (bids-specification/src/schema next to handler/), as in the
+ezBIDS container. The analyzer cache is disabled, so each run measures a first analysis.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+
+from synthetic_dataset import files_per_session, make_dataset
+
+HANDLER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../handler")
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analyzer_stages_budget.json")
+
+# Defaults of a new budget file
+MAX_REGRESSION_PERCENT = 25
+MIN_SECONDS = 0.05
+
+
+def calibration_seconds(repeat=5):
+    """
+    Best-of-repeat time of a fixed workload like the analyzer's (JSON sidecars, hashing, sorting), used
+    to compare the speed of the machine running the benchmark with the one that wrote the budget.
+    """
+    sidecars = [
+        {"SeriesDescription": f"series_{x % 97}", "SeriesNumber": x, "EchoTime": x / 1000,
+         "ImageType": ["ORIGINAL", "PRIMARY", "M"], "AcquisitionTime": f"{x % 24:02d}:00:00.000000"}
+        for x in range(2000)
+    ]
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(10):
+            text = json.dumps(sidecars)
+            hashlib.sha256(text.encode()).hexdigest()
+            sorted(json.loads(text), key=lambda x: (x["SeriesDescription"], x["AcquisitionTime"]))
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+
+    return best
+
+
+def run_analyzer(handler_dir, data_dir):
+    """
+    Runs ezBIDS_core.py on a session directory.
+
+    Returns
+    -------
+    stage_times : dictionary
+        Stage name -> wall time (seconds), from ezBIDS_core.metrics.json.
+    """
+    env = dict(os.environ, EZBIDS_ANALYZER_CACHE="0")
+    result = subprocess.run(
+        [sys.executable, "./ezBIDS_core/ezBIDS_core.py", data_dir],
+        cwd=handler_dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"ezBIDS_core.py failed on {data_dir}:\n{result.stdout[-3000:]}")
+
+    with open(os.path.join(data_dir, "ezBIDS_core.metrics.json")) as f:
+        metrics = json.load(f)
+
+    stage_times = {stage["name"]: stage["wall_time"] for stage in metrics["stages"]}
+    stage_times["total"] = metrics["wall_time"]
+
+    return stage_times
+
+
+def benchmark_size(args, size):
+    """
+    Best-of-repeat stage times on a synthetic upload with (at least) size NIfTI files.
+    """
+    per_subject = args.sessions * files_per_session(args.series, args.multi_echo, True, True)
+    subjects = -(-size // per_subject)
+
+    best_times = {}
+    for _ in range(args.repeat):
+        # The analyzer modifies the upload (renames, sidecars), so each repeat gets a fresh copy
+        data_dir = tempfile.mkdtemp(prefix=f"ezbids_benchmark_{size}_")
+        try:
+            make_dataset(data_dir, subjects, args.sessions, args.series, args.multi_echo)
+            stage_times = run_analyzer(args.handler_dir, data_dir)
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+        for stage, seconds in stage_times.items():
+            best_times[stage] = min(seconds, best_times.get(stage, seconds))
+
+    return best_times
+
+
+def scaling_exponent(sizes, times):
+    """
+    Exponent k of time ~ size^k between the smallest and largest size, or None if too fast to tell.
+    """
+    if len(sizes) < 2 or min(times[0], times[-1]) < 0.001:
+        return None
+
+    return math.log(times[-1] / times[0]) / math.log(sizes[-1] / sizes[0])
+
+
+def check_budget(budget, results, speed_ratio=1):
+    """
+    Compares stage times against a budget.
+
+    Parameters
+    ----------
+    budget : dictionary
+        Parsed budget file.
+
+    results : dictionary
+        Size -> stage times of this run.
+
+    speed_ratio : float
+        Calibration time of this machine divided by that of the machine that wrote the budget
+        (budgeted times are multiplied by it).
+
+    Returns
+    -------
+    regressions : list
+        Descriptions of the stages over budget.
+    """
+    max_ratio = 1 + budget["max_regression_percent"] / 100
+    regressions = []
+    for size, stage_times in results.items():
+        for stage, budgeted in budget["stages"].get(str(size), {}).items():
+            seconds = stage_times.get(stage)
+            if seconds is None:
+                continue
+            budgeted *= speed_ratio
+            if seconds > budgeted * max_ratio and seconds - budgeted > budget["min_seconds"]:
+                regressions.append(
+                    f"{stage} at {size} files: {seconds:.3f}s vs {budgeted:.3f}s budget "
+                    f"(+{100 * (seconds / budgeted - 1):.0f}%)"
+                )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--sessions", type=int, default=2)
+    parser.add_argument("--series", type=int, default=4)
+    parser.add_argument("--multi-echo", action="store_true")
+    parser.add_argument("--handler-dir", default=HANDLER_DIR)
+    parser.add_argument("--budget", nargs="?", const=BUDGET_FILE)
+    parser.add_argument("--write-budget", action="store_true")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    args.handler_dir = os.path.abspath(args.handler_dir)
+
+    sizes = sorted(int(x) for x in args.sizes.split(","))
+    calibration = calibration_seconds() if args.budget or args.write_budget else None
+    results = {}
+    for size in sizes:
+        print(f"Benchmarking {size} files...", flush=True)
+        results[size] = benchmark_size(args, size)
+
+    stages = list(results[sizes[0]])
+    print("")
+    print(f"{'stage':<50}" + "".join(f"{size:>10}" for size in sizes) + f"{'scaling':>9}")
+    for stage in stages:
+        times = [results[size].get(stage, 0) for size in sizes]
+        exponent = scaling_exponent(sizes, times)
+        print(f"{stage:<50}" + "".join(f"{x:>10.3f}" for x in times) +
+              (f"{exponent:>9.2f}" if exponent is not None else f"{'-':>9}"))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"sizes": sizes, "stages": {str(size): results[size] for size in sizes}}, f, indent=3)
+
+    budget_file = args.budget or BUDGET_FILE
+    if args.write_budget:
+        budget = {
+            "max_regression_percent": MAX_REGRESSION_PERCENT,
+            "min_seconds": MIN_SECONDS,
+            "stages": {}
+        }
+        if os.path.isfile(budget_file):
+            with open(budget_file) as f:
+                budget = json.load(f)
+        budget["calibration_seconds"] = round(calibration, 6)
+        budget["stages"].update({str(size): results[size] for size in sizes})
+        with open(budget_file, "w") as f:
+            json.dump(budget, f, indent=3)
+        print(f"Wrote budget to {budget_file}")
+
+    elif args.budget:
+        with open(budget_file) as f:
+            budget = json.load(f)
+        speed_ratio = calibration / budget.get("calibration_seconds", calibration)
+        print(f"Budget scaled by {speed_ratio:.2f} (calibration: {calibration:.3f}s)")
+        regressions = check_budget(budget, results, speed_ratio)
+        if len(regressions):
+            sys.exit("Stages over budget:\n" + "\n".join(regressions))
+        print(f"All stages within {budget['max_regression_percent']}% of {budget_file}")
+
+
+if __name__ == "__main__":
+    main()
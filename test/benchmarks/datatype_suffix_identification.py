@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark datatype_suffix_identification (compiled lookup_dic rules, single search term matcher) against
+the previous eval()-based implementation on a corpus of SeriesDescription/sidecar fixtures, and check that
+both produce exactly the same datatype, suffix, type, message, and error for every series.
+
+usage: ./datatype_suffix_identification.py [--sizes 100,1000,5000] [--schema <bids-specification/src/schema>]
+
+The fixtures are combinations of common scanner protocol names with sidecar/ImageType/dimension variants,
+so that search terms match with both passing and failing conditions.
+"""
+
+import os
+import re
+import sys
+import copy
+import time
+import random
+import argparse
+import contextlib
+
+EZBIDS_CORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../handler/ezBIDS_core")
+BIDS_SCHEMA_DIR = os.path.join(EZBIDS_CORE_DIR, "../../bids-specification/src/schema")
+
+SERIES_DESCRIPTIONS = [
+    "AAHead_Scout_32ch-head-coil", "localizer_3plane", "T1w_MPRAGE", "anat-T1w_acq-mprage", "t1_mprage_sag_p2_iso",
+    "MPRAGE_GRAPPA2_NORM", "T1w_MPRAGE_RMS", "T2w_SPC_800um", "t2_space_da-fl_sag_p2_iso", "anat_T2", "3D_T2_FLAIR",
+    "qsm_3D_multiecho", "mp2rage_INV1", "mp2rage_INV2", "mp2rage_UNI_Images", "UNI_mp2rage", "PD_T2_FSE",
+    "MTS_FlipAngle", "rfMRI_REST_AP", "rfMRI_REST_PA_SBRef", "tfMRI_GAMBLING_AP", "func_task-rest_bold",
+    "BOLD_resting_state", "fMRI_task-nback_run-1", "dMRI_dir98_AP", "dMRI_dir98_AP_SBRef", "DTI_30dir", "dwi_b1000",
+    "DTI_30dir_TRACEW", "DTI_30dir_FA", "DTI_30dir_ADC", "dwi_b0", "SpinEchoFieldMap_AP", "SpinEchoFieldMap_PA",
+    "fmap_se_AP", "gre_field_mapping", "GRE_FieldMap", "fieldmap_pa", "tfl_b1map", "rfmap", "TOPUP_PA",
+    "Pepolar_reverse", "pcasl_M0", "MEG_rest_fif", "emptyroom", "PET_FDG", "unknown_sequence", "B0map_dwi"
+]
+
+IMAGE_TYPES = [
+    ["ORIGINAL", "PRIMARY", "M", "ND"], ["ORIGINAL", "PRIMARY", "M", "ND", "NORM"], ["ORIGINAL", "PRIMARY", "P"],
+    ["DERIVED", "PRIMARY", "DIFFUSION", "TRACEW"], ["ORIGINAL", "PRIMARY", "DIFFUSION", "NONE"],
+    ["DERIVED", "PRIMARY", "M", "UNI"], ["ORIGINAL", "PRIMARY", "M", "MEAN"]
+]
+
+
+def datatype_suffix_identification_old(dataset_list_unique_series, lookup_dic, config):
+    """
+    datatype_suffix_identification prior to the compiled rule engine (eval() per condition), kept as a reference.
+    """
+    print("")
+    print("Datatype & suffix identification")
+    print("------------------------------------")
+    """
+    Schema datatype and suffix labels are helpful, but typically
+    researchers label their imaging protocols in less standardized ways.
+    ezBIDS will attempt to determine datatype and suffix labels based on
+    common keys/labels.
+    """
+    for index, unique_dic in enumerate(dataset_list_unique_series):
+        # Not ideal using json_path because it's only the first sequence in the series_idx group...
+        json_path = unique_dic["json_path"]
+
+        if unique_dic["type"] == "exclude" and unique_dic["finalized_match"] is False:
+            unique_dic["error"] = "Uploaded imaging data file contains an improper format " \
+                "which cannot be read by ezBIDS. Cannot convert file."
+            unique_dic["message"] = unique_dic["error"]
+        elif unique_dic["finalized_match"] is False:
+            # Try checking the json paths themselves for explicit information regarding datatype and suffix
+            for datatype in bids_datatypes:
+                if f"/{datatype}/" in json_path:
+                    unique_dic["datatype"] = datatype
+
+                suffixes = bids_schema["datatype_suffixes"][datatype]
+
+                short_suffixes = [x for x in suffixes if len(x) < 3]
+
+                unhelpful_suffixes = [
+                    "fieldmap",
+                    "beh",
+                    "epi",
+                    "magnitude",
+                    "magnitude1",
+                    "magnitude2",
+                    "phasediff"
+                ]
+
+                bad_suffixes = short_suffixes + unhelpful_suffixes
+
+                # Remove deprecated suffixes
+                deprecated_suffixes = ["T2star", "FLASH", "PD", "phase"]
+                suffixes = [x for x in suffixes if x not in deprecated_suffixes]
+
+                for suffix in suffixes:
+                    if f"_{suffix}.json" in json_path:
+                        unique_dic["suffix"] = suffix
+
+                for bad_suffix in bad_suffixes:
+                    if f"_{bad_suffix}.json" in json_path:
+                        if bad_suffix == "fieldmap":
+                            unique_dic["datatype"] = "fmap"
+                        elif bad_suffix == "beh":
+                            unique_dic["datatype"] = "beh"
+                        elif bad_suffix == "epi":
+                            unique_dic["datatype"] = "fmap"
+                        elif bad_suffix == "magnitude":
+                            unique_dic["datatype"] = "fmap"
+                        elif bad_suffix == "magnitude1":
+                            unique_dic["datatype"] = "fmap"
+                        elif bad_suffix == "magnitude2":
+                            unique_dic["datatype"] = "fmap"
+                        elif bad_suffix == "phasediff":
+                            unique_dic["datatype"] = "fmap"
+                        elif bad_suffix == "PC":
+                            unique_dic["datatype"] = "micr"
+                        elif bad_suffix == "DF":
+                            unique_dic["datatype"] = "micr"
+
+                        unique_dic["suffix"] = bad_suffix
+
+                # Correct BIDS deprecation issue, func/phase no long exists, now func/bold part-phase
+                if unique_dic["datatype"] == "func" and unique_dic["suffix"] == "phase":
+                    unique_dic["suffix"] = "bold"
+
+                if unique_dic["datatype"] != "" and unique_dic["suffix"] != "":
+                    unique_dic["message"] = "Acquisition is believed to be " \
+                        f"{unique_dic['datatype']}/{unique_dic['suffix']} " \
+                        f"because '{unique_dic['suffix']}' is in the file path. " \
+                        f"Please modify if incorrect."
+
+        if json_path.endswith("blood.json"):
+            # Set datatype and suffix values for pet/blood if we know it exists
+            unique_dic["datatype"] = "pet"
+            unique_dic["suffix"] = "blood"
+            unique_dic["type"] = "pet/blood"
+            unique_dic["message"] = "Acquisition is believed to be pet/blood " \
+                "because the file path ends with '_blood.json. " \
+                "Please modify if incorrect."
+
+        """
+        If no luck with the json paths, and assuming an ezBIDS configuration file wasn't provided, try discerning
+        datatype and suffix with dcm2niix's BidsGuess. And if that doesn't produce anything, try with search terms
+        in SeriesDescription (or ProtocolName) and rules.
+        """
+        if (unique_dic["finalized_match"] is False
+                and (unique_dic["datatype"] == "" or unique_dic["suffix"] == "") and unique_dic["type"] == ""):
+
+            json_data = unique_dic["sidecar"]
+
+            # Try discerning datatype and suffix with dcm2niix's BidsGuess
+            if "BidsGuess" in json_data:
+                bids_guess = json_data["BidsGuess"]
+                if len(bids_guess) == 2:  # should always be length of 2, but just to be safe
+                    datatype = str(bids_guess[0]).lower()  # in case BidsGuess doesn't make datatype lowercase
+                    suffix = bids_guess[1].split("_")[-1]
+                    # in case BidsGuess not use proper suffix case format (e.g PET)
+                    for bids_ref_suffix in bids_suffixes:
+                        if bids_ref_suffix != suffix and bids_ref_suffix.lower() == suffix.lower():
+                            suffix = bids_ref_suffix
+                    # Issue with BidsGuess and func/sbref identification
+                    if suffix == "bold":
+                        descriptor = unique_dic["descriptor"]
+                        sd = unique_dic[descriptor]
+                        sd = re.sub("[^A-Za-z0-9]+", "_", sd).lower() + "_"
+                        if "sbref" in sd and unique_dic["NumVolumes"] == 1:
+                            suffix = "sbref"
+
+                    if datatype.lower() not in bids_datatypes:  # assumed to be non-BIDS data
+                        if suffix in ["localizer", "scout"] or "_i0000" in unique_dic["paths"][0]:
+                            # localizer
+                            unique_dic["message"] = "Acquisition was determined to be a localizer sequence, " \
+                                "according to dcm2niix's BidsGuess heuristic, and will not be converted to BIDS. " \
+                                "Please modify if incorrect."
+                        else:
+                            # other non-BIDS data
+                            unique_dic["message"] = "Acquisition was determined to be a non-BIDS sequence, " \
+                                "according to dcm2niix's BidsGuess heuristic, and will not be converted. " \
+                                "Please modify if incorrect."
+                        unique_dic["type"] = "exclude"
+                    else:
+                        unique_dic["datatype"] = datatype
+                        unique_dic["suffix"] = suffix
+                        unique_dic["message"] = f"Acquisition is believed to be " \
+                            f"{unique_dic['datatype']}/{unique_dic['suffix']} based on " \
+                            "the dcm2niix BidsGuess heuristic. Please modify if incorrect."
+                else:
+                    pass
+
+            """
+            If dcm2niix's BidsGuess can't give us datatype and suffix information, move on to next heuristic (search
+            terms in SeriesDescription [or ProtocolName] and rules).
+            """
+            if (unique_dic["datatype"] == "" or unique_dic["suffix"] == "") and unique_dic["type"] != "exclude":
+
+                descriptor = unique_dic["descriptor"]
+                sd = unique_dic[descriptor]
+
+                # Make easier to find search terms in the SeriesDescription (or ProtocolName)
+                sd = re.sub("[^A-Za-z0-9]+", "_", sd).lower() + "_"
+                # sd_sparse = re.sub("[^A-Za-z0-9]+", "", sd)
+
+                cont = True
+                for datatype in lookup_dic.keys():
+                    if datatype not in ["localizer", "dwi_derivatives"]:
+                        suffixes = lookup_dic[datatype].keys()
+                        for suffix in suffixes:
+                            search_terms = lookup_dic[datatype][suffix]["search_terms"]
+                            conditions = lookup_dic[datatype][suffix]["conditions"]
+                            eval_checks = [eval(t, {"sd": sd,
+                                                    "unique_dic": unique_dic,
+                                                    "dataset_list_unique_series": dataset_list_unique_series,
+                                                    "index": index
+                                                    }) for t in conditions]
+                            if any(x in sd for x in search_terms):
+                                # Search term match
+                                conditions = [
+                                    (x.replace("unique_dic", "").replace('["', "").replace('"]', "").
+                                        replace("dataset_list_unique_series[index - 2]", "")) for x in conditions
+                                ]
+                                search_hit = [x for x in search_terms if re.findall(x, sd)][0]
+
+                                if len([t for t in eval_checks if t is True]) == len(conditions):
+                                    # Search term match, as well as all necessary conditions for datatype/suffix pair
+                                    unique_dic["datatype"] = datatype
+                                    unique_dic["suffix"] = suffix
+                                    unique_dic["type"] = ""
+                                    if len(conditions):
+                                        condition_passes = [
+                                            f"({index+1}): {value}" for index, value in enumerate(conditions)
+                                        ]
+                                        unique_dic["message"] = f"Acquisition is believed to be {datatype}/{suffix} " \
+                                            f"because '{search_hit}' is in the {unique_dic['descriptor']} and the " \
+                                            f"following conditions are met: {condition_passes}. " \
+                                            "Please modify if incorrect."
+                                    else:
+                                        unique_dic["message"] = f"Acquisition is believed to be {datatype}/{suffix} " \
+                                            f"because '{search_hit}' is in the {unique_dic['descriptor']}. " \
+                                            "Please modify if incorrect."
+                                    cont = False
+                                    break
+                                else:
+                                    unique_dic["type"] = "exclude"
+                                    condition_fails_ind = [i for (i, v) in enumerate(eval_checks) if v is False]
+                                    condition_fails = [
+                                        v for (i, v) in enumerate(conditions) if i in condition_fails_ind
+                                    ]
+                                    condition_fails = [
+                                        f"({index+1}): {value}" for index, value in enumerate(condition_fails)
+                                    ]
+
+                                    if (datatype in ["func", "dwi"]
+                                            and (unique_dic["ndim"] == 3 and unique_dic["NumVolumes"] > 1)):
+                                        """
+                                        func and dwi can also have sbref suffix pairings, so 3D dimension data with
+                                        only a single volume likely indicates that the sequence was closer to being
+                                        identified as a func (or dwi) sbref.
+                                        """
+                                        suffix = "sbref"
+
+                                    unique_dic["message"] = f"Acquisition was thought to be {datatype}/{suffix} " \
+                                        f"because '{search_hit}' is in the {unique_dic['descriptor']}, but the " \
+                                        f"following conditions were not met: {condition_fails}. Please modify " \
+                                        "if incorrect."
+
+                            elif (datatype == "dwi" and suffix == "dwi"
+                                  and any(".bvec" in x for x in unique_dic["paths"])):
+                                unique_dic["datatype"] = datatype
+                                unique_dic["suffix"] = suffix
+                                unique_dic["message"] = f"Acquisition is believed to be {datatype}/{suffix} " \
+                                    "because associated bval/bvec files were found for this sequence. " \
+                                    "Please modify if incorrect."
+                        if cont is False:
+                            break
+                    else:
+                        # Localizers
+                        if datatype == "localizer":
+                            search_terms = lookup_dic[datatype]["exclude"]["search_terms"]
+                            conditions = lookup_dic["localizer"]["exclude"]["conditions"]
+                            eval_checks = [eval(t, {"sd": sd, "unique_dic": unique_dic}) for t in conditions]
+                            if (any(x in sd for x in search_terms)
+                                    or len([t for t in eval_checks if t]) == len(conditions)):
+                                unique_dic["type"] = "exclude"
+                                unique_dic["error"] = "Acquisition appears to be a localizer"
+                                unique_dic["message"] = "Acquisition is believed to be a " \
+                                    "localizer and will therefore not be converted to BIDS. Please " \
+                                    "modify if incorrect."
+                        # DWI derivatives (TRACEW, FA, ADC)
+                        elif datatype == "dwi_derivatives":
+                            search_terms = lookup_dic[datatype]["exclude"]["search_terms"]
+                            conditions = lookup_dic["dwi_derivatives"]["exclude"]["conditions"]
+                            eval_checks = [eval(t, {"sd": sd, "unique_dic": unique_dic}) for t in conditions]
+                            if (any(x in sd for x in search_terms)
+                                    and len([t for t in eval_checks if t]) == len(conditions)):
+                                unique_dic["type"] = "exclude"
+                                unique_dic["error"] = "Acquisition appears to be a TRACEW, FA, or " \
+                                    "ADC, which are unsupported by ezBIDS and will therefore not " \
+                                    "be converted."
+                                unique_dic["message"] = "Acquisition is believed to be a dwi derivative " \
+                                    "(TRACEW, FA, ADC), which are not supported by BIDS and will not " \
+                                    "be converted. Please modify if incorrect."
+
+            """
+            Can't determine datatype and suffix pairing, assume not BIDS-compliant acquisition,
+            unless user specifies otherwise.
+            """
+            if ((unique_dic["datatype"] == "" or unique_dic["suffix"] == "")
+                    and unique_dic["type"] == "" and unique_dic["message"] is None):
+                unique_dic["error"] = "Acquisition cannot be resolved. Please " \
+                    "determine whether or not this acquisition should be " \
+                    "converted to BIDS."
+                unique_dic["message"] = "Acquisition is unknown because there " \
+                    "is not enough adequate information. Please modify if " \
+                    "acquisition is desired for BIDS conversion, otherwise " \
+                    "the acquisition will not be converted."
+                unique_dic["type"] = "exclude"
+
+        # Combine datatype and suffix to create type variable, which is needed for internal brainlife.io storage
+        if unique_dic["finalized_match"] is False and "exclude" not in unique_dic["type"]:
+            unique_dic["type"] = unique_dic["datatype"] + "/" + unique_dic["suffix"]
+
+        """
+        For non-normalized anatomical acquisitions, provide message that
+        they may have poor CNR and should consider excluding them from BIDS
+        conversion if a corresponding normalized acquisition is present.
+        """
+        if (unique_dic["finalized_match"] is False
+                and unique_dic["datatype"] == "anat" and "NORM" not in unique_dic["ImageType"]):
+            unique_dic["message"] = unique_dic["message"] + (
+                " Additionally, this acquisition appears to be "
+                "non-normalized, potentially having poor CNR. "
+                "If there is a corresponding normalized acquisition "
+                "('NORM' in the ImageType metadata field), consider "
+                "excluding this current one from BIDS conversion."
+            )
+
+        # Warn user about non-RMS multi-echo anatomical acquisitions
+        if (unique_dic["finalized_match"] is False
+                and unique_dic["datatype"] == "anat"
+                and "EchoNumber" in unique_dic["sidecar"]
+                and "MEAN" not in unique_dic["ImageType"]):
+            # unique_dic["type"] = "exclude"
+            unique_dic["message"] = unique_dic["message"] + " " + (
+                "Acquisition also appears to be an anatomical multi-echo, but not the "
+                "combined RMS file. If the RMS file exists it is ideal to exclude this "
+                "acquisition and only save the RMS file, not the individual echoes.")
+
+    """
+    If there's multi-echo anatomical data and we have the mean (RMS) file, exclude the
+    individual echo sequences, since the BIDs validator will generate an error with them.
+    """
+    if config is False:
+        anat_ME_RMS = [
+            ind for (ind, v) in enumerate(dataset_list_unique_series)
+            if v["datatype"] == "anat"
+            and "MEAN" in v["ImageType"]
+        ]
+
+        if len(anat_ME_RMS):
+            for anat_ME_RMS_index in anat_ME_RMS:
+                sd = dataset_list_unique_series[anat_ME_RMS_index][descriptor]
+                anat_ind_ME_indices = [
+                    x for (x, v) in enumerate(dataset_list_unique_series)
+                    if re.sub("[^A-Za-z0-9]+", "", v[descriptor]) == re.sub("[^A-Za-z0-9]+", "", sd).replace("RMS", "")
+                ]
+
+                for anat_ind_ME_index in anat_ind_ME_indices:
+                    dataset_list_unique_series[anat_ind_ME_index]["message"] = (
+                        " A mean RMS anatomical file combining the multiple echoes has been found, "
+                        "thus this individual anatomical echo file will be excluded from conversion. "
+                        "Please modify if incorrect."
+                    )
+                    dataset_list_unique_series[anat_ind_ME_index]["type"] = "exclude"
+
+    return dataset_list_unique_series
+
+
+def synthetic_unique_series(size, seed=0):
+    """
+    Unique series drawn from SERIES_DESCRIPTIONS, with sidecar, ImageType, dimension, and path variants.
+    """
+    rng = random.Random(seed)
+    unique_series = []
+    for index in range(size):
+        series_description = rng.choice(SERIES_DESCRIPTIONS)
+        echo_number = rng.choice([None, 1, 2])
+        ndim = rng.choice([3, 4])
+        stem = f"sub-01/{series_description}_{index}"
+        json_path = rng.choice([
+            f"{stem}.json", f"{stem}_e1_ph.json", f"{stem}_e2_ph.json", f"{stem}_blood.json",
+            f"sub-01/anat/sub-01_run-{index}_T1w.json"
+        ])
+        sidecar = {
+            "Manufacturer": rng.choice(["Siemens", "GE", "Philips"]),
+            "ConversionSoftware": rng.choice(["dcm2niix", "dcm2niix", "pypet2bids", "MNE-BIDS"])
+        }
+        if echo_number is not None:
+            sidecar["EchoNumber"] = echo_number
+        if rng.random() < 0.2:
+            sidecar["InversionTime"] = 1.0
+        if rng.random() < 0.2:
+            sidecar["FlipAngle"] = 8
+        if rng.random() < 0.05:
+            sidecar["BidsGuess"] = rng.choice([["anat", "_T1w"], ["func", "_task-rest_bold"], ["discard", "_scout"]])
+
+        unique_series.append({
+            "SeriesDescription": series_description,
+            "ProtocolName": series_description,
+            "descriptor": "SeriesDescription",
+            "Modality": rng.choice(["MR", "MR", "PT", "MEG"]),
+            "ImageType": list(rng.choice(IMAGE_TYPES)),
+            "RepetitionTime": rng.choice([0, 0.8, 2.0]),
+            "EchoNumber": echo_number,
+            "EchoTime": rng.choice([2.5, 30, 120]),
+            "datatype": "",
+            "suffix": "",
+            "NumVolumes": 1 if ndim == 3 else rng.choice([2, 8, 300]),
+            "error": None,
+            "message": None,
+            "type": "exclude" if rng.random() < 0.02 else "",
+            "ndim": ndim,
+            "json_path": json_path,
+            "paths": [f"{stem}.nii.gz", json_path] + ([f"{stem}.bval", f"{stem}.bvec"] if rng.random() < 0.3 else []),
+            "finalized_match": False,
+            "sidecar": sidecar
+        })
+
+    return unique_series
+
+
+def main():
+    # Module globals used by the reference implementation
+    global bids_schema, bids_datatypes, bids_suffixes
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,5000")
+    parser.add_argument("--schema", default=BIDS_SCHEMA_DIR)
+    args = parser.parse_args()
+
+    sys.path.insert(0, EZBIDS_CORE_DIR)
+    from bids_schema import load_bids_schema
+    from ezBIDS_core import create_lookup_info, datatype_suffix_identification
+
+    bids_schema = load_bids_schema(args.schema)
+    bids_datatypes = bids_schema["datatypes"]
+    bids_suffixes = bids_schema["suffixes"]
+
+    lookup_dic = create_lookup_info(bids_schema)
+
+    print(f"{'series':>8} {'old (s)':>10} {'new (s)':>10} {'speedup':>8}")
+    for size in [int(x) for x in args.sizes.split(",")]:
+        old_series = synthetic_unique_series(size)
+        new_series = copy.deepcopy(old_series)
+
+        with contextlib.redirect_stdout(None):
+            start = time.perf_counter()
+            datatype_suffix_identification_old(old_series, lookup_dic, False)
+            old_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            datatype_suffix_identification(new_series, lookup_dic, False, bids_schema)
+            new_time = time.perf_counter() - start
+
+        if old_series != new_series:
+            mismatch = [i for i, (x, y) in enumerate(zip(old_series, new_series)) if x != y][0]
+            sys.exit(f"Mismatch between old and new implementations for {new_series[mismatch]['SeriesDescription']} "
+                     f"(series {mismatch} of {size})")
+
+        speedup = old_time / new_time
+        print(f"{size:>8} {old_time:>10.3f} {new_time:>10.3f} {speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
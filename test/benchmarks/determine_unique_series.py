@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark determine_unique_series against the previous list-scanning implementation
+on synthetic acquisition lists, and check that both assign the same series_idx values.
+
+usage: ./determine_unique_series.py [--sizes 1000,10000,50000] [--old-max 10000]
+
+The previous implementation is O(N^2), so it is only run for sizes up to --old-max
+(50k acquisitions takes on the order of an hour with it).
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+EZBIDS_CORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../handler/ezBIDS_core")
+
+sys.path.insert(0, EZBIDS_CORE_DIR)
+from ezBIDS_core import determine_unique_series  # noqa: E402
+
+
+def determine_unique_series_old(dataset_list, bids_compliant):
+    """
+    determine_unique_series prior to the series_idx_map rewrite, kept as a reference.
+    """
+    dataset_list_unique_series = []
+    series_checker = []
+    series_idx = 0
+
+    for index, acquisition_dic in enumerate(dataset_list):
+        descriptor = acquisition_dic["descriptor"]
+        if "_RR" in acquisition_dic["SeriesDescription"]:
+            heuristic_items = [
+                round(acquisition_dic["EchoTime"], 1),
+                acquisition_dic[descriptor].replace("_RR", ""),
+                acquisition_dic["ImageType"],
+                round(acquisition_dic["RepetitionTime"], 1)
+            ]
+        else:
+            heuristic_items = [
+                round(acquisition_dic["EchoTime"], 1),
+                acquisition_dic[descriptor],
+                acquisition_dic["ImageType"],
+                round(acquisition_dic["RepetitionTime"], 1)
+            ]
+
+        if bids_compliant is True:
+            if index == 0:
+                series_idx = 0
+            else:
+                series_idx += 1
+            acquisition_dic["series_idx"] = series_idx
+            dataset_list_unique_series.append(acquisition_dic)
+        else:
+            if index == 0:
+                acquisition_dic["series_idx"] = 0
+                dataset_list_unique_series.append(acquisition_dic)
+            else:
+                if heuristic_items[1:3] not in [x[1:3] for x in series_checker]:
+                    series_idx += 1
+                    acquisition_dic["series_idx"] = series_idx
+                    dataset_list_unique_series.append(acquisition_dic)
+                else:
+                    if heuristic_items not in [x[:-1] for x in series_checker]:
+                        series_idx += 1
+                        acquisition_dic["series_idx"] = series_idx
+                        dataset_list_unique_series.append(acquisition_dic)
+                    else:
+                        common_series_index = [x[:-1] for x in series_checker].index(heuristic_items)
+                        common_series_idx = series_checker[common_series_index][-1]
+                        acquisition_dic["series_idx"] = common_series_idx
+
+            series_checker.append(heuristic_items + [acquisition_dic["series_idx"]])
+
+    return dataset_list, dataset_list_unique_series
+
+
+def synthetic_dataset_list(size, seed=0):
+    """
+    Acquisitions drawn from a pool of protocols, including multi-echo, retro-reconstructed
+    (_RR), and ProtocolName-only acquisitions, with EchoTime/RepetitionTime jitter.
+    """
+    rng = random.Random(seed)
+    protocols = []
+    for i in range(max(size // 50, 10)):
+        protocols.append({
+            "SeriesDescription": rng.choice(["T1w_MPRAGE", "rfMRI_REST_AP", "dMRI_dir98", "fmap_AP", "qsm"]) + f"_{i}",
+            "ImageType": rng.choice([["ORIGINAL", "PRIMARY", "M"], ["ORIGINAL", "PRIMARY", "P"], ["DERIVED"]]),
+            "EchoTime": rng.uniform(1, 100),
+            "RepetitionTime": rng.uniform(0.5, 3),
+        })
+
+    dataset_list = []
+    for _ in range(size):
+        protocol = rng.choice(protocols)
+        descriptor = "SeriesDescription" if rng.random() > 0.05 else "ProtocolName"
+        series_description = protocol["SeriesDescription"] + ("_RR" if rng.random() < 0.02 else "")
+        dataset_list.append({
+            "SeriesDescription": series_description,
+            "ProtocolName": protocol["SeriesDescription"],
+            "descriptor": descriptor,
+            "ImageType": list(protocol["ImageType"]),
+            "EchoTime": protocol["EchoTime"] * rng.choice([1, 2, 3]) + rng.uniform(-0.04, 0.04),
+            "RepetitionTime": protocol["RepetitionTime"] + rng.uniform(-0.04, 0.04),
+            "series_idx": 0
+        })
+
+    return dataset_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--old-max", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'acquisitions':>12} {'unique':>8} {'old (s)':>10} {'new (s)':>10} {'speedup':>8}")
+    for size in [int(x) for x in args.sizes.split(",")]:
+        new_list = synthetic_dataset_list(size)
+        start = time.perf_counter()
+        _, unique_series = determine_unique_series(new_list, False)
+        new_time = time.perf_counter() - start
+
+        if size <= args.old_max:
+            old_list = synthetic_dataset_list(size)
+            start = time.perf_counter()
+            determine_unique_series_old(old_list, False)
+            old_time = time.perf_counter() - start
+
+            if [x["series_idx"] for x in old_list] != [x["series_idx"] for x in new_list]:
+                sys.exit(f"series_idx mismatch between old and new implementations for {size} acquisitions")
+
+            speedup = old_time / new_time
+            print(f"{size:>12} {len(unique_series):>8} {old_time:>10.3f} {new_time:>10.3f} {speedup:>7.0f}x")
+        else:
+            print(f"{size:>12} {len(unique_series):>8} {'skipped':>10} {new_time:>10.3f} {'':>8}")
+
+
+if __name__ == "__main__":
+    main()
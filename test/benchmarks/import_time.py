@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Measure the startup import cost of the ezBIDS_core analyzer library with `python -X importtime`
+(`import ezBIDS_core`, which loads the module without starting an analyzer run).
+
+usage: ./import_time.py [--budget 2.0] [--forbid mne,mne_bids,pandas] [--top 10]
+
+Exits with an error if the imports take longer than --budget seconds, or if any of the --forbid
+packages (which should only be imported when needed, e.g. for MEG uploads) are imported at startup.
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+EZBIDS_CORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../handler/ezBIDS_core")
+
+
+def import_times(module):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Returns a dictionary of package -> cumulative import time (seconds) of the packages the module imports
+    directly, the names of all the packages imported (at any depth), and the total.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=EZBIDS_CORE_DIR, capture_output=True, text=True, check=True
+    )
+
+    packages = {}
+    imported = set()
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imported.add(name.strip().split(".")[0])
+        # Nested imports are indented by two spaces per level (after a single separating space)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            total += int(cumulative) / 1e6
+        elif depth == 1:
+            packages[name.strip()] = packages.get(name.strip(), 0) + int(cumulative) / 1e6
+
+    return packages, imported, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=2.0)
+    parser.add_argument("--forbid", default="mne,mne_bids,pandas")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    packages, imported, total = import_times("ezBIDS_core")
+
+    print(f"{'package':<24} {'import (s)':>10}")
+    for name, seconds in sorted(packages.items(), key=lambda x: -x[1])[:args.top]:
+        print(f"{name:<24} {seconds:>10.3f}")
+    print(f"{'total':<24} {total:>10.3f}")
+
+    forbidden = [x for x in args.forbid.split(",") if x and x in imported]
+    if len(forbidden):
+        sys.exit(f"Imported at startup, but should be imported lazily: {', '.join(forbidden)}")
+    if total > args.budget:
+        sys.exit(f"Startup imports took {total:.3f}s, over the {args.budget:.3f}s budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark organize_dataset against the previous implementation (which re-sorted the acquisitions after each
+one) on synthetic anonymized acquisition lists, and check that both assign the same pseudo subject labels
+and return the acquisitions in the same order.
+
+usage: ./organize_dataset.py [--sizes 1000,10000,100000] [--old-max 10000] [--seeds 5]
+
+The synthetic lists have no PatientID/PatientName/AcquisitionDateTime (as after anonymization), with
+repeated and misaligned series numbers, missing acquisition times, some identified acquisitions, and
+unlabeled acquisitions that aren't anonymized. The previous implementation is O(N^2 log N), so it is only
+run for sizes up to --old-max.
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from operator import itemgetter
+
+EZBIDS_CORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../handler/ezBIDS_core")
+
+sys.path.insert(0, EZBIDS_CORE_DIR)
+from ezBIDS_core import organize_dataset  # noqa: E402
+
+
+def organize_dataset_old(dataset_list):
+    """
+    organize_dataset prior to the single-pass rewrite, kept as a reference.
+    """
+    dataset_list = sorted(dataset_list, key=itemgetter(
+        "subject",
+        "AcquisitionTime",
+        "ModifiedSeriesNumber")
+    )
+
+    pseudo_sub = 1
+    for index, unique_dic in enumerate(dataset_list):
+        if unique_dic["subject"] == "n/a":
+            if (unique_dic["AcquisitionDateTime"] == "0000-00-00T00:00:00.000000"
+                    and unique_dic["PatientID"] == "n/a"
+                    and unique_dic["PatientName"] == "n/a"):
+                if index == 0:
+                    subj = pseudo_sub
+                else:
+                    previous_data = dataset_list[index - 1]
+                    if unique_dic["SeriesNumber"] >= previous_data["SeriesNumber"]:
+                        if not unique_dic["SeriesNumber"] - previous_data["SeriesNumber"] < 2:
+                            subj = pseudo_sub - 1
+                        else:
+                            subj = pseudo_sub
+                    else:
+                        if int(unique_dic["SeriesNumber"]) == 1:
+                            pseudo_sub += 1
+                        subj = pseudo_sub
+
+                unique_dic["subject"] = (unique_dic["subject"] + ("0" * (4 - len(str(subj)))) + str(subj))
+                unique_dic["AcquisitionDateTime"] = unique_dic["subject"][:-4]
+
+        dataset_list = sorted(dataset_list, key=itemgetter(
+            "subject",
+            "AcquisitionTime",
+            "ModifiedSeriesNumber")
+        )
+
+    return dataset_list
+
+
+def synthetic_dataset_list(size, seed=0):
+    """
+    Anonymized acquisitions of consecutive sessions (series numbers restarting at 1), plus a few
+    identified or not anonymized ones.
+    """
+    rng = random.Random(seed)
+
+    dataset_list = []
+    while len(dataset_list) < size:
+        hour = rng.randint(7, 19)
+        series_number = 1
+        for _ in range(rng.randint(1, 30)):
+            series_number += rng.choice([0, 1, 1, 1, 2, 3])
+            minute = rng.randint(0, 59)
+            acquisition_time = "00:00:00.000000" if rng.random() < 0.1 else f"{hour:02d}:{minute:02d}:00.000000"
+            anonymized = rng.random() > 0.02
+            subject = "n/a" if rng.random() > 0.02 else rng.choice(["01", "02", "pilot", "sub-x"])
+            dataset_list.append({
+                "subject": subject,
+                "PatientID": "n/a" if anonymized else f"P{rng.randint(0, 99)}",
+                "PatientName": "n/a",
+                "AcquisitionDateTime": "0000-00-00T00:00:00.000000",
+                "AcquisitionTime": acquisition_time,
+                "SeriesNumber": series_number,
+                "ModifiedSeriesNumber": ("0" if series_number < 10 else "") + str(series_number),
+                "id": len(dataset_list)
+            })
+
+    return dataset_list[:size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--old-max", type=int, default=10000)
+    parser.add_argument("--seeds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'acquisitions':>12} {'subjects':>9} {'old (s)':>10} {'new (s)':>10} {'speedup':>8}")
+    for size in [int(x) for x in args.sizes.split(",")]:
+        old_time = new_time = 0
+        for seed in range(args.seeds if size <= args.old_max else 1):
+            # Each implementation relabels the acquisitions in place, so each gets its own list
+            dataset_list = synthetic_dataset_list(size, seed)
+            start = time.perf_counter()
+            new_list = organize_dataset(dataset_list)
+            new_time += time.perf_counter() - start
+
+            if size <= args.old_max:
+                dataset_list = synthetic_dataset_list(size, seed)
+                start = time.perf_counter()
+                old_list = organize_dataset_old(dataset_list)
+                old_time += time.perf_counter() - start
+
+                for field in ["id", "subject", "AcquisitionDateTime"]:
+                    if [x[field] for x in old_list] != [x[field] for x in new_list]:
+                        sys.exit(f"{field} mismatch between old and new implementations for {size} acquisitions "
+                                 f"(seed {seed})")
+
+        subjects = len(set(x["subject"] for x in new_list))
+        if size <= args.old_max:
+            print(f"{size:>12} {subjects:>9} {old_time:>10.3f} {new_time:>10.3f} {old_time / new_time:>7.0f}x")
+        else:
+            print(f"{size:>12} {subjects:>9} {'skipped':>10} {new_time:>10.3f} {'':>8}")
+
+
+if __name__ == "__main__":
+    main()
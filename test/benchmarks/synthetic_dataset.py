@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generate a synthetic dcm2niix-style upload (as ezBIDS_core.py sees it after preprocess.sh): per subject and
+session, small NIfTI files with realistic JSON sidecars (and bval/bvec for DWI), plus the session's `list`
+and `bids_compliant.log` files.
+
+usage: ./synthetic_dataset.py <output_dir> [--subjects 10] [--sessions 2] [--series 4] [--multi-echo]
+                              [--no-dwi] [--no-fieldmaps] [--files N]
+
+--series is the number of functional runs per session (each with its SBRef); anatomicals, DWI, and
+fieldmaps are added on top. --files overrides --subjects with the number of subjects needed to reach
+(at least) N NIfTI files.
+"""
+
+import os
+import gzip
+import json
+import random
+import argparse
+import numpy as np
+import nibabel as nib
+
+TASKS = ["rest", "nback", "flanker", "stroop", "gambling", "faces", "motor", "language"]
+
+MULTI_ECHO_TIMES = [0.0142, 0.0385, 0.0628]
+
+# gzipped NIfTI bytes by (shape, dtype), so each distinct image is only encoded once
+nifti_bytes_cache = {}
+
+
+def nifti_bytes(shape, zooms, dtype=np.int16):
+    """
+    A gzipped NIfTI image of the given shape and voxel sizes (filled with zeros).
+    """
+    key = (shape, zooms, np.dtype(dtype).str)
+    if key not in nifti_bytes_cache:
+        image = nib.Nifti1Image(np.zeros(shape, dtype=dtype), np.diag([2.0, 2.0, 2.0, 1.0]))
+        image.header.set_zooms(zooms)
+        nifti_bytes_cache[key] = gzip.compress(image.to_bytes(), mtime=0)
+
+    return nifti_bytes_cache[key]
+
+
+def session_series(series, multi_echo, dwi, fieldmaps):
+    """
+    The acquisitions of one session: (file name suffix, sidecar fields, shape, zooms, extra files).
+    """
+    acquisitions = [
+        ("", dict(SeriesDescription="AAHead_Scout", ImageType=["ORIGINAL", "PRIMARY", "M", "NORM"],
+                  EchoTime=0.004, RepetitionTime=0.008, FlipAngle=8), (8, 8, 3), (2.0, 2.0, 2.0), []),
+        ("", dict(SeriesDescription="T1w_MPRAGE", ImageType=["ORIGINAL", "PRIMARY", "M", "NORM"],
+                  EchoTime=0.00298, RepetitionTime=2.3, InversionTime=0.9, FlipAngle=9), (8, 8, 6),
+         (1.0, 1.0, 1.0), []),
+        ("", dict(SeriesDescription="T2w_SPC", ImageType=["ORIGINAL", "PRIMARY", "M", "NORM"],
+                  EchoTime=0.563, RepetitionTime=3.2, FlipAngle=120), (8, 8, 6), (1.0, 1.0, 1.0), []),
+    ]
+
+    if fieldmaps:
+        for direction, ped in [("AP", "j-"), ("PA", "j")]:
+            acquisitions.append(
+                ("", dict(SeriesDescription=f"SpinEchoFieldMap_{direction}", ImageType=["ORIGINAL", "PRIMARY", "M"],
+                          EchoTime=0.066, RepetitionTime=8.0, PhaseEncodingDirection=ped), (8, 8, 4, 3),
+                 (2.0, 2.0, 2.0, 8.0), [])
+            )
+        gre = dict(SeriesDescription="gre_field_mapping", RepetitionTime=0.5, FlipAngle=60)
+        acquisitions += [
+            ("_e1", dict(gre, ImageType=["ORIGINAL", "PRIMARY", "M"], EchoTime=0.00492, EchoNumber=1), (8, 8, 4),
+             (2.0, 2.0, 2.0), []),
+            ("_e2", dict(gre, ImageType=["ORIGINAL", "PRIMARY", "M"], EchoTime=0.00738, EchoNumber=2), (8, 8, 4),
+             (2.0, 2.0, 2.0), []),
+            ("_e2_ph", dict(gre, ImageType=["ORIGINAL", "PRIMARY", "P"], EchoTime=0.00738, EchoNumber=2),
+             (8, 8, 4), (2.0, 2.0, 2.0), []),
+        ]
+
+    for run in range(series):
+        task = TASKS[run % len(TASKS)]
+        bold = dict(SeriesDescription=f"fMRI_{task}_run{run // len(TASKS) + 1}_AP", RepetitionTime=0.8,
+                    PhaseEncodingDirection="j-", SliceTiming=[0.0, 0.4, 0.1, 0.5], MultibandAccelerationFactor=8)
+        acquisitions.append(
+            ("", dict(bold, SeriesDescription=bold["SeriesDescription"] + "_SBRef",
+                      ImageType=["ORIGINAL", "PRIMARY", "M", "NORM"], EchoTime=0.03), (8, 8, 4), (2.0, 2.0, 2.0), [])
+        )
+        if multi_echo:
+            for echo, echo_time in enumerate(MULTI_ECHO_TIMES, start=1):
+                acquisitions.append(
+                    (f"_e{echo}", dict(bold, ImageType=["ORIGINAL", "PRIMARY", "M", "MB"], EchoTime=echo_time,
+                                       EchoNumber=echo), (8, 8, 4, 5), (2.0, 2.0, 2.0, 0.8), [])
+                )
+        else:
+            acquisitions.append(
+                ("", dict(bold, ImageType=["ORIGINAL", "PRIMARY", "M", "MB"], EchoTime=0.03), (8, 8, 4, 5),
+                 (2.0, 2.0, 2.0, 0.8), [])
+            )
+
+    if dwi:
+        acquisitions += [
+            ("", dict(SeriesDescription="dMRI_dir98_AP", ImageType=["ORIGINAL", "PRIMARY", "DIFFUSION", "NONE"],
+                      EchoTime=0.089, RepetitionTime=3.23, PhaseEncodingDirection="j-"), (8, 8, 4, 7),
+             (2.0, 2.0, 2.0, 3.23), [".bval", ".bvec"]),
+            ("", dict(SeriesDescription="dMRI_dir98_AP_TRACEW", ImageType=["DERIVED", "PRIMARY", "DIFFUSION", "TRACEW"],
+                      EchoTime=0.089, RepetitionTime=3.23), (8, 8, 4), (2.0, 2.0, 2.0), []),
+            ("", dict(SeriesDescription="dMRI_b0_PA", ImageType=["ORIGINAL", "PRIMARY", "DIFFUSION", "NONE"],
+                      EchoTime=0.089, RepetitionTime=3.23, PhaseEncodingDirection="j"), (8, 8, 4, 2),
+             (2.0, 2.0, 2.0, 3.23), [".bval", ".bvec"]),
+        ]
+
+    return acquisitions
+
+
+def files_per_session(series, multi_echo, dwi, fieldmaps):
+    """
+    Number of NIfTI files generated per session.
+    """
+    return len(session_series(series, multi_echo, dwi, fieldmaps))
+
+
+def write_bval_bvec(base, volumes):
+    """
+    Writes dcm2niix-style bval/bvec files for a DWI acquisition.
+    """
+    bvals = ["0"] + ["1000" if x % 2 else "2000" for x in range(volumes - 1)]
+    with open(f"{base}.bval", "w") as f:
+        f.write(" ".join(bvals) + "\n")
+    with open(f"{base}.bvec", "w") as f:
+        for axis in range(3):
+            f.write(" ".join("0" if x == "0" else str(round(0.577 * (axis + 1) / 2, 3)) for x in bvals) + "\n")
+
+
+def make_dataset(root, subjects=10, sessions=2, series=4, multi_echo=False, dwi=True, fieldmaps=True, seed=0):
+    """
+    Writes a synthetic upload to root (see module docstring).
+
+    Returns
+    -------
+    nifti_files : list
+        Paths of the NIfTI files, relative to root (as listed in the `list` file).
+    """
+    rng = random.Random(seed)
+    acquisitions = session_series(series, multi_echo, dwi, fieldmaps)
+    nifti_files = []
+
+    for subject in range(subjects):
+        patient = {
+            "PatientID": f"P{subject:05d}",
+            "PatientName": f"SYNTH^{subject:05d}",
+            "PatientBirthDate": f"19{rng.randint(50, 99)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+            "PatientSex": rng.choice(["F", "M"]),
+            "PatientWeight": rng.randint(50, 100)
+        }
+        for session in range(sessions):
+            session_dir = os.path.join(root, "upload", f"subj{subject:05d}", f"visit{session + 1}")
+            os.makedirs(session_dir, exist_ok=True)
+            acquisition_date = f"2023-{session % 12 + 1:02d}-{subject % 28 + 1:02d}"
+
+            series_number = 0
+            for file_suffix, fields, shape, zooms, extra_files in acquisitions:
+                if file_suffix in ("", "_e1"):
+                    series_number += 1
+                acquisition_time = f"{8 + series_number // 60:02d}:{series_number % 60:02d}:00.000000"
+                sidecar = {
+                    "Modality": "MR",
+                    "MagneticFieldStrength": 3,
+                    "Manufacturer": "Siemens",
+                    "ManufacturersModelName": "Prisma_fit",
+                    "InstitutionName": "Synthetic_Imaging_Center",
+                    "StationName": "SYNTH01",
+                    **patient,
+                    "ProtocolName": fields["SeriesDescription"],
+                    "SeriesNumber": series_number,
+                    "AcquisitionDateTime": f"{acquisition_date}T{acquisition_time}",
+                    "AcquisitionDate": acquisition_date,
+                    "AcquisitionTime": acquisition_time,
+                    **fields,
+                    "ConversionSoftware": "dcm2niix",
+                    "ConversionSoftwareVersion": "v1.0.20220720"
+                }
+
+                base = os.path.join(session_dir, f"{fields['SeriesDescription']}_{series_number}{file_suffix}")
+                with open(f"{base}.nii.gz", "wb") as f:
+                    f.write(nifti_bytes(shape, zooms))
+                with open(f"{base}.json", "w") as f:
+                    json.dump(sidecar, f, indent=4)
+                if ".bval" in extra_files:
+                    write_bval_bvec(base, shape[-1])
+
+                nifti_files.append("./" + os.path.relpath(f"{base}.nii.gz", root))
+
+    with open(os.path.join(root, "list"), "w") as f:
+        f.write("\n".join(sorted(nifti_files)) + "\n")
+    with open(os.path.join(root, "bids_compliant.log"), "w") as f:
+        f.write(f"{root}\nfalse\n")
+
+    return nifti_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_dir")
+    parser.add_argument("--subjects", type=int, default=10)
+    parser.add_argument("--sessions", type=int, default=2)
+    parser.add_argument("--series", type=int, default=4)
+    parser.add_argument("--multi-echo", action="store_true")
+    parser.add_argument("--no-dwi", dest="dwi", action="store_false")
+    parser.add_argument("--no-fieldmaps", dest="fieldmaps", action="store_false")
+    parser.add_argument("--files", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    subjects = args.subjects
+    if args.files:
+        per_subject = args.sessions * files_per_session(args.series, args.multi_echo, args.dwi, args.fieldmaps)
+        subjects = -(-args.files // per_subject)
+
+    nifti_files = make_dataset(args.output_dir, subjects, args.sessions, args.series, args.multi_echo, args.dwi,
+                               args.fieldmaps, args.seed)
+    print(f"Wrote {len(nifti_files)} NIfTI files ({subjects} subjects) to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,24 @@
 #!/bin/bash
 
-#TODO - run a test 
+# Runs the analyzer benchmarks (test/benchmarks) at small sizes: the per-stage timings and scaling of
+# ezBIDS_core.py, and the checks that the rewritten stages produce the same output as their previous
+# implementations. Needs the BIDS schema (bids-specification/src/schema next to handler/) and the Cognitive
+# Atlas task snapshot, as in the ezBIDS container. Any mismatch fails the run.
+#
+# usage: ./run.sh [--budget]
+#   --budget: also fail if a stage is over its time budget (analyzer_stages_budget.json, scaled to this
+#             machine's speed). Wall times vary between runs and machines, so this is opt-in.
+
+set -e
+
+budget=""
+if [ "$1" == "--budget" ]; then
+    budget="--budget analyzer_stages_budget.json"
+fi
+
+cd "$(dirname "$0")/benchmarks"
+
+python3 ./analyzer_stages.py --sizes 100,1000 $budget
+python3 ./organize_dataset.py --sizes 1000 --seeds 3
+python3 ./datatype_suffix_identification.py --sizes 100
+python3 ./determine_unique_series.py --sizes 1000
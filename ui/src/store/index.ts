@@ -113,7 +113,8 @@ export interface IObjectItem {
     path: string;
     name?: string;
     pngPaths?: string[]; //array of png file paths
-    headers?: any; //for nifti
+    headers?: any; //for tsv (and nifti in sessions analyzed before headersKey)
+    headersKey?: string | null; //for nifti, key of its header lines in ezbids.headers
 
     events?: any; //for event (contains object parsed by createEventObjects)
     eventsBIDS?: IBIDSEvent[];
@@ -314,6 +315,7 @@ const state = {
         subjects: [] as Subject[],
         series: [] as Series[],
         objects: [] as IObject[],
+        headers: {} as { [key: string]: string[] }, //nifti header lines, by headersKey
         BIDSURI: false,
 
         _organized: [] as OrganizedSubject[], //above things are organized into subs/ses/run/object hierarchy for quick access
@@ -510,6 +512,7 @@ const store = createStore({
                 subjects: [],
                 series: [],
                 objects: [],
+                headers: {},
                 BIDSURI: false,
 
                 _organized: [], //above things are organized into subs/ses/run/object hierarchy for quick access